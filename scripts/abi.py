@@ -0,0 +1,422 @@
+"""
+Binary Solidity ABI codec working on bytes / memoryview instead of hex strings.
+
+decode() reads values straight out of the response buffer (a hex RPC result is
+converted to bytes once, in C), following head/tail offsets for dynamic types:
+bytes, string, T[], T[k] and tuples. decode_symbol() handles both string and
+bytes32 symbol() implementations without guessing. CallTemplate compiles a
+function signature once and memoizes the call data per argument tuple.
+Single-word results (uint, address) stay with the hex helpers in
+get_token_price.py: parsing one word straight from the hex string is already
+as fast as it gets.
+
+Microbenchmark against the hex-string helpers:
+    python3 abi.py --bench
+"""
+import struct
+import sys
+from functools import lru_cache
+
+from keccak import keccak256
+
+CALLDATA_CACHE_SIZE = 65536
+
+
+class ABIDecodeError(ValueError):
+    """The buffer is too short or an offset points outside it"""
+
+
+@lru_cache(maxsize=None)
+def parse_type(type_str):
+    """'uint256' -> ('uint', 256), '(bool,bytes)[]' -> ('array', ('tuple', (...)), None), ..."""
+    type_str = type_str.strip()
+    if type_str.endswith("]"):
+        inner, _, size = type_str[:-1].rpartition("[")
+        return ("array", parse_type(inner), int(size) if size else None)
+    if type_str.startswith("("):
+        return ("tuple", tuple(parse_type(t) for t in split_types(type_str[1:-1])))
+    if type_str in ("address", "bool", "string"):
+        return (type_str,)
+    if type_str == "bytes":
+        return ("bytes", None)
+    if type_str.startswith("bytes"):
+        return ("bytes", int(type_str[5:]))
+    for kind in ("uint", "int"):
+        if type_str.startswith(kind):
+            return (kind, int(type_str[len(kind):] or 256))
+    raise ValueError(f"Unsupported ABI type: {type_str}")
+
+
+def split_types(types_str):
+    """Splits 'address,(uint8,bytes)[],bool' at top-level commas"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(types_str):
+        if ch == "(": depth += 1
+        elif ch == ")": depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(types_str[start:i])
+            start = i + 1
+    if types_str[start:].strip():
+        parts.append(types_str[start:])
+    return parts
+
+
+@lru_cache(maxsize=None)
+def is_dynamic(t):
+    kind = t[0]
+    if kind in ("string",) or (kind == "bytes" and t[1] is None): return True
+    if kind == "array": return t[2] is None or is_dynamic(t[1])
+    if kind == "tuple": return any(is_dynamic(sub) for sub in t[1])
+    return False
+
+
+@lru_cache(maxsize=None)
+def head_size(t):
+    if is_dynamic(t): return 32
+    if t[0] == "array": return t[2] * head_size(t[1])
+    if t[0] == "tuple": return sum(head_size(sub) for sub in t[1])
+    return 32
+
+
+def as_buffer(data):
+    """bytes/bytearray/memoryview as-is; '0x…' hex converted once"""
+    if isinstance(data, str):
+        data = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+    return memoryview(data)
+
+
+# ---- decoding ----
+#
+# Each type is compiled once into a closure f(mv, pos, base) that reads the value whose
+# head sits at pos (base = start of the enclosing tuple, which dynamic offsets are
+# relative to). Offsets and lengths must fit in 64 bits; anything larger is rejected.
+
+_WORD_U64 = struct.Struct(">4Q")
+
+
+def _small(mv, pos):
+    high0, high1, high2, low = _WORD_U64.unpack_from(mv, pos)
+    if high0 or high1 or high2:
+        raise ABIDecodeError(f"offset/length word at {pos} does not fit in 64 bits")
+    return low
+
+
+def _check(mv, end):
+    if end > len(mv): raise ABIDecodeError(f"read past end of {len(mv)}-byte buffer at {end}")
+
+
+@lru_cache(maxsize=None)
+def compile_decoder(t):
+    kind = t[0]
+    dynamic = is_dynamic(t)
+
+    if kind in ("uint", "int"):
+        signed = kind == "int"
+
+        def read(mv, pos, base):
+            _check(mv, pos + 32)
+            value = int.from_bytes(mv[pos : pos + 32], "big")
+            return value - (1 << 256) if signed and value >> 255 else value
+        return read
+    if kind == "address":
+        def read(mv, pos, base):
+            _check(mv, pos + 32)
+            return "0x" + mv[pos + 12 : pos + 32].hex()
+        return read
+    if kind == "bool":
+        def read(mv, pos, base):
+            _check(mv, pos + 32)
+            return mv[pos + 31] != 0
+        return read
+    if kind == "string" or (kind == "bytes" and t[1] is None):
+        as_text = kind == "string"
+
+        def read(mv, pos, base):
+            start = base + _small(mv, pos)
+            length = _small(mv, start)
+            _check(mv, start + 32 + length)
+            raw = bytes(mv[start + 32 : start + 32 + length])
+            return raw.decode("utf-8", errors="replace") if as_text else raw
+        return read
+    if kind == "bytes":
+        size = t[1]
+
+        def read(mv, pos, base):
+            _check(mv, pos + 32)
+            return bytes(mv[pos : pos + size])
+        return read
+    if kind == "array":
+        item = compile_decoder(t[1])
+        step = head_size(t[1])
+        fixed = t[2]
+
+        def read(mv, pos, base):
+            start = base + _small(mv, pos) if dynamic else pos
+            count = fixed
+            if count is None:
+                count = _small(mv, start)
+                start += 32
+            _check(mv, start + count * step)
+            return [item(mv, start + i * step, start) for i in range(count)]
+        return read
+    if kind == "tuple":
+        fields = []
+        offset = 0
+        for sub in t[1]:
+            fields.append((compile_decoder(sub), offset))
+            offset += head_size(sub)
+
+        def read(mv, pos, base):
+            start = base + _small(mv, pos) if dynamic else pos
+            return tuple(field(mv, start + off, start) for field, off in fields)
+        return read
+    raise ValueError(f"Unsupported ABI type: {t}")
+
+
+def decode(types, data):
+    """Decodes a return value: decode(['uint112', 'uint112', 'uint32'], res) -> [r0, r1, ts]"""
+    mv = as_buffer(data)
+    values = []
+    pos = 0
+    try:
+        for type_str in types:
+            t = parse_type(type_str)
+            values.append(compile_decoder(t)(mv, pos, 0))
+            pos += head_size(t)
+    except struct.error as e:
+        raise ABIDecodeError(str(e)) from None
+    return values
+
+
+def decode_symbol(data):
+    """symbol()/name() result, whether the token returns string or bytes32; '?' if it is neither"""
+    mv = as_buffer(data)
+    if len(mv) == 32:
+        # bytes32 symbols (MKR-style): NUL-padded on the right
+        return bytes(mv).rstrip(b"\x00").decode("utf-8", errors="replace") or "?"
+    try:
+        if len(mv) >= 64 and _small(mv, 0) == 32:
+            length = _small(mv, 32)
+            if 64 + length <= len(mv):
+                return bytes(mv[64 : 64 + length]).decode("utf-8", errors="replace")
+    except ABIDecodeError:
+        pass
+    return "?"
+
+
+# ---- encoding ----
+
+WORD_FALSE = bytes(32)
+WORD_TRUE = (1).to_bytes(32, "big")
+WORD_32 = (32).to_bytes(32, "big")  # head of a single dynamic argument
+
+
+def _word(value):
+    return value.to_bytes(32, "big")
+
+
+def _address(value):
+    return bytes(12) + (value if isinstance(value, (bytes, bytearray)) else bytes.fromhex(value[2:] if value[:2] == "0x" else value))
+
+
+@lru_cache(maxsize=None)
+def compile_encoder(t):
+    """Returns f(value) -> encoded bytes (the head for static types, the tail for dynamic ones)"""
+    kind = t[0]
+    if kind == "uint":
+        return _word
+    if kind == "int":
+        return lambda value: (value % (1 << 256)).to_bytes(32, "big")
+    if kind == "address":
+        return _address
+    if kind == "bool":
+        return lambda value: WORD_TRUE if value else WORD_FALSE
+    if kind == "string" or (kind == "bytes" and t[1] is None):
+        def encode_dynamic(value):
+            raw = value.encode("utf-8") if isinstance(value, str) else value
+            return len(raw).to_bytes(32, "big") + raw + bytes(-len(raw) % 32)
+        return encode_dynamic
+    if kind == "bytes":
+        return lambda value: bytes(value) + bytes(32 - len(value))
+    if kind == "array":
+        item = compile_encoder(t[1])
+        item_dynamic = is_dynamic(t[1])
+        fixed = t[2]
+
+        def encode_array(values):
+            prefix = b"" if fixed is not None else len(values).to_bytes(32, "big")
+            if not item_dynamic:
+                return prefix + b"".join(map(item, values))
+            tails = [item(v) for v in values]
+            heads = []
+            offset = 32 * len(values)
+            for tail in tails:
+                heads.append(offset.to_bytes(32, "big"))
+                offset += len(tail)
+            return prefix + b"".join(heads) + b"".join(tails)
+        return encode_array
+    if kind == "tuple":
+        return compile_sequence_encoder(t[1])
+    raise ValueError(f"Unsupported ABI type: {t}")
+
+
+@lru_cache(maxsize=None)
+def compile_sequence_encoder(types):
+    """Encoder for a tuple / argument list of the given parsed types"""
+    fields = [(compile_encoder(t), is_dynamic(t)) for t in types]
+    head_total = sum(head_size(t) for t in types)
+    if not any(dynamic for _, dynamic in fields):
+        return lambda values: b"".join([enc(v) for (enc, _), v in zip(fields, values)])
+
+    def encode_sequence(values):
+        heads = []
+        tails = []
+        offset = head_total
+        for (enc, dynamic), value in zip(fields, values):
+            encoded = enc(value)
+            if dynamic:
+                heads.append(offset.to_bytes(32, "big"))
+                tails.append(encoded)
+                offset += len(encoded)
+            else:
+                heads.append(encoded)
+        return b"".join(heads) + b"".join(tails)
+    return encode_sequence
+
+
+def join_dynamic(tails):
+    """T[] for already-encoded dynamic items: length, offsets, then the items"""
+    heads = [len(tails).to_bytes(32, "big")]
+    offset = 32 * len(tails)
+    for tail in tails:
+        heads.append(offset.to_bytes(32, "big"))
+        offset += len(tail)
+    return b"".join(heads) + b"".join(tails)
+
+
+def encode(types, values):
+    return compile_sequence_encoder(tuple(parse_type(t) for t in types))(values)
+
+
+class CallTemplate:
+    """A function signature compiled once; encode(*args) returns '0x…' call data, memoized per argument tuple"""
+
+    def __init__(self, signature, cache=True):
+        _, _, args = signature.partition("(")
+        self.signature = signature
+        self.selector = "0x" + keccak256(signature.encode()).hex()[:8]
+        self.types = tuple(parse_type(t) for t in split_types(args[:-1]))
+        self.encoder = compile_sequence_encoder(self.types)
+        if not self.types:
+            # No arguments: the call data is the selector itself
+            self.encode = lambda: self.selector
+        elif cache:
+            self.encode = lru_cache(maxsize=CALLDATA_CACHE_SIZE)(self._encode)
+        else:
+            self.encode = self._encode
+
+    def _encode(self, *args):
+        return self.selector + self.encoder(args).hex()
+
+
+# ---- benchmark ----
+
+def bench(rounds=20000):
+    """Times the binary codec against the hex-string helpers in get_token_price.py"""
+    import time
+
+    import get_token_price as gtp
+
+    # The previous string-sniffing symbol decoder, kept here as the baseline
+    def hex_decode_string(hex_str):
+        if not hex_str or hex_str == "0x": return "?"
+        try:
+            raw = hex_str.replace("0x", "")
+            if len(raw) >= 64 and int(raw[0:64], 16) == 32:
+                length = int(raw[64:128], 16)
+                return bytes.fromhex(raw[128 : 128 + length * 2]).decode("utf-8")
+            try:
+                return bytes.fromhex(raw).decode("utf-8").rstrip("\x00")
+            except:
+                return "?"
+        except:
+            return "?"
+
+    token = "0x55d398326f99059ff775485246999027b3197955"
+    other = "0xbb4cdb9cbd36b01bd1cbaebf2de08d9173bc095c"
+    func_get_pair = "0xe6a43905"
+    string_res = "0x" + encode(["string"], ["Cake-LP"]).hex()
+    bytes32_res = "0x" + b"MKR".ljust(32, b"\x00").hex()
+    # Distinct targets, like a multicall over 500 pools
+    calls = [("0x" + i.to_bytes(20, "big").hex(), gtp.FUNC_GET_RESERVES) for i in range(1, 501)]
+    get_pair = CallTemplate("getPair(address,address)")
+    # Generic encoder, only used to check that aggregate3_item() lays out the same bytes
+    aggregate3 = CallTemplate("aggregate3((address,bool,bytes)[])", cache=False)
+    multicall_res = "0x" + encode(["(bool,bytes)[]"], [[(True, bytes(96))] * 500]).hex()
+
+    def hex_aggregate3(calls):
+        heads, tails = [], []
+        offset = 32 * len(calls)
+        for target, data in calls:
+            raw = data.replace("0x", "")
+            item = gtp.pad_address(target) + gtp.encode_uint(1) + gtp.encode_uint(96) + gtp.encode_uint(len(raw) // 2) + raw + "0" * (-len(raw) % 64)
+            heads.append(gtp.encode_uint(offset))
+            tails.append(item)
+            offset += len(item) // 2
+        return gtp.FUNC_AGGREGATE3 + gtp.encode_uint(32) + gtp.encode_uint(len(calls)) + "".join(heads) + "".join(tails)
+
+    def hex_decode_aggregate3(res):
+        raw = res.replace("0x", "")
+        word = lambda pos: int(raw[pos * 2 : pos * 2 + 64], 16)
+        base = word(0) + 32
+        results = []
+        for i in range(word(base - 32)):
+            item = base + word(base + 32 * i)
+            data_pos = item + word(item + 32)
+            length = word(data_pos)
+            results.append((word(item) != 0, "0x" + raw[(data_pos + 32) * 2 : (data_pos + 32 + length) * 2]))
+        return results
+
+    def uncached_aggregate3():
+        # First sight of every call: the item cache starts empty
+        gtp.aggregate3_item.cache_clear()
+        return gtp.encode_aggregate3(calls)
+
+    cases = [
+        ("symbol() string", lambda: hex_decode_string(string_res), lambda: decode_symbol(string_res)),
+        ("symbol() bytes32", lambda: hex_decode_string(bytes32_res), lambda: decode_symbol(bytes32_res)),
+        ("getPair call data", lambda: func_get_pair + gtp.pad_address(token) + gtp.pad_address(other),
+         lambda: get_pair.encode(token, other)),
+        ("aggregate3 x500 encode", lambda: hex_aggregate3(calls), uncached_aggregate3),
+        ("aggregate3 x500 (repeat)", lambda: hex_aggregate3(calls), lambda: gtp.encode_aggregate3(calls)),
+        ("aggregate3 x500 decode", lambda: hex_decode_aggregate3(multicall_res),
+         lambda: decode(["(bool,bytes)[]"], multicall_res)),
+    ]
+    if get_pair.encode(token, other) != func_get_pair + gtp.pad_address(token) + gtp.pad_address(other):
+        print("❌ getPair template disagrees with the hex helpers")
+        return False
+    if not aggregate3.encode([(t, True, bytes.fromhex(d[2:])) for t, d in calls]) == uncached_aggregate3() == hex_aggregate3(calls):
+        print("❌ aggregate3 encoding disagrees with the hex helpers")
+        return False
+    if gtp.decode_aggregate3(multicall_res) != hex_decode_aggregate3(multicall_res):
+        print("❌ aggregate3 decoding disagrees with the hex helpers")
+        return False
+
+    print(f"{'case':<24}{'hex helpers':>14}{'binary codec':>14}{'speedup':>9}")
+    for name, old, new in cases:
+        n = rounds if "x500" not in name else max(1, rounds // 500)
+        timings = []
+        for fn in (old, new):
+            start = time.perf_counter()
+            for _ in range(n): fn()
+            timings.append((time.perf_counter() - start) / n * 1e6)
+        print(f"{name:<24}{timings[0]:>12.2f}µs{timings[1]:>12.2f}µs{timings[0] / timings[1]:>8.1f}x")
+    print(f"   bytes32 symbol: hex helper -> {hex_decode_string(bytes32_res)!r}, codec -> {decode_symbol(bytes32_res)!r}")
+    return True
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__.strip())
+        sys.exit(1)
+    sys.exit(0 if bench() else 1)
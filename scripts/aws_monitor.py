@@ -0,0 +1,572 @@
+"""
+CloudWatch alarm monitor: Telegram notifications with live instance metrics.
+
+Python version of aws-monitor-task.sh that runs as one long-lived process
+instead of spawning an `aws` CLI process per call. Each poll makes:
+
+    DescribeAlarms (StateValue=ALARM)      one call (paginated)
+    DescribeInstances                      one call per 200 uncached instances
+    ListMetrics (CWAgent)                  one scan, only when cached dimensions expire
+    GetMetricData                          one call for CPU / memory / swap / disk
+                                           of every alarming instance
+
+Requests are SigV4-signed with the standard library over one keep-alive HTTPS
+connection per service, so no boto3 / aws CLI is needed. Instance names, IPs
+and metric dimensions are cached for INSTANCE_TTL / DIMENSIONS_TTL seconds.
+An alarm is re-sent at most once per SUPPRESS_SECONDS; the timestamps live in
+/tmp/alarm_timestamps like the shell version, so switching over does not
+re-send.
+
+Environment: AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY (AWS_SESSION_TOKEN),
+AWS_DEFAULT_REGION, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID.
+
+Usage:
+    python3 aws_monitor.py [--region ap-southeast-1] [--endpoint-url URL] [--interval 60]
+                           [--once] [--dry-run] [--stub 20 [--stub-fail GetMetricData,...]]
+
+--endpoint-url sends CloudWatch and EC2 calls to one local endpoint; --stub N
+starts a local stand-in API with N alarms and runs one dry-run poll against it
+(--stub-fail makes the listed actions return errors).
+"""
+import datetime
+import hashlib
+import hmac
+import html
+import http.client
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rpc_client import RECONNECT_ERRORS
+
+REGION = os.environ.get("AWS_DEFAULT_REGION", "ap-southeast-1")
+SUPPRESS_SECONDS = 300      # 抑制时间 - 5分钟
+POLL_INTERVAL = 60
+INSTANCE_TTL = 3600         # instance names / IPs
+DIMENSIONS_TTL = 3600       # CWAgent metric dimensions
+METRIC_WINDOW = 600         # average over the last 10 minutes
+REQUEST_TIMEOUT = 15
+MAX_QUERIES = 500           # GetMetricData limit per request
+MAX_FILTER_VALUES = 200     # EC2 limit on values in one filter (FilterLimitExceeded)
+STATE_DIR = "/tmp/alarm_timestamps"
+TELEGRAM_API = "https://api.telegram.org"
+
+# service -> (endpoint prefix, signing name, API version)
+SERVICES = {
+    "cloudwatch": ("monitoring", "monitoring", "2010-08-01"),
+    "ec2": ("ec2", "ec2", "2016-11-15"),
+}
+# Metrics shown for every instance: key -> label
+METRIC_KEYS = ("cpu", "mem", "swap", "root", "data")
+DISK_PATHS = {"root": "/", "data": "/data"}
+
+
+class AwsError(Exception):
+    def __init__(self, code, message):
+        self.code = code
+        super().__init__(f"{code}: {message}")
+
+
+def xml_to_py(elem):
+    """Query API XML -> dicts / lists / strings (member / item lists become lists)"""
+    children = list(elem)
+    if not children:
+        return elem.text or ""
+    tags = [c.tag.rpartition("}")[2] for c in children]
+    if all(t in ("member", "item") for t in tags):
+        return [xml_to_py(c) for c in children]
+    return {t: xml_to_py(c) for t, c in zip(tags, children)}
+
+
+def as_list(value):
+    """Empty XML lists come back as empty strings"""
+    return value if isinstance(value, list) else []
+
+
+class AwsClient:
+    """Query API client for one service over a single keep-alive connection"""
+
+    def __init__(self, service, region=REGION, endpoint_url=None):
+        prefix, self.signing_name, self.version = SERVICES[service]
+        url = urllib.parse.urlsplit(endpoint_url or f"https://{prefix}.{region}.amazonaws.com")
+        self.region = region
+        self.https = url.scheme == "https"
+        self.netloc = url.netloc
+        self.path = url.path or "/"
+        self.access_key = os.environ.get("AWS_ACCESS_KEY_ID", "")
+        self.secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+        self.token = os.environ.get("AWS_SESSION_TOKEN")
+        self.conn = None
+        self.calls = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.netloc, timeout=REQUEST_TIMEOUT)
+
+    def _headers(self, body):
+        """SigV4 headers for a POST of `body` to the service root"""
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        headers = {
+            "content-type": "application/x-www-form-urlencoded; charset=utf-8",
+            "host": self.netloc,
+            "x-amz-date": amz_date,
+        }
+        if self.token:
+            headers["x-amz-security-token"] = self.token
+        signed = ";".join(sorted(headers))
+        canonical = "\n".join([
+            "POST", self.path, "",
+            "".join(f"{k}:{headers[k]}\n" for k in sorted(headers)),
+            signed, hashlib.sha256(body).hexdigest(),
+        ])
+        scope = f"{amz_date[:8]}/{self.region}/{self.signing_name}/aws4_request"
+        to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (amz_date[:8], self.region, self.signing_name, "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed}, Signature={signature}")
+        return headers
+
+    def _roundtrip(self, body):
+        if self.conn is None:
+            self.conn = self._connect()
+        self.conn.request("POST", self.path, body=body, headers=self._headers(body))
+        resp = self.conn.getresponse()
+        data = resp.read()
+        if resp.will_close:
+            self.close()
+        return resp.status, data
+
+    def call(self, action, params=None):
+        """Runs one action and returns its <ActionResult> (or EC2 response body) as Python data"""
+        body = urllib.parse.urlencode(
+            {"Action": action, "Version": self.version, **(params or {})}, quote_via=urllib.parse.quote).encode()
+        self.calls += 1
+        try:
+            status, data = self._roundtrip(body)
+        except RECONNECT_ERRORS:
+            # Keep-alive connection closed by the server between polls: retry once
+            self.close()
+            try:
+                status, data = self._roundtrip(body)
+            except Exception:
+                self.close()
+                raise
+        except Exception:
+            self.close()
+            raise
+        root = ET.fromstring(data)
+        if status != 200:
+            code = root.find(".//{*}Code")
+            message = root.find(".//{*}Message")
+            raise AwsError(code.text if code is not None else f"HTTP {status}",
+                           message.text if message is not None else "")
+        result = xml_to_py(root)
+        return result.get(f"{action}Result", result)
+
+    def paginate(self, action, params, key):
+        """Yields the items of list `key` across NextToken pages"""
+        params = dict(params)
+        while True:
+            result = self.call(action, params)
+            yield from as_list(result.get(key))
+            token = result.get("NextToken") or result.get("nextToken")
+            if not token: return
+            params["NextToken"] = token
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class TtlCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.items = {}
+
+    def missing(self, keys, now):
+        return [k for k in keys if k not in self.items or self.items[k][0] <= now]
+
+    def get(self, key, default=None):
+        entry = self.items.get(key)
+        return entry[1] if entry else default
+
+    def put(self, key, value, now):
+        self.items[key] = (now + self.ttl, value)
+
+
+class Suppressor:
+    """At most one notification per alarm per SUPPRESS_SECONDS, persisted across restarts"""
+
+    def __init__(self, state_dir=STATE_DIR, seconds=SUPPRESS_SECONDS):
+        self.state_dir = state_dir
+        self.seconds = seconds
+        self.sent = {}
+
+    def _path(self, name):
+        return os.path.join(self.state_dir, hashlib.md5(name.encode()).hexdigest())
+
+    def last_sent(self, name):
+        if name not in self.sent:
+            try:
+                with open(self._path(name)) as f:
+                    self.sent[name] = int(f.read().strip())
+            except (OSError, ValueError):
+                self.sent[name] = None
+        return self.sent[name]
+
+    def mark(self, name, now):
+        self.sent[name] = int(now)
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self._path(name), "w") as f:
+            f.write(str(int(now)))
+
+
+def clean_reason(reason, metric_name, alarm_name):
+    """'Threshold Crossed: ... [95.3 (...)] was greater than the threshold (90.0)' -> 当前值 95% > 阈值 90%"""
+    if "Threshold Crossed" in reason:
+        value = re.search(r"\[([0-9.]+)", reason)
+        threshold = re.search(r"threshold \(([0-9.]+)\)", reason)
+        op = "超过"
+        for phrase, symbol in (("greater than or equal to", "≥"), ("greater than", ">"),
+                               ("less than or equal to", "≤"), ("less than", "<")):
+            if phrase in reason:
+                op = symbol
+                break
+        suffix = "%" if re.search(r"CPU|Memory|DiskSpace|Utilization|Percent", metric_name) or "率" in alarm_name else ""
+        if value and threshold:
+            return f"当前值 {int(float(value.group(1)))}{suffix} {op} 阈值 {int(float(threshold.group(1)))}{suffix}"
+    return re.sub(r"(\d+)\.\d+", r"\1", reason)
+
+
+def format_time(ts):
+    """2025-12-19T08:20:00.000Z -> 2025-12-19 08:20:00"""
+    return re.sub(r"(\.\d+)?(Z|[+-]\d\d:?\d\d)?$", "", ts).replace("T", " ")
+
+
+def alarm_instance(alarm):
+    for dim in as_list(alarm.get("Dimensions")):
+        if dim.get("Name") == "InstanceId":
+            return dim.get("Value")
+    return None
+
+
+class Monitor:
+    def __init__(self, region=REGION, endpoint_url=None, dry_run=False, state_dir=STATE_DIR):
+        self.region = region
+        self.cloudwatch = AwsClient("cloudwatch", region, endpoint_url)
+        self.ec2 = AwsClient("ec2", region, endpoint_url)
+        self.instances = TtlCache(INSTANCE_TTL)
+        self.dimensions = TtlCache(DIMENSIONS_TTL)
+        self.suppressor = Suppressor(state_dir)
+        self.dry_run = dry_run or not os.environ.get("TELEGRAM_BOT_TOKEN")
+
+    def alarms(self):
+        return list(self.cloudwatch.paginate("DescribeAlarms", {"StateValue": "ALARM"}, "MetricAlarms"))
+
+    def refresh_instances(self, ids, now):
+        """Name and IP of every uncached instance, MAX_FILTER_VALUES instances per DescribeInstances call"""
+        missing = self.instances.missing(ids, now)
+        for offset in range(0, len(missing), MAX_FILTER_VALUES):
+            chunk = missing[offset:offset + MAX_FILTER_VALUES]
+            # A filter (unlike InstanceId.N) does not fail the whole call for a terminated instance
+            params = {"Filter.1.Name": "instance-id"}
+            params.update({f"Filter.1.Value.{i}": iid for i, iid in enumerate(chunk, 1)})
+            found = {}
+            for reservation in self.ec2.paginate("DescribeInstances", params, "reservationSet"):
+                for inst in as_list(reservation.get("instancesSet")):
+                    tags = {t.get("key"): t.get("value") for t in as_list(inst.get("tagSet"))}
+                    found[inst.get("instanceId")] = {
+                        "name": tags.get("Name") or "N/A",
+                        "ip": inst.get("ipAddress") or inst.get("privateIpAddress") or "N/A",
+                    }
+            for iid in chunk:
+                self.instances.put(iid, found.get(iid), now)
+
+    def refresh_dimensions(self, ids, now):
+        """CWAgent metric names / dimensions (memory, swap, / and /data) of every instance in one scan"""
+        missing = self.dimensions.missing(ids, now)
+        if not missing: return
+        found = {}
+        params = {"Namespace": "CWAgent", "Dimensions.member.1.Name": "InstanceId", "RecentlyActive": "PT3H"}
+        for metric in self.cloudwatch.paginate("ListMetrics", params, "Metrics"):
+            name = metric.get("MetricName")
+            dims = [(d.get("Name"), d.get("Value")) for d in as_list(metric.get("Dimensions"))]
+            iid = dict(dims).get("InstanceId")
+            instance = found.setdefault(iid, {})
+            if name == "mem_used_percent":
+                instance.setdefault("mem", (name, dims))
+            elif name == "swap_used_percent":
+                instance.setdefault("swap", (name, dims))
+            for key, path in DISK_PATHS.items():
+                if ("path", path) in dims and (key not in instance or name == "disk_used_percent"):
+                    instance[key] = (name, dims)
+        # Cache every instance seen, not only the alarming ones: the next alarm storm needs no scan
+        for iid, instance in found.items():
+            self.dimensions.put(iid, instance, now)
+        for iid in missing:
+            if iid not in found: self.dimensions.put(iid, {}, now)
+
+    def fetch_metrics(self, ids, now):
+        """{instance: {key: value}} for every instance from batched GetMetricData calls"""
+        queries = []
+        for n, iid in enumerate(ids):
+            metrics = {"cpu": ("AWS/EC2", "CPUUtilization", [("InstanceId", iid)])}
+            for key, (name, dims) in self.dimensions.get(iid, {}).items():
+                metrics[key] = ("CWAgent", name, dims)
+            for key, (namespace, name, dims) in metrics.items():
+                queries.append((f"m{n}_{key}", iid, key, namespace, name, dims))
+
+        values = {iid: {} for iid in ids}
+        end = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).replace(microsecond=0)
+        start = end - datetime.timedelta(seconds=METRIC_WINDOW)
+        for offset in range(0, len(queries), MAX_QUERIES):
+            chunk = queries[offset:offset + MAX_QUERIES]
+            params = {"StartTime": start.strftime("%Y-%m-%dT%H:%M:%SZ"), "EndTime": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                      "ScanBy": "TimestampDescending"}
+            by_id = {}
+            for i, (qid, iid, key, namespace, name, dims) in enumerate(chunk, 1):
+                p = f"MetricDataQueries.member.{i}"
+                params.update({f"{p}.Id": qid, f"{p}.MetricStat.Metric.Namespace": namespace,
+                               f"{p}.MetricStat.Metric.MetricName": name,
+                               f"{p}.MetricStat.Period": str(METRIC_WINDOW), f"{p}.MetricStat.Stat": "Average"})
+                for j, (dim_name, dim_value) in enumerate(dims, 1):
+                    params[f"{p}.MetricStat.Metric.Dimensions.member.{j}.Name"] = dim_name
+                    params[f"{p}.MetricStat.Metric.Dimensions.member.{j}.Value"] = dim_value
+                by_id[qid] = (iid, key)
+            for result in self.cloudwatch.paginate("GetMetricData", params, "MetricDataResults"):
+                points = as_list(result.get("Values"))
+                if result.get("Id") in by_id and points:
+                    iid, key = by_id[result["Id"]]
+                    # Newest datapoint first (ScanBy=TimestampDescending)
+                    values[iid].setdefault(key, float(points[0]))
+        return values
+
+    def message(self, alarm, instance_id, info, metrics):
+        name = alarm.get("AlarmName", "")
+        reason = clean_reason(alarm.get("StateReason", ""), alarm.get("MetricName") or "", name)
+        lines = [f"🚨 <b>{html.escape(name)}</b> 🚨", "",
+                 f"🌏 <b>区域:</b> {self.region}",
+                 f"⏰ <b>时间:</b> {format_time(alarm.get('StateUpdatedTimestamp', ''))}"]
+        if info:
+            lines += [f"💻 <b>实例:</b> {html.escape(info['name'])}", f"🆔 <b>ID:</b> {instance_id}",
+                      f"🌐 <b>IP:</b> {info['ip']}"]
+            shown = {k: f"{metrics[k]:.1f}" if k in metrics else "N/A" for k in METRIC_KEYS}
+            lines.append(f"📊 <b>状态:</b> CPU: {shown['cpu']}% | Mem: {shown['mem']}% | Swap: {shown['swap']}% "
+                         f"| /: {shown['root']}% | /data: {shown['data']}%")
+        lines += ["", f"📉 <b>详情:</b> {html.escape(reason)}"]
+        return "\n".join(lines), reason
+
+    def notify(self, text, html_mode=True):
+        if self.dry_run:
+            print(text)
+            print("-" * 40)
+            return
+        data = {"chat_id": os.environ.get("TELEGRAM_CHAT_ID", ""), "text": text}
+        if html_mode: data["parse_mode"] = "HTML"
+        url = f"{TELEGRAM_API}/bot{os.environ['TELEGRAM_BOT_TOKEN']}/sendMessage"
+        try:
+            urllib.request.urlopen(url, urllib.parse.urlencode(data).encode(), timeout=REQUEST_TIMEOUT).read()
+        except Exception as e:
+            print(f"❌ Telegram 发送失败: {e}")
+
+    def poll(self):
+        now = time.time()
+        due = []
+        for alarm in self.alarms():
+            name = alarm.get("AlarmName", "")
+            last = self.suppressor.last_sent(name)
+            if last is not None and now - last < self.suppressor.seconds:
+                print(f"跳过报警: '{name}' (上次发送于 {int(now - last)} 秒前, 限制 {self.suppressor.seconds} 秒)")
+                continue
+            due.append(alarm)
+        if not due: return 0
+
+        ids = sorted({iid for iid in map(alarm_instance, due) if iid})
+        metrics = {}
+        lookup_failed = False
+        try:
+            if ids:
+                self.refresh_instances(ids, now)
+                known = [iid for iid in ids if self.instances.get(iid)]
+                self.refresh_dimensions(known, now)
+                metrics = self.fetch_metrics(known, now) if known else {}
+        except (OSError, AwsError, ET.ParseError, http.client.HTTPException) as e:
+            # Enrichment is best effort: the alarm still goes out, with N/A where data is missing
+            print(f"⚠️ 获取实例信息/指标失败: {e}")
+            lookup_failed = True
+
+        for alarm in due:
+            name = alarm.get("AlarmName", "")
+            self.suppressor.mark(name, now)
+            iid = alarm_instance(alarm)
+            info = self.instances.get(iid) if iid else None
+            if iid and info is None and lookup_failed:
+                info = {"name": "N/A", "ip": "N/A"}
+            text, reason = self.message(alarm, iid, info, metrics.get(iid, {}))
+            print(f"发送报警: '{name}' - {reason}")
+            self.notify(text)
+        return len(due)
+
+    def run(self, interval=POLL_INTERVAL, once=False):
+        self.notify(f"✅ AWS Monitor Started ({self.region}) - Enhanced Metrics Mode", html_mode=False)
+        print("监控已启动 (Enhanced Metrics Mode)，正在轮询...")
+        while True:
+            start = time.time()
+            try:
+                sent = self.poll()
+                if sent:
+                    print(f"📨 {sent} 条报警, 用时 {time.time() - start:.2f}s")
+            except (OSError, AwsError, ET.ParseError, http.client.HTTPException) as e:
+                print(f"❌ 轮询失败: {e}")
+            if once: return
+            time.sleep(max(0, interval - (time.time() - start)))
+
+
+class StubError(Exception):
+    """(code, message) answered by the stub as a Query API error"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Stand-in for the CloudWatch / EC2 Query APIs with self.server.alarms alarms"""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    def do_POST(self):
+        params = dict(urllib.parse.parse_qsl(self.rfile.read(int(self.headers["Content-Length"])).decode()))
+        action = params.get("Action")
+        self.server.calls[action] = self.server.calls.get(action, 0) + 1
+        if not self.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256 Credential="):
+            return self.reply(403, "<ErrorResponse><Error><Code>MissingAuthenticationToken</Code>"
+                                   "<Message>unsigned</Message></Error></ErrorResponse>")
+        body = getattr(self, "stub_" + str(action), None)
+        if body is None:
+            return self.reply(400, f"<ErrorResponse><Error><Code>InvalidAction</Code>"
+                                   f"<Message>{action}</Message></Error></ErrorResponse>")
+        try:
+            if action in self.server.fail:
+                raise StubError("InternalFailure", f"{action} unavailable")
+            result = body(params)
+        except StubError as e:
+            return self.reply(400, f"<ErrorResponse><Error><Code>{e.args[0]}</Code>"
+                                   f"<Message>{e.args[1]}</Message></Error></ErrorResponse>")
+        if action != "DescribeInstances":
+            result = f"<{action}Result>{result}</{action}Result>"
+        self.reply(200, f'<{action}Response xmlns="http://stub/">{result}</{action}Response>')
+
+    def reply(self, status, text):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stub_DescribeAlarms(self, params):
+        members = "".join(
+            f"<member><AlarmName>CPU 使用率过高 {i}</AlarmName><MetricName>CPUUtilization</MetricName>"
+            f"<StateReason>Threshold Crossed: 1 out of the last 1 datapoints [9{i % 10}.37 (19/12/25 08:15:00)] "
+            f"was greater than or equal to the threshold (90.0) (minimum 1 datapoint for OK -&gt; ALARM transition)."
+            f"</StateReason><StateUpdatedTimestamp>2025-12-19T08:20:00.000Z</StateUpdatedTimestamp>"
+            f"<Dimensions><member><Name>InstanceId</Name><Value>i-{i:017x}</Value></member></Dimensions></member>"
+            for i in range(self.server.alarms))
+        return f"<MetricAlarms>{members}</MetricAlarms>"
+
+    def stub_DescribeInstances(self, params):
+        ids = [v for k, v in params.items() if k.startswith("Filter.1.Value.")]
+        if len(ids) > MAX_FILTER_VALUES:
+            raise StubError("FilterLimitExceeded", f"The maximum number of filter values is {MAX_FILTER_VALUES}")
+        items = "".join(
+            f"<item><instanceId>{iid}</instanceId><privateIpAddress>10.0.{n // 256}.{n % 256}</privateIpAddress>"
+            f"<tagSet><item><key>Name</key><value>bsc-node-{n}</value></item></tagSet></item>"
+            for n, iid in ((int(iid[2:], 16), iid) for iid in ids))
+        # EC2 responses have no <ActionResult> wrapper: AwsClient.call falls back to the root element
+        return f"<reservationSet><item><instancesSet>{items}</instancesSet></item></reservationSet>"
+
+    def stub_ListMetrics(self, params):
+        # 100 instances per page, to exercise NextToken
+        start = int(params.get("NextToken", 0))
+        end = min(start + 100, self.server.alarms)
+        page = "<Metrics>" + "".join(self.stub_metrics(f"i-{i:017x}") for i in range(start, end)) + "</Metrics>"
+        return page + (f"<NextToken>{end}</NextToken>" if end < self.server.alarms else "")
+
+    def stub_metrics(self, iid):
+        dims = lambda extra: "".join(f"<member><Name>{k}</Name><Value>{v}</Value></member>"
+                                     for k, v in [("InstanceId", iid)] + extra)
+        metrics = [("mem_used_percent", []), ("swap_used_percent", []),
+                   ("disk_used_percent", [("path", "/"), ("device", "nvme0n1p1"), ("fstype", "xfs")]),
+                   ("disk_used_percent", [("path", "/data"), ("device", "nvme1n1"), ("fstype", "xfs")])]
+        return "".join(f"<member><MetricName>{m}</MetricName><Namespace>CWAgent</Namespace>"
+                       f"<Dimensions>{dims(extra)}</Dimensions></member>" for m, extra in metrics)
+
+    def stub_GetMetricData(self, params):
+        ids = [v for k, v in params.items() if k.endswith(".Id")]
+        return "<MetricDataResults>" + "".join(
+            f"<member><Id>{qid}</Id><StatusCode>Complete</StatusCode><Values><member>{40 + len(qid) * 1.25}</member>"
+            f"</Values></member>" for qid in ids) + "</MetricDataResults>"
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(alarms, fail=()):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.alarms = alarms
+    server.fail = set(fail)
+    server.calls = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+
+    def option(name, default=None):
+        if name not in args: return default
+        return args[args.index(name) + 1]
+
+    endpoint_url = option("--endpoint-url")
+    dry_run = "--dry-run" in args
+    once = "--once" in args
+    state_dir = STATE_DIR
+    stub = None
+    if option("--stub"):
+        stub = start_stub(int(option("--stub")), (option("--stub-fail") or "").split(","))
+        endpoint_url = f"http://127.0.0.1:{stub.server_address[1]}"
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDSTUB")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+        state_dir = tempfile.mkdtemp(prefix="aws_monitor_stub_")
+        dry_run = once = True
+    elif not os.environ.get("AWS_ACCESS_KEY_ID"):
+        print("错误: 请先导出 AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY 等环境变量。")
+        sys.exit(1)
+
+    monitor = Monitor(option("--region", REGION), endpoint_url, dry_run, state_dir)
+    try:
+        monitor.run(float(option("--interval", POLL_INTERVAL)), once)
+    except KeyboardInterrupt:
+        print("\n👋 监控已停止。")
+    finally:
+        monitor.cloudwatch.close()
+        monitor.ec2.close()
+    if stub:
+        print(f"📊 API 调用: {dict(sorted(stub.calls.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,9 +39,9 @@ while true; do
     LOCAL_HEX=$(echo $LOCAL_DATA | grep -o '"result":"[^"]*"' | cut -d'"' -f4)
     LOCAL_DEC=$((LOCAL_HEX))
     
-    # 获取本地最新区块的时间戳和详情
+    # 获取本地最新区块的时间戳(只取区块头,不拉完整交易)
     LOCAL_BLOCK=$(curl -s -X POST -H "Content-Type: application/json" \
-        --data "{\"jsonrpc\":\"2.0\",\"method\":\"eth_getBlockByNumber\",\"params\":[\"latest\", true],\"id\":1}" \
+        --data "{\"jsonrpc\":\"2.0\",\"method\":\"eth_getBlockByNumber\",\"params\":[\"${LOCAL_HEX}\", false],\"id\":1}" \
         http://localhost:8545 2>/dev/null)
     
     if [ $? -eq 0 ] && [ -n "$LOCAL_BLOCK" ]; then
@@ -50,8 +50,10 @@ while true; do
         LOCAL_TIME_STR=$(date -d @$LOCAL_TIMESTAMP '+%H:%M:%S')
         
         # 获取交易数量
-        TX_COUNT=$(echo $LOCAL_BLOCK | grep -o '"transactions":\[[^]]*\]' | tr -cd ',' | wc -c)
-        TX_COUNT=$((TX_COUNT + 1))
+        TX_COUNT_HEX=$(curl -s -X POST -H "Content-Type: application/json" \
+            --data "{\"jsonrpc\":\"2.0\",\"method\":\"eth_getBlockTransactionCountByNumber\",\"params\":[\"${LOCAL_HEX}\"],\"id\":1}" \
+            http://localhost:8545 2>/dev/null | grep -o '"result":"[^"]*"' | cut -d'"' -f4)
+        TX_COUNT=$([ -n "$TX_COUNT_HEX" ] && echo $((TX_COUNT_HEX)) || echo "N/A")
     else
         LOCAL_TIME_STR="N/A"
         TX_COUNT="N/A"
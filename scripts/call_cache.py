@@ -0,0 +1,154 @@
+"""
+Content-addressed cache for eth_call / eth_getStorageAt results pinned to a block number.
+
+A call at a fixed height can never change, so (block, to, data) is hashed
+into a 16-byte key and the raw return bytes are stored in a SQLite file under
+cache/. The file is size-bounded: once it grows past max_bytes the least
+recently used entries are evicted. Only concrete block numbers are cacheable,
+never "latest"/"pending".
+
+The same file remembers which pools passed the --storage slot layout check
+(get_token_price.py), so a pool is verified against eth_call once, not once
+per process. These rows are tiny and never evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from token_meta import CACHE_DIR
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "calls.sqlite")
+DEFAULT_MAX_BYTES = int(os.environ.get("BSC_CALL_CACHE_MB", "256")) * 1024 * 1024
+# Per-row overhead (key, timestamps, b-tree) on top of the value itself
+ROW_OVERHEAD = 48
+
+
+def block_number(block):
+    """Returns the block as int if it is a concrete height, else None"""
+    if isinstance(block, int):
+        return block
+    if isinstance(block, str) and block.startswith("0x"):
+        return int(block, 16)
+    return None
+
+
+def call_key(block, to_addr, data):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(block.to_bytes(8, "big"))
+    h.update(bytes.fromhex(to_addr.lower().replace("0x", "")))
+    h.update(bytes.fromhex(data.replace("0x", "")))
+    return h.digest()
+
+
+def storage_key(block, address, slot):
+    # Separate hash personalisation so storage reads never collide with eth_call keys
+    h = hashlib.blake2b(digest_size=16, person=b"getStorageAt")
+    h.update(block.to_bytes(8, "big"))
+    h.update(bytes.fromhex(address.lower().replace("0x", "")))
+    h.update(slot.to_bytes(32, "big"))
+    return h.digest()
+
+
+class CallCache:
+    """(block, to, data) -> eth_call result, LRU-evicted to a byte budget"""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = None
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS calls ("
+                "key BLOB PRIMARY KEY, value BLOB NOT NULL, used INTEGER NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS calls_used ON calls (used)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS layouts (pool BLOB PRIMARY KEY, ok INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            row = self.db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM calls").fetchone()
+            self.size = row[0] * ROW_OVERHEAD + row[1]
+        return self.db
+
+    def lookup(self, keys):
+        """Returns {key: raw_bytes} for the keys that are cached"""
+        found = {}
+        with self.lock:
+            db = self._open()
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), 500):
+                chunk = unique[i : i + 500]
+                rows = db.execute(
+                    f"SELECT key, value FROM calls WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                )
+                found.update(rows)
+            if found:
+                now = int(time.time())
+                with db:
+                    db.executemany("UPDATE calls SET used = ? WHERE key = ?", [(now, k) for k in found])
+        return found
+
+    def store(self, rows):
+        """Stores [(key, raw_bytes), ...] in one transaction"""
+        if not rows: return
+        now = int(time.time())
+        with self.lock:
+            db = self._open()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO calls (key, value, used) VALUES (?, ?, ?)",
+                               [(k, v, now) for k, v in rows])
+            self.size += sum(len(v) + ROW_OVERHEAD for _, v in rows)
+            if self.size > self.max_bytes:
+                self._evict(db)
+
+    def layouts(self, pools):
+        """Returns {pool: True/False} for the pools whose storage layout was already checked"""
+        found = {}
+        with self.lock:
+            db = self._open()
+            unique = list(dict.fromkeys(pools))
+            for i in range(0, len(unique), 500):
+                chunk = unique[i : i + 500]
+                rows = db.execute(
+                    f"SELECT pool, ok FROM layouts WHERE pool IN ({','.join('?' * len(chunk))})",
+                    [bytes.fromhex(p[2:]) for p in chunk],
+                )
+                found.update(("0x" + pool.hex(), bool(ok)) for pool, ok in rows)
+        return found
+
+    def store_layouts(self, rows):
+        """Stores [(pool, ok), ...] in one transaction"""
+        if not rows: return
+        with self.lock:
+            db = self._open()
+            with db:
+                db.executemany("INSERT OR REPLACE INTO layouts (pool, ok) VALUES (?, ?)",
+                               [(bytes.fromhex(p[2:]), int(ok)) for p, ok in rows])
+
+    def _evict(self, db):
+        # Drop least recently used rows until we are back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        with db:
+            while self.size > target:
+                # Rough row count to free, assuming ~64-byte results
+                limit = min(1000, (self.size - target) // (ROW_OVERHEAD + 64) + 1)
+                rows = db.execute("SELECT key, LENGTH(value) FROM calls ORDER BY used LIMIT ?", (limit,)).fetchall()
+                if not rows:
+                    self.size = 0
+                    break
+                db.executemany("DELETE FROM calls WHERE key = ?", [(k,) for k, _ in rows])
+                self.size -= sum(n + ROW_OVERHEAD for _, n in rows)
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -1,11 +1,14 @@
-import json
-import urllib.request
 import sys
 import time
 import os
 import datetime
 
-URL = "http://localhost:8545"
+import io_stats
+import rpc_client
+from rate_estimator import WINDOWS, WINDOW_LABELS, RateEstimator
+from sync_history import COMPACT_EVERY, SyncHistory, sample_from_syncing
+
+URL = rpc_client.DEFAULT_ENDPOINT
 # 估算值 (基于 2025 BscScan 数据 & 经验调整)
 EST_TOTAL_ACCOUNTS = 500_000_000   # 预估活跃账户 (BscScan 总量为 7.1亿，但节点仅需同步活跃部分)
 EST_TOTAL_SLOTS = 4_000_000_000    # 预估存储槽
@@ -15,17 +18,9 @@ def clear_screen():
     print("\033[H\033[J", end="")
 
 def rpc_call(method, params=[]):
-    payload = json.dumps({
-        "jsonrpc": "2.0",
-        "method": method,
-        "params": params,
-        "id": 1
-    }).encode('utf-8')
-    
+    # 复用长连接 (keep-alive / IPC)，节点重启后自动重连
     try:
-        req = urllib.request.Request(URL, data=payload, headers={'Content-Type': 'application/json'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            return json.load(response).get('result')
+        return rpc_client.get_client(URL, timeout=5).call(method, params)
     except Exception:
         return None
 
@@ -37,23 +32,69 @@ def format_speed(bytes_diff, time_diff):
     mb_s = (bytes_diff / (1024**2)) / time_diff
     return f"{mb_s:.2f} MB/s"
 
-def calc_eta(current, total, speed):
-    if speed <= 0 or current >= total:
+def format_duration(seconds):
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+def calc_eta(current, total, rate):
+    # 预计时间取 EWMA 速度，区间取 EWMA / 1m / 15m / 1h 中最快与最慢的速度
+    expected, fastest, slowest = rate.eta(total - current)
+    if expected is None:
         return "未知 / 计算中..."
-    remaining = total - current
-    seconds_left = remaining / speed
-    return str(datetime.timedelta(seconds=int(seconds_left)))
+    if slowest - fastest < 60:
+        return format_duration(expected)
+    return f"{format_duration(expected)} ({format_duration(fastest)} ~ {format_duration(slowest)})"
+
+def format_rates(rate):
+    ewma, windowed = rate.rates()
+    parts = [f"{int(ewma or 0):,}/s"]
+    for label, r in zip(WINDOW_LABELS, windowed):
+        parts.append(f"{label} {int(r):,}" if r is not None else f"{label} -")
+    return " | ".join(parts)
 
 def main():
+    # 无界面导出模式: /metrics (OpenMetrics) 或 JSONL, 参数见 sync_exporter.py
+    if "--headless" in sys.argv:
+        sys.argv.remove("--headless")
+        import sync_exporter
+        sync_exporter.main()
+        return
+
+    def option(name, default=None):
+        if name not in sys.argv: return default
+        idx = sys.argv.index(name)
+        if idx + 1 >= len(sys.argv) or sys.argv[idx + 1].startswith("--"):
+            print(f"❌ {name} 缺少参数值\n用法: python3 check_bsc_sync.py [--disk nvme0n1] [--datadir DIR] [--pid-file FILE]",
+                  file=sys.stderr)
+            sys.exit(1)
+        return sys.argv[idx + 1]
+
+    disk_option, datadir, pid_file = option("--disk"), option("--datadir", io_stats.DATA_DIR), option("--pid-file", io_stats.PID_FILE)
+
     print("正在初始化监控面板，请稍候...")
+
+    # 磁盘 / 进程 I/O: 每个 /proc 文件每次采样只读一次, 不启动子进程 (代替手动 iostat -x 1)
+    disk_name = disk_option or io_stats.device_for_path(datadir)
+    disk = io_stats.DiskStats(disk_name) if disk_name else None
+    proc = io_stats.ProcessStats(pid_file)
+    saturation = io_stats.SaturationWatch()
     
-    last_time = time.time()
-    last_stats = {}
+    # 固定大小的环形缓冲区，长时间运行也不会增长内存
+    acc_rate = RateEstimator()
+    slot_rate = RateEstimator()
+    code_rate = RateEstimator()
+
+    # 从历史记录恢复速度 / ETA，重启监控不丢失统计
+    history = SyncHistory()
+    history.compact()
+    last_compact = time.time()
+    for rec in history.records(since=last_compact - max(WINDOWS)):
+        acc_rate.add(rec.time, rec.accounts)
+        slot_rate.add(rec.time, rec.storage)
+        code_rate.add(rec.time, rec.bytecodes)
     
     try:
         while True:
             current_time = time.time()
-            time_diff = current_time - last_time
             
             syncing = rpc_call("eth_syncing")
             peer_count_hex = rpc_call("net_peerCount")
@@ -74,12 +115,20 @@ def main():
                 continue
 
             peer_count = int(peer_count_hex, 16) if peer_count_hex else 0
+            history.append(sample_from_syncing(syncing, peer_count, current_time))
+            if current_time - last_compact > COMPACT_EVERY:
+                history.compact()
+                last_compact = current_time
             current_block = int(syncing.get('currentBlock', '0x0'), 16)
             highest_block = int(syncing.get('highestBlock', '0x0'), 16)
             
             load_1, load_5, load_15 = os.getloadavg()
             print(f"💻 系统负载: {load_1:.2f}, {load_5:.2f}, {load_15:.2f}")
             print(f"🔗 连接节点: {peer_count}")
+            disk_stats = disk.sample() if disk else None
+            if disk:
+                print(io_stats.format_disk(disk_name, disk_stats))
+            print(io_stats.format_process(proc.sample()))
             print("==================================================")
 
             header_pct = (current_block / highest_block * 100) if highest_block > 0 else 0
@@ -96,43 +145,47 @@ def main():
                 codes = int(syncing.get('syncedBytecodes', '0x0'), 16)
                 codes_bytes = int(syncing.get('syncedBytecodeBytes', '0x0'), 16)
                 
-                # 计算速度
-                prev_accs = last_stats.get('accs', accs)
-                acc_speed = (accs - prev_accs) / time_diff if time_diff > 0 else 0
-                
-                prev_slots = last_stats.get('slots', slots)
-                slot_speed = (slots - prev_slots) / time_diff if time_diff > 0 else 0
-
-                prev_codes = last_stats.get('codes', codes)
-                code_speed = (codes - prev_codes) / time_diff if time_diff > 0 else 0
-
-                last_stats['accs'] = accs
-                last_stats['slots'] = slots
-                last_stats['codes'] = codes
+                # 计算速度 (EWMA + 1m/15m/1h 窗口平均)
+                acc_rate.add(current_time, accs)
+                slot_rate.add(current_time, slots)
+                code_rate.add(current_time, codes)
                 
                 print("-" * 50)
                 print(f"2️⃣  阶段 2: 状态下载 (Snap Sync) - 实时监控")
+
+                # 磁盘持续饱和且 1m 速度跌破 15m 速度一半: 瓶颈在磁盘
+                dropped = io_stats.throughput_dropped([r.rates()[1][:2] for r in (acc_rate, slot_rate)])
+                disk_bound = saturation.update(current_time, disk_stats and disk_stats["util"], dropped)
+                if disk_bound is not None:
+                    print(f"   ⚠️  磁盘饱和 (util ≥ {io_stats.SATURATED_UTIL:.0f}%) 且同步速度下降, 已持续 {format_duration(disk_bound)}")
+                elif saturation.last_episode:
+                    start, length = saturation.last_episode
+                    print(f"   ℹ️  磁盘瓶颈记录: {saturation.episodes} 次, 最近一次 "
+                          f"{datetime.datetime.fromtimestamp(start).strftime('%H:%M:%S')} 持续 {format_duration(length)}")
                 
                 # 账户
                 acc_pct_est = (accs / EST_TOTAL_ACCOUNTS * 100)
-                acc_eta = calc_eta(accs, EST_TOTAL_ACCOUNTS, acc_speed)
+                acc_eta = calc_eta(accs, EST_TOTAL_ACCOUNTS, acc_rate)
                 print(f"   👤 账户 (Accounts):")
                 print(f"      进度: {acc_pct_est:.2f}% ({accs:,} / ~{EST_TOTAL_ACCOUNTS:,})")
-                print(f"      速度: 🚀 {int(acc_speed):,}/s | 剩余: ⏳ {acc_eta}")
+                print(f"      速度: 🚀 {format_rates(acc_rate)}")
+                print(f"      剩余: ⏳ {acc_eta}")
                 
                 # 存储槽
                 slot_pct_est = (slots / EST_TOTAL_SLOTS * 100)
-                slot_eta = calc_eta(slots, EST_TOTAL_SLOTS, slot_speed)
+                slot_eta = calc_eta(slots, EST_TOTAL_SLOTS, slot_rate)
                 print(f"   💾 存储槽 (Storage):")
                 print(f"      进度: {slot_pct_est:.2f}% ({slots:,} / ~{EST_TOTAL_SLOTS:,})")
-                print(f"      速度: 🚀 {int(slot_speed):,}/s | 剩余: ⏳ {slot_eta}")
+                print(f"      速度: 🚀 {format_rates(slot_rate)}")
+                print(f"      剩余: ⏳ {slot_eta}")
                 
                 # 代码
                 code_pct_est = (codes / EST_TOTAL_BYTECODES * 100)
-                code_eta = calc_eta(codes, EST_TOTAL_BYTECODES, code_speed)
+                code_eta = calc_eta(codes, EST_TOTAL_BYTECODES, code_rate)
                 print(f"   📜 代码 (Bytecodes):")
                 print(f"      进度: {code_pct_est:.2f}% ({codes:,} / ~{EST_TOTAL_BYTECODES:,})")
-                print(f"      速度: 🚀 {int(code_speed):,}/s | 剩余: ⏳ {code_eta}")
+                print(f"      速度: 🚀 {format_rates(code_rate)}")
+                print(f"      剩余: ⏳ {code_eta}")
                 print(f"      大小: {format_bytes(codes_bytes)}")
 
             healed = int(syncing.get('healedTrienodes', '0x0'), 16)
@@ -144,11 +197,14 @@ def main():
             print("==================================================")
             print("按 Ctrl+C 退出监控")
             
-            last_time = current_time
             time.sleep(0.5)
 
     except KeyboardInterrupt:
         print("\n👋 监控已停止。")
+    finally:
+        history.close()
+        if disk: disk.close()
+        proc.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
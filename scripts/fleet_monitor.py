@@ -0,0 +1,303 @@
+"""
+Fleet monitor: height, lag, peers and sync phase of many BSC nodes at once.
+
+Every node gets its own asyncio task that polls it once per --interval with a
+single JSON-RPC batch (eth_syncing, net_peerCount, latest header) over one
+keep-alive connection, cut off after --timeout. The table (or JSONL stream) is
+drawn on its own schedule from the latest state of each node, so a slow or
+dead node only shows up as stale - it never holds back the others. Lag is
+measured against the highest block any node (or eth_syncing highestBlock)
+reports.
+
+Usage:
+    python3 fleet_monitor.py [NAME=]ENDPOINT ... [--file nodes.txt]
+                             [--interval 1] [--timeout 2] [--jsonl] [--once]
+
+ENDPOINT is an http(s):// URL or a geth.ipc path; nodes.txt holds one
+[NAME=]ENDPOINT per line (# comments allowed).
+"""
+import asyncio
+import datetime
+import json
+import os
+import ssl
+import sys
+import time
+import unicodedata
+from urllib.parse import urlsplit
+
+from check_bsc_sync import EST_TOTAL_ACCOUNTS
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_TIMEOUT = 2.0
+MAX_RESPONSE = 16 * 1024 * 1024
+POLL_BATCH = json.dumps([
+    {"jsonrpc": "2.0", "id": 0, "method": "eth_syncing", "params": []},
+    {"jsonrpc": "2.0", "id": 1, "method": "net_peerCount", "params": []},
+    {"jsonrpc": "2.0", "id": 2, "method": "eth_getBlockByNumber", "params": ["latest", False]},
+]).encode()
+
+
+class AsyncRpc:
+    """One keep-alive HTTP or IPC connection to a node, one request at a time"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.reader = self.writer = None
+        if endpoint.startswith(("http://", "https://")):
+            parts = urlsplit(endpoint)
+            self.ipc = None
+            self.host = parts.hostname
+            self.port = parts.port or (443 if parts.scheme == "https" else 80)
+            self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+            self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            self.host_header = parts.netloc.rpartition("@")[2]
+        else:
+            self.ipc = endpoint[len("ipc://"):] if endpoint.startswith("ipc://") else endpoint
+
+    async def _connect(self):
+        if self.ipc:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.ipc, limit=MAX_RESPONSE)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl, limit=MAX_RESPONSE)
+
+    async def request(self, body):
+        """Sends a JSON-RPC body and returns the raw response body"""
+        if self.writer is None:
+            await self._connect()
+        if self.ipc:
+            self.writer.write(body + b"\n")
+            await self.writer.drain()
+            # geth writes one JSON document per line on IPC
+            return await self.reader.readline()
+
+        self.writer.write(
+            f"POST {self.path} HTTP/1.1\r\nHost: {self.host_header}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await self.writer.drain()
+        status = await self.reader.readline()
+        if not status:
+            raise ConnectionError("connection closed")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        else:
+            data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        code = int(status.split()[1])
+        if code != 200:
+            raise ConnectionError(f"HTTP {code}")
+        return data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def sync_phase(syncing):
+    if syncing is False: return "已同步"
+    if not isinstance(syncing, dict): return "未知"
+    if int(syncing.get("healedTrienodes", "0x0"), 16) > 0: return "状态修复"
+    if "syncedAccounts" in syncing and int(syncing.get("syncedAccounts", "0x0"), 16) > 0: return "状态下载"
+    return "区块同步"
+
+
+class Node:
+    def __init__(self, name, endpoint):
+        self.name = name
+        self.endpoint = endpoint
+        self.rpc = AsyncRpc(endpoint)
+        self.state = {"name": name, "status": "等待中"}
+        self.updated = None
+
+    async def poll(self):
+        start = time.perf_counter()
+        results = {item.get("id"): item.get("result") for item in json.loads(await self.rpc.request(POLL_BATCH))}
+        rtt = time.perf_counter() - start
+        syncing, peers, head = results.get(0), results.get(1), results.get(2)
+        state = {"name": self.name, "status": "在线", "rtt_ms": round(rtt * 1000, 1),
+                 "peers": int(peers, 16) if peers else None, "phase": sync_phase(syncing)}
+        if head:
+            state["head"] = int(head["number"], 16)
+            state["head_age"] = max(0, int(time.time()) - int(head["timestamp"], 16))
+        if isinstance(syncing, dict):
+            state["head"] = max(state.get("head", 0), int(syncing.get("currentBlock", "0x0"), 16))
+            state["highest"] = int(syncing.get("highestBlock", "0x0"), 16)
+            if "syncedAccounts" in syncing:
+                state["accounts_pct"] = round(int(syncing["syncedAccounts"], 16) / EST_TOTAL_ACCOUNTS * 100, 2)
+        return state
+
+    async def run(self, interval, timeout):
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while True:
+            try:
+                self.state = await asyncio.wait_for(self.poll(), timeout)
+                self.updated = time.time()
+            except asyncio.TimeoutError:
+                # A late response would desync the connection: drop it and reconnect next round
+                self.rpc.close()
+                self.state = dict(self.state, status="超时")
+            except Exception as e:
+                self.rpc.close()
+                self.state = {"name": self.name, "status": "离线", "error": str(e)[:60]}
+            next_at += interval
+            delay = next_at - loop.time()
+            if delay < 0:
+                next_at = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+
+def snapshot(nodes):
+    """Current state of every node plus fleet-wide lag"""
+    reference = max((max(n.state.get("head", 0), n.state.get("highest", 0)) for n in nodes), default=0)
+    now = time.time()
+    rows = []
+    for node in nodes:
+        row = dict(node.state)
+        if "head" in row and reference:
+            row["lag"] = reference - row["head"]
+        if node.updated is not None:
+            row["age"] = round(now - node.updated, 1)
+        rows.append(row)
+    return {"time": round(now, 3), "reference_block": reference, "nodes": rows}
+
+
+def lag_icon(lag):
+    if lag is None: return "⚪"
+    if lag <= 3: return "🟢"
+    if lag <= 10: return "🟡"
+    if lag <= 50: return "🟠"
+    return "🔴"
+
+
+def pad(text, width, right=False):
+    """Pads to a terminal width, counting CJK characters as two columns"""
+    text = str(text)
+    used = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    fill = " " * max(0, width - used)
+    return fill + text if right else text + fill
+
+
+def render(snap):
+    width = max([4] + [len(r["name"]) for r in snap["nodes"]])
+    columns = ((width, False), (6, False), (12, True), (6, True), (8, True), (6, True), (14, False), (8, True), (6, True))
+
+    def row(icon, values):
+        return icon + " " + "  ".join(pad(v, w, right) for v, (w, right) in zip(values, columns))
+
+    lines = [
+        f"🕒 更新时间: {datetime.datetime.now().strftime('%H:%M:%S')} | 参考高度: {snap['reference_block']:,}",
+        "=" * (sum(w for w, _ in columns) + 2 * len(columns) + 1),
+        row("  ", ("节点", "状态", "高度", "延迟", "区块时间", "Peers", "阶段", "RTT", "数据龄")),
+    ]
+    for r in snap["nodes"]:
+        lag = r.get("lag")
+        phase = r.get("phase", "-")
+        if phase == "状态下载" and "accounts_pct" in r: phase += f" {r['accounts_pct']:.1f}%"
+        lines.append(row(lag_icon(lag), (
+            r["name"], r["status"],
+            f"{r['head']:,}" if "head" in r else "-",
+            lag if lag is not None else "-",
+            f"{r['head_age']}s 前" if "head_age" in r else "-",
+            r.get("peers") if r.get("peers") is not None else "-",
+            phase,
+            f"{r['rtt_ms']:.0f}ms" if "rtt_ms" in r else "-",
+            f"{r['age']:.0f}s" if "age" in r else "-",
+        )))
+        if "error" in r:
+            lines.append(f"     ↳ {r['error']}")
+    lines.append(lines[1])
+    return "\n".join(lines)
+
+
+async def monitor(nodes, interval, timeout, jsonl, once):
+    tasks = [asyncio.create_task(node.run(interval, timeout)) for node in nodes]
+    try:
+        if once:
+            # One poll round: wait until every node has answered or timed out
+            await asyncio.sleep(0)
+            deadline = time.time() + timeout + 0.1
+            while time.time() < deadline and any(n.state["status"] == "等待中" for n in nodes):
+                await asyncio.sleep(0.02)
+        else:
+            await asyncio.sleep(min(interval, timeout))
+        while True:
+            snap = snapshot(nodes)
+            if jsonl:
+                sys.stdout.write(json.dumps(snap, ensure_ascii=False) + "\n")
+                sys.stdout.flush()
+            else:
+                print("\033[H\033[J" if not once else "", end="")
+                print(render(snap))
+                if not once: print("按 Ctrl+C 退出监控")
+            if once: return
+            await asyncio.sleep(interval)
+    finally:
+        for task in tasks: task.cancel()
+        for node in nodes: node.rpc.close()
+
+
+def parse_nodes(specs):
+    nodes = []
+    for spec in specs:
+        name, sep, endpoint = spec.partition("=")
+        if not sep or "://" in name:
+            name, endpoint = spec, spec
+            if "://" in spec: name = urlsplit(spec).netloc or spec
+            else: name = os.path.basename(os.path.dirname(spec)) or spec
+        nodes.append(Node(name, endpoint))
+    return nodes
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        sys.exit(1)
+
+    def option(name, default=None):
+        if name not in args: return default
+        idx = args.index(name)
+        value = args[idx + 1]
+        del args[idx:idx + 2]
+        return value
+
+    interval = float(option("--interval", DEFAULT_INTERVAL))
+    timeout = float(option("--timeout", DEFAULT_TIMEOUT))
+    node_file = option("--file")
+    jsonl = "--jsonl" in args
+    once = "--once" in args
+    specs = [a for a in args if a not in ("--jsonl", "--once")]
+    if node_file:
+        with open(node_file) as f:
+            specs += [line.split("#")[0].strip() for line in f if line.split("#")[0].strip()]
+    if not specs:
+        print("❌ No nodes given.")
+        sys.exit(1)
+
+    try:
+        asyncio.run(monitor(parse_nodes(specs), interval, timeout, jsonl, once))
+    except KeyboardInterrupt:
+        print("\n👋 监控已停止。")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,127 @@
+import csv
 import json
-import urllib.request
-import urllib.error
+import os
 import sys
-import math
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import lru_cache
 
-# BSC JSON-RPC URL
-URL = "http://localhost:8545"
+import abi
+import call_cache
+import pair_registry
+import route_graph
+import rpc_client
+import token_meta
+from keccak import keccak256
+
+# BSC JSON-RPC endpoint (HTTP URL or geth.ipc path, see rpc_client.py)
+URL = rpc_client.DEFAULT_ENDPOINT
 RPC_URL = "https://bsc-mainnet.infura.io/v3/0e95b61f8c324420afb73d5aaf8f5f00"
 # Constants for BSC Mainnet
 PANCAKESWAP_FACTORY = "0xcA143Ce32Fe78f1f7019d7d551a6402fC5350c73"
+# keccak256 of the PancakePair creation code, used for CREATE2 pair addresses
+PANCAKESWAP_INIT_CODE_HASH = "0x00fb7f630766e6a796048ea87d01acd3068e8ff67d078148a3fa3f4a84f69bd5"
 WBNB_ADDRESS = "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c"
 USDT_ADDRESS = "0x55d398326f99059fF775485246999027B3197955" # BSC-USD
 
 # Function Selectors
-FUNC_GET_PAIR = "0xe6a43905"      # getPair(address,address)
 FUNC_GET_RESERVES = "0x0902f1ac"  # getReserves()
 FUNC_TOKEN0 = "0x0dfe1681"        # token0()
 FUNC_TOKEN1 = "0xd21220a7"        # token1()
 FUNC_DECIMALS = "0x313ce567"      # decimals()
 FUNC_SLOT0 = "0x3850c7bd"         # slot0()
 FUNC_SYMBOL = "0x95d89b41"        # symbol()
+FUNC_LIQUIDITY = "0x1a686502"     # liquidity() (V3)
+FUNC_AGGREGATE3 = "0x82ad56cb"    # aggregate3((address,bool,bytes)[])
+
+# Precompiled call data builders (see abi.py)
+CALL_GET_PAIR = abi.CallTemplate("getPair(address,address)")
+AGGREGATE3_ITEM = abi.compile_encoder(abi.parse_type("(address,bool,bytes)"))
+AGGREGATE3_PAD = bytes(12)
+AGGREGATE3_HEAD = abi.WORD_TRUE + (96).to_bytes(32, "big")  # allowFailure=true, offset of callData
+
+# Multicall3 (same address on every chain it is deployed to)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+# Chunking: stay well under geth's default RPCGasCap (50M) and keep responses small
+MULTICALL_GAS_BUDGET = 40_000_000
+MULTICALL_GAS_PER_CALL = 15_000
+MULTICALL_MAX_CALLS = 500
+MULTICALL_WORKERS = 8
+# RPC errors that mean "this chunk is too big" (gas cap, response size); anything else fails the chunk as a whole
+MULTICALL_SPLIT_ERRORS = ("gas", "limit", "exceed", "too large", "response size")
+
+# Token metadata (decimals, symbol) cache, see token_meta.py; --refresh bypasses reads
+META_STORE = token_meta.TokenMetaStore()
+META_BATCH_SIZE = 100
+# ERC-20 decimals is a uint8; anything larger is garbage (and would not fit SQLite's INTEGER)
+MAX_DECIMALS = 255
+REFRESH_META = False
+
+# eth_call results at a concrete block height never change, see call_cache.py
+CALL_CACHE = call_cache.CallCache()
+# ...unless the block is reorged away: heights this close to the head are never cached
+REORG_SAFE_DEPTH = 15
+HEAD_REFRESH = 3.0
+HEAD = {"number": None, "checked": 0.0}
+
+# Local index of every V2 pair / V3 pool, built by `pair_registry.py update`
+PAIR_REGISTRY = pair_registry.PairRegistry()
+
+# Multi-hop routing (--route): hub tokens whose best rate to USDT is precomputed once
+ROUTE_HUBS = [
+    WBNB_ADDRESS,
+    USDT_ADDRESS,
+    "0xe9e7CEA3DedcA5984780Bafc599bD69ADd087D56",  # BUSD
+    "0x8AC76a51cc950d9822D68b83fE1Ad97B32Cd580d",  # USDC
+    "0x2170Ed0880ac9A755fd29B2688956BD959F933F8",  # ETH
+    "0x7130d2A12B9BCbFAe4f2634d864A1Ee1Ce3Ead9c",  # BTCB
+    "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82",  # CAKE
+]
+ROUTE_MAX_HOPS = route_graph.MAX_HOPS
+ROUTE_MIN_LIQUIDITY = 1000.0  # USDT on the receiving side of every hop
+ROUTE_BATCH_SIZE = 200        # tokens whose pools are loaded per multicall
+
+# Bulk mode: concurrent lookups sharing one keep-alive connection pool
+BULK_WORKERS = 16
+# History mode: block heights per JSON-RPC batch
+HISTORY_BATCH_SIZE = 50
+# Heights the node did not answer are re-asked this many times before the run stops at them
+HISTORY_RETRIES = 3
+
+# --storage: read packed storage slots with eth_getStorageAt instead of running the EVM
+USE_STORAGE_READS = False
+V2_RESERVES_SLOT = 8   # PancakePair: reserve0 (uint112) | reserve1 (uint112) | blockTimestampLast (uint32)
+V3_SLOT0_SLOT = 0      # PancakeV3Pool: slot0.sqrtPriceX96 (uint160) | slot0.tick (int24) | ...
+# pool address -> True/False once its storage slot has been checked against eth_call (kept in calls.sqlite),
+# None while unchecked
+STORAGE_LAYOUT_OK = {}
+STORAGE_BATCH_SIZE = 500
 
 def rpc_call(method, params=[]):
-    payload = json.dumps({
-        "jsonrpc": "2.0",
-        "method": method,
-        "params": params,
-        "id": 1
-    }).encode('utf-8')
-    
-    req = urllib.request.Request(URL, data=payload, headers={'Content-Type': 'application/json'})
     try:
-        with urllib.request.urlopen(req) as response:
-            res = json.load(response)
-            if 'error' in res:
-                return None
-            return res.get('result')
+        return rpc_client.get_client(URL).call(method, params)
+    except rpc_client.RpcError:
+        return None
     except Exception as e:
-        print(f"Connection Error: {e}")
+        print(f"Connection Error: {e}", file=sys.stderr)
         return None
 
+def rpc_batch(calls):
+    """Sends [(method, params), ...] as one JSON-RPC batch; results come back in call order"""
+    try:
+        return rpc_client.get_client(URL).batch(calls)
+    except Exception as e:
+        print(f"Connection Error: {e}", file=sys.stderr)
+        return [None] * len(calls)
+
 def pad_address(addr):
     """Pads address to 32 bytes for ABI encoding"""
     return "000000000000000000000000" + addr.replace("0x", "").lower()
 
+def encode_uint(value):
+    """Encodes int as a 32-byte hex word"""
+    return format(value, '064x')
+
 def decode_address(hex_str):
     """Decodes 32-byte hex string to address"""
     if not hex_str or len(hex_str) < 26: return None
@@ -56,25 +133,9 @@ def decode_uint(hex_str):
     return int(hex_str, 16)
 
 def decode_string(hex_str):
-    """Decodes ABI encoded string (simplified)"""
+    """Decodes a string or bytes32 return value (e.g. symbol()); "?" if it is neither"""
     if not hex_str or hex_str == "0x": return "?"
-    try:
-        raw = hex_str.replace("0x", "")
-        # Check if it's likely a pointer (first word is 32)
-        if len(raw) >= 64:
-            first_word = int(raw[0:64], 16)
-            if first_word == 32:
-                length = int(raw[64:128], 16)
-                data_hex = raw[128 : 128 + length * 2]
-                return bytes.fromhex(data_hex).decode('utf-8')
-        
-        # Fallback: Try decoding generic bytes if it looks like ASCII
-        try:
-            return bytes.fromhex(raw).decode('utf-8').rstrip('\x00')
-        except:
-            return "?"
-    except:
-        return "?"
+    return abi.decode_symbol(hex_str)
 
 def format_block(block):
     """Formats block number to hex if it's an integer string, or returns as is (e.g. 'latest')"""
@@ -85,22 +146,305 @@ def format_block(block):
     except:
         return block
 
+def resolve_block(block):
+    """Pins "latest" to the current head so every call in a lookup sees the same state"""
+    if block != "latest": return block
+    head = rpc_call("eth_blockNumber")
+    if head:
+        HEAD.update(number=int(head, 16), checked=time.time())
+    return head or block
+
+def cache_height(block):
+    """Height to key the call cache with, or None if the block is not final enough to cache forever"""
+    height = call_cache.block_number(block)
+    if height is None: return None
+    if HEAD["number"] is None or height > HEAD["number"] - REORG_SAFE_DEPTH:
+        # The head only moves forward: re-read it (rate limited) before giving up on caching
+        if time.time() - HEAD["checked"] >= HEAD_REFRESH:
+            resolve_block("latest")
+            HEAD["checked"] = time.time()
+        if HEAD["number"] is None or height > HEAD["number"] - REORG_SAFE_DEPTH:
+            return None
+    return height
+
+def eth_call_request(to_addr, data, block="latest"):
+    """(cache_key, method, params) for an eth_call; only heights REORG_SAFE_DEPTH below the head get a cache key"""
+    height = cache_height(block)
+    key = call_cache.call_key(height, to_addr, data) if height is not None else None
+    return key, "eth_call", [{"to": to_addr, "data": data}, block]
+
+def storage_request(address, slot, block="latest"):
+    """(cache_key, method, params) for an eth_getStorageAt read"""
+    height = cache_height(block)
+    key = call_cache.storage_key(height, address, slot) if height is not None else None
+    return key, "eth_getStorageAt", [address, hex(slot), block]
+
+def cached_batch(requests):
+    """Sends [(cache_key, method, params), ...] as one batch; keyed entries are served from / saved to the cache"""
+    keys = [key for key, _, _ in requests if key is not None]
+    found = CALL_CACHE.lookup(keys) if keys else {}
+    results = ["0x" + found[key].hex() if key in found else None for key, _, _ in requests]
+    missing = [i for i, res in enumerate(results) if res is None]
+    if missing:
+        fetched = rpc_batch([(requests[i][1], requests[i][2]) for i in missing])
+        for i, res in zip(missing, fetched):
+            results[i] = res
+        CALL_CACHE.store([
+            (requests[i][0], bytes.fromhex(results[i].replace("0x", "")))
+            for i in missing
+            if requests[i][0] is not None and results[i] is not None
+        ])
+    return results
+
 def eth_call(to_addr, data, block="latest"):
-    return rpc_call("eth_call", [{"to": to_addr, "data": data}, block])
+    return eth_call_batch([(to_addr, data)], block)[0]
+
+def eth_call_batch(calls, block="latest"):
+    """Runs [(to_addr, data), ...] as eth_calls in a single HTTP round trip (cached calls are skipped)"""
+    return cached_batch([eth_call_request(to_addr, data, block) for to_addr, data in calls])
+
+def decode_decimals(res):
+    """Decodes decimals() result, defaulting to 18 when the call fails"""
+    if not res or res == "0x": return 18
+    return decode_uint(res)
+
+def v2_price(target_reserve, base_reserve, target_decimals, base_decimals):
+    """Base tokens per target token from raw reserves (see price_kernel.py for batches)"""
+    return (base_reserve / (10**base_decimals)) / (target_reserve / (10**target_decimals))
+
+def v3_price(sqrt_price_x96, decimals0, decimals1):
+    """token1 per token0 from sqrtPriceX96: (sqrtPriceX96 / 2^96)^2 * 10^(d0 - d1)"""
+    return (sqrt_price_x96 / (2**96)) ** 2 * (10**(decimals0 - decimals1))
+
+def decode_reserves(res):
+    """Decodes getReserves() result into (reserve0, reserve1)"""
+    if not res or len(res) < 130: return None
+    raw = res.replace("0x", "")
+    reserve0 = int(raw[0:64], 16)
+    reserve1 = int(raw[64:128], 16)
+    return reserve0, reserve1
+
+def unpack_v2_reserves(word):
+    """Storage slot 8 of a pair -> getReserves()-shaped result"""
+    value = decode_uint(word)
+    reserve0 = value & (2**112 - 1)
+    reserve1 = (value >> 112) & (2**112 - 1)
+    timestamp = value >> 224
+    return "0x" + encode_uint(reserve0) + encode_uint(reserve1) + encode_uint(timestamp)
+
+def unpack_v3_slot0(word):
+    """Storage slot 0 of a V3 pool -> first two words of the slot0() result (sqrtPriceX96, tick)"""
+    value = decode_uint(word)
+    sqrt_price_x96 = value & (2**160 - 1)
+    tick = (value >> 160) & (2**24 - 1)
+    if tick >= 2**23: tick -= 2**24
+    return "0x" + encode_uint(sqrt_price_x96) + encode_uint(tick % 2**256)
+
+# kind -> (eth_call selector, storage slot, slot unpacker)
+POOL_STATE_READS = {
+    "v2": (FUNC_GET_RESERVES, V2_RESERVES_SLOT, unpack_v2_reserves),
+    "v3": (FUNC_SLOT0, V3_SLOT0_SLOT, unpack_v3_slot0),
+}
+
+def load_storage_layouts(addresses):
+    """Fills STORAGE_LAYOUT_OK from the call cache for pools this process has not looked up yet"""
+    missing = [a for a in dict.fromkeys(a.lower() for a in addresses) if a not in STORAGE_LAYOUT_OK]
+    if missing:
+        found = CALL_CACHE.layouts(missing)
+        for address in missing:
+            STORAGE_LAYOUT_OK[address] = found.get(address)
+
+def pool_state_requests(address, kind, block="latest"):
+    """Requests for one getReserves()/slot0() read; returns (requests, mode)
+
+    mode is "call" (eth_call), "storage" (eth_getStorageAt) or "verify" (both, on the
+    first --storage read of a pool ever, to check the slot layout against eth_call).
+    """
+    func, slot, _ = POOL_STATE_READS[kind]
+    if USE_STORAGE_READS:
+        load_storage_layouts([address])
+    layout_ok = STORAGE_LAYOUT_OK.get(address.lower()) if USE_STORAGE_READS else False
+    if layout_ok:
+        return [storage_request(address, slot, block)], "storage"
+    if layout_ok is None:
+        return [eth_call_request(address, func, block), storage_request(address, slot, block)], "verify"
+    return [eth_call_request(address, func, block)], "call"
+
+def finish_pool_state(address, kind, mode, results, layouts=None):
+    """Turns pool_state_requests() results into a getReserves()/slot0()-shaped hex result
+
+    A changed layout verdict is saved right away, or appended to `layouts` for the caller to save in bulk.
+    """
+    _, _, unpack = POOL_STATE_READS[kind]
+    if mode == "storage":
+        return unpack(results[0]) if results[0] else None
+    if mode == "verify":
+        res, word = results
+        # Only decide once the pool actually answered; eth_call stays the source of truth
+        if res and len(res) >= 130 and word:
+            match = res.lower().startswith(unpack(word))
+            # A single mismatch (at any block) disables the storage path for this pool
+            known = STORAGE_LAYOUT_OK.get(address.lower())
+            ok = match if known is None else known and match
+            if ok != known:
+                STORAGE_LAYOUT_OK[address.lower()] = ok
+                if layouts is None:
+                    CALL_CACHE.store_layouts([(address.lower(), ok)])
+                else:
+                    layouts.append((address.lower(), ok))
+    return results[0]
+
+def read_pool_states(reads):
+    """Batch-reads [(address, kind, block), ...]; returns getReserves()/slot0()-shaped results"""
+    if USE_STORAGE_READS:
+        load_storage_layouts([address for address, _, _ in reads])
+    plans = [pool_state_requests(address, kind, block) for address, kind, block in reads]
+    results = cached_batch([req for requests, _ in plans for req in requests])
+    states = []
+    layouts = []
+    pos = 0
+    for (address, kind, _), (requests, mode) in zip(reads, plans):
+        states.append(finish_pool_state(address, kind, mode, results[pos : pos + len(requests)], layouts))
+        pos += len(requests)
+    CALL_CACHE.store_layouts(layouts)
+    return states
+
+@lru_cache(maxsize=65536)
+def aggregate3_item(target, data):
+    """Encoded (address target, bool allowFailure=true, bytes callData), built once per distinct call"""
+    # Same bytes as AGGREGATE3_ITEM, laid out directly: this is the hot path for calls seen for the first time
+    raw = bytes.fromhex(data[2:] if data[:2] == "0x" else data)
+    return (AGGREGATE3_PAD + bytes.fromhex(target[2:] if target[:2] == "0x" else target) + AGGREGATE3_HEAD
+            + len(raw).to_bytes(32, "big") + raw + bytes(-len(raw) % 32))
+
+def encode_aggregate3(calls):
+    """ABI-encodes aggregate3 for [(target, data), ...] with allowFailure=true on every call"""
+    return FUNC_AGGREGATE3 + (abi.WORD_32 + abi.join_dynamic([aggregate3_item(t, d) for t, d in calls])).hex()
+
+def decode_aggregate3(res):
+    """Decodes aggregate3 return data into [(success, return_hex), ...]"""
+    return [(success, "0x" + data.hex()) for success, data in abi.decode(["(bool,bytes)[]"], res)[0]]
+
+def multicall_chunk(calls, block="latest"):
+    """Runs one aggregate3 call; a chunk rejected for gas / response size, or whose answer does not decode, is split in half
+
+    A connection failure or any other RPC error fails the whole chunk at once:
+    splitting would only repeat the same failing request ~2x len(calls) times.
+    """
+    key, method, params = eth_call_request(MULTICALL3_ADDRESS, encode_aggregate3(calls), block)
+    found = CALL_CACHE.lookup([key]) if key is not None else {}
+    if key in found:
+        return decode_aggregate3(found[key])
+    failed = [(False, "0x")] * len(calls)
+    try:
+        res = rpc_client.get_client(URL).call(method, params)
+    except rpc_client.RpcError as e:
+        if not any(m in (e.message or "").lower() for m in MULTICALL_SPLIT_ERRORS):
+            return failed
+        res = None
+    except Exception as e:
+        print(f"Connection Error: {e}", file=sys.stderr)
+        return failed
+    if res == "0x":
+        # No Multicall3 code at this block
+        return failed
+    if res:
+        try:
+            results = decode_aggregate3(res)
+            if key is not None:
+                CALL_CACHE.store([(key, bytes.fromhex(res[2:]))])
+            return results
+        except ValueError:
+            pass
+    if len(calls) == 1:
+        return failed
+    mid = len(calls) // 2
+    return multicall_chunk(calls[:mid], block) + multicall_chunk(calls[mid:], block)
+
+def multicall(calls, block="latest"):
+    """Packs [(target, data), ...] into concurrent Multicall3 chunks, returns [(success, return_hex), ...]"""
+    chunk_size = max(1, min(MULTICALL_MAX_CALLS, MULTICALL_GAS_BUDGET // MULTICALL_GAS_PER_CALL))
+    chunks = [calls[i : i + chunk_size] for i in range(0, len(calls), chunk_size)]
+    if len(chunks) <= 1:
+        return multicall_chunk(calls, block) if calls else []
+    with ThreadPoolExecutor(max_workers=min(MULTICALL_WORKERS, len(chunks))) as pool:
+        parts = pool.map(lambda chunk: multicall_chunk(chunk, block), chunks)
+        return [result for part in parts for result in part]
+
+def token_meta_calls(tokens):
+    """eth_calls for decimals() and symbol() of each token, in that order"""
+    calls = []
+    for token in tokens:
+        calls.append((token, FUNC_DECIMALS))
+        calls.append((token, FUNC_SYMBOL))
+    return calls
+
+def decode_token_meta(tokens, results):
+    """Decodes token_meta_calls() results; returns {token: (decimals, symbol)} for the valid ones"""
+    meta = {}
+    for i, token in enumerate(tokens):
+        res_dec, res_sym = results[2 * i], results[2 * i + 1]
+        # Don't cache failed/empty answers, the node may just be missing that state
+        if not res_dec or res_dec == "0x": continue
+        decimals = decode_uint(res_dec)
+        if decimals > MAX_DECIMALS: continue
+        meta[token] = (decimals, abi.decode_symbol(res_sym) if res_sym else "?")
+    return meta
+
+def store_token_meta(tokens, results):
+    """Decodes token_meta_calls() results and saves them; returns {token: (decimals, symbol)}"""
+    meta = decode_token_meta(tokens, results)
+    META_STORE.put_many(meta)
+    return meta
+
+def fetch_token_meta(tokens, block="latest"):
+    """Metadata straight from the node; META_STORE.prefetch() saves it in one transaction"""
+    meta = {}
+    for i in range(0, len(tokens), META_BATCH_SIZE):
+        chunk = tokens[i : i + META_BATCH_SIZE]
+        meta.update(decode_token_meta(chunk, eth_call_batch(token_meta_calls(chunk), block)))
+    return meta
+
+def get_token_meta(tokens, block="latest"):
+    """Returns {token: (decimals, symbol)}, reading the metadata cache first"""
+    tokens = [t.lower() for t in tokens]
+    meta = META_STORE.prefetch(tokens, lambda missing: fetch_token_meta(missing, block), refresh=REFRESH_META)
+    return {t: meta.get(t, (18, "?")) for t in tokens}
+
+def cached_token_meta(tokens):
+    """Cache-only lookup; returns (found, missing)"""
+    tokens = [t.lower() for t in tokens]
+    found = {} if REFRESH_META else META_STORE.get_many(tokens)
+    return found, [t for t in dict.fromkeys(tokens) if t not in found]
 
 def get_decimals(token_addr, block="latest"):
     data = FUNC_DECIMALS
     res = eth_call(token_addr, data, block)
-    if not res or res == "0x": return 18
-    return decode_uint(res)
+    return decode_decimals(res)
 
 def get_symbol(token_addr, block="latest"):
     res = eth_call(token_addr, FUNC_SYMBOL, block)
     if not res: return "?"
     return decode_string(res)
 
+def sort_tokens(token_a, token_b):
+    """Returns (token0, token1) in the order the pair contract stores them"""
+    token_a = token_a.lower()
+    token_b = token_b.lower()
+    return (token_a, token_b) if int(token_a, 16) < int(token_b, 16) else (token_b, token_a)
+
+@lru_cache(maxsize=65536)
+def compute_pair_address(token_a, token_b, factory=PANCAKESWAP_FACTORY, init_code_hash=PANCAKESWAP_INIT_CODE_HASH):
+    """Derives the V2 pair address offline: CREATE2(factory, keccak(token0 ++ token1), init_code_hash)"""
+    token0, token1 = sort_tokens(token_a, token_b)
+    salt = keccak256(bytes.fromhex(token0[2:]) + bytes.fromhex(token1[2:]))
+    digest = keccak256(
+        b"\xff" + bytes.fromhex(factory[2:]) + salt + bytes.fromhex(init_code_hash.replace("0x", ""))
+    )
+    return "0x" + digest[12:].hex()
+
 def get_pair(token_a, token_b, block="latest"):
-    data = FUNC_GET_PAIR + pad_address(token_a) + pad_address(token_b)
+    data = CALL_GET_PAIR.encode(token_a.lower(), token_b.lower())
     res = eth_call(PANCAKESWAP_FACTORY, data, block)
     if not res or res == "0x": return None
     return decode_address(res)
@@ -108,22 +452,93 @@ def get_pair(token_a, token_b, block="latest"):
 def get_reserves(pair_addr, block="latest"):
     data = FUNC_GET_RESERVES
     res = eth_call(pair_addr, data, block)
-    if not res or len(res) < 130: return None
-    raw = res.replace("0x", "")
-    reserve0 = int(raw[0:64], 16)
-    reserve1 = int(raw[64:128], 16)
-    return reserve0, reserve1
+    return decode_reserves(res)
 
 def get_token0(pair_addr, block="latest"):
     res = eth_call(pair_addr, FUNC_TOKEN0, block)
     if not res: return None
     return decode_address(res)
 
+def get_v2_price(target_token, base_token, block="latest"):
+    """Prices target_token in base_token on PancakeSwap V2; returns a result dict, with "error" set on failure"""
+    target_token = target_token.lower()
+    base_token = base_token.lower()
+    result = {"token": target_token, "base": base_token}
+
+    # 1. Derive the pair address offline and fetch reserves (+ uncached metadata) in one round trip
+    pair_address = compute_pair_address(target_token, base_token)
+    target_is_token0 = sort_tokens(target_token, base_token)[0] == target_token
+    meta, missing = cached_token_meta([target_token, base_token])
+    requests, mode = pool_state_requests(pair_address, "v2", block)
+    results = cached_batch(requests + [eth_call_request(t, d, block) for t, d in token_meta_calls(missing)])
+    reserves = decode_reserves(finish_pool_state(pair_address, "v2", mode, results[:len(requests)]))
+    meta.update(store_token_meta(missing, results[len(requests):]))
+
+    # A derived address with no code at this block answers with empty data: ask the factory instead
+    if not reserves:
+        pair_address = get_pair(target_token, base_token, block)
+        if not pair_address or pair_address == "0x0000000000000000000000000000000000000000":
+            result["error"] = "pair_not_found"
+            return result
+
+        res_reserves, res_token0 = eth_call_batch([
+            (pair_address, FUNC_GET_RESERVES),
+            (pair_address, FUNC_TOKEN0),
+        ], block)
+        reserves = decode_reserves(res_reserves)
+        if not reserves:
+            result["error"] = "reserves_unavailable"
+            return result
+
+        token0_addr = decode_address(res_token0) if res_token0 else None
+        if not token0_addr:
+            result["error"] = "token0_unavailable"
+            return result
+        target_is_token0 = token0_addr.lower() == target_token
+
+    result["pair"] = pair_address
+
+    # 2. Determine which reserve is which
+    reserve0, reserve1 = reserves
+    if target_is_token0:
+        target_reserve = reserve0
+        base_reserve = reserve1
+    else:
+        target_reserve = reserve1
+        base_reserve = reserve0
+
+    # 3. Decimals (from the cache or fetched with the reserves)
+    target_decimals, target_symbol = meta.get(target_token, (18, "?"))
+    base_decimals, base_symbol = meta.get(base_token, (18, "?"))
+    result.update({
+        "target_reserve": target_reserve,
+        "base_reserve": base_reserve,
+        "target_decimals": target_decimals,
+        "base_decimals": base_decimals,
+        "target_symbol": target_symbol,
+        "base_symbol": base_symbol,
+    })
+
+    # 4. Calculate Price
+    if target_reserve == 0:
+        result["error"] = "zero_liquidity"
+        return result
+
+    result["price"] = v2_price(target_reserve, base_reserve, target_decimals, base_decimals)
+    return result
+
 def get_v3_pool_price(pool_address, block="latest"):
     print(f"🔍 Fetching V3 Pool Data for {pool_address} at block {block}...")
     
-    t0_addr = get_token0(pool_address, block)
-    res_t1 = eth_call(pool_address, FUNC_TOKEN1, block)
+    # Round trip 1: everything that only needs the pool address
+    requests, mode = pool_state_requests(pool_address, "v3", block)
+    results = cached_batch([
+        eth_call_request(pool_address, FUNC_TOKEN0, block),
+        eth_call_request(pool_address, FUNC_TOKEN1, block),
+    ] + requests)
+    res_t0, res_t1 = results[:2]
+    res = finish_pool_state(pool_address, "v3", mode, results[2:])
+    t0_addr = decode_address(res_t0) if res_t0 else None
     t1_addr = decode_address(res_t1) if res_t1 else None
 
     if not t0_addr or not t1_addr:
@@ -134,16 +549,15 @@ def get_v3_pool_price(pool_address, block="latest"):
         print("   3. Pool did not exist at the specified block.")
         return
 
-    sym0 = get_symbol(t0_addr, block)
-    sym1 = get_symbol(t1_addr, block)
-    dec0 = get_decimals(t0_addr, block)
-    dec1 = get_decimals(t1_addr, block)
+    # Round trip 2 (cache misses only): token metadata
+    meta = get_token_meta([t0_addr, t1_addr], block)
+    dec0, sym0 = meta[t0_addr.lower()]
+    dec1, sym1 = meta[t1_addr.lower()]
     
     print(f"   Token0: {sym0} ({t0_addr}) Dec: {dec0}")
     print(f"   Token1: {sym1} ({t1_addr}) Dec: {dec1}")
 
     # slot0 -> sqrtPriceX96 (uint160)
-    res = eth_call(pool_address, FUNC_SLOT0, block)
     if not res or len(res) < 66:
         print("❌ Failed to fetch slot0 (Price data). Node might not be synced or pool unavailable.")
         return
@@ -156,12 +570,8 @@ def get_v3_pool_price(pool_address, block="latest"):
         return
 
     # Calculate Price
-    # P = (sqrtPriceX96 / 2^96) ^ 2
-    raw_price = (sqrtPriceX96 / (2**96)) ** 2
-    
-    # Adjust for decimals
-    # Price of Token1 per Token0 = raw_price * 10^(d0 - d1)
-    price_t1_per_t0 = raw_price * (10**(dec0 - dec1))
+    # Price of Token1 per Token0 = (sqrtPriceX96 / 2^96)^2 * 10^(d0 - d1)
+    price_t1_per_t0 = v3_price(sqrtPriceX96, dec0, dec1)
     
     # Price of Token0 per Token1
     if price_t1_per_t0 > 0:
@@ -174,10 +584,439 @@ def get_v3_pool_price(pool_address, block="latest"):
     print(f"💰 Price: 1 {sym1} = {price_t0_per_t1:.8f} {sym0}")
     print("-" * 40)
 
+def iter_list_file(path):
+    """Yields the whitespace-separated fields of each non-empty line ('-' for stdin, '#' starts a comment)"""
+    stream = sys.stdin if path == "-" else open(path)
+    with stream:
+        for line in stream:
+            parts = line.split("#")[0].split()
+            if parts:
+                yield parts
+
+def read_watch_list(path):
+    """Reads '<POOL_ADDRESS> [v2|v3]' lines"""
+    return [(parts[0].lower(), parts[1].lower() if len(parts) > 1 else "v2") for parts in iter_list_file(path)]
+
+def prefetch_metadata(path, block="latest"):
+    tokens = [parts[0].lower() for parts in iter_list_file(path)]
+    start = time.perf_counter()
+    meta = get_token_meta(tokens, block)
+    known = sum(1 for decimals, symbol in meta.values() if symbol != "?")
+    print(f"📦 Token metadata ready for {len(meta)} tokens ({known} with symbol) in {time.perf_counter() - start:.3f}s")
+
+def get_multicall_snapshot(path, block="latest"):
+    pools = read_watch_list(path)
+    if not pools:
+        print("❌ Watch list is empty.")
+        return
+
+    start = time.perf_counter()
+    if USE_STORAGE_READS:
+        print(f"🔍 Reading {len(pools)} pools via eth_getStorageAt at block {block}...")
+        chunks = [pools[i : i + STORAGE_BATCH_SIZE] for i in range(0, len(pools), STORAGE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=MULTICALL_WORKERS) as pool:
+            parts = pool.map(lambda chunk: read_pool_states([(addr, kind, block) for addr, kind in chunk]), chunks)
+            results = [(bool(res) and res != "0x", res or "0x") for part in parts for res in part]
+    else:
+        print(f"🔍 Reading {len(pools)} pools via Multicall3 at block {block}...")
+        calls = [(addr, FUNC_SLOT0 if kind == "v3" else FUNC_GET_RESERVES) for addr, kind in pools]
+        results = multicall(calls, block)
+    elapsed = time.perf_counter() - start
+
+    ok = 0
+    print("-" * 40)
+    for (addr, kind), (success, data) in zip(pools, results):
+        if kind == "v3":
+            raw = data.replace("0x", "")
+            if success and len(raw) >= 128:
+                ok += 1
+                tick = int(raw[64:128], 16)
+                if tick >= 2**255: tick -= 2**256
+                print(f"✅ {addr} V3 sqrtPriceX96={int(raw[0:64], 16)} tick={tick}")
+                continue
+        else:
+            reserves = decode_reserves(data) if success else None
+            if reserves:
+                ok += 1
+                print(f"✅ {addr} V2 reserve0={reserves[0]} reserve1={reserves[1]}")
+                continue
+        print(f"❌ {addr} {kind.upper()} call failed")
+    print("-" * 40)
+    print(f"📊 {ok}/{len(pools)} succeeded in {elapsed:.3f}s")
+
+def compare_read_paths(path, block, rounds=5):
+    """Times eth_call vs eth_getStorageAt for the watch list (uncached) and checks they agree"""
+    pools = read_watch_list(path)
+    if not pools:
+        print("❌ Watch list is empty.")
+        return
+
+    call_requests = [("eth_call", [{"to": addr, "data": POOL_STATE_READS[kind][0]}, block]) for addr, kind in pools]
+    storage_requests = [("eth_getStorageAt", [addr, hex(POOL_STATE_READS[kind][1]), block]) for addr, kind in pools]
+
+    def timed_batches(requests):
+        start = time.perf_counter()
+        results = []
+        for i in range(0, len(requests), STORAGE_BATCH_SIZE):
+            results += rpc_batch(requests[i : i + STORAGE_BATCH_SIZE])
+        return time.perf_counter() - start, results
+
+    def timed_single(request):
+        start = time.perf_counter()
+        rpc_call(*request)
+        return time.perf_counter() - start
+
+    print(f"🔍 Comparing read paths for {len(pools)} pools, {rounds} rounds at block {block}...")
+    _, call_results = timed_batches(call_requests)
+    _, words = timed_batches(storage_requests)
+    agree = sum(
+        1 for (addr, kind), res, word in zip(pools, call_results, words)
+        if res and word and res.lower().startswith(POOL_STATE_READS[kind][2](word))
+    )
+
+    stats = {}
+    for name, requests in (("eth_call", call_requests), ("eth_getStorageAt", storage_requests)):
+        batch_times = sorted(timed_batches(requests)[0] for _ in range(rounds))
+        single_times = sorted(timed_single(requests[0]) for _ in range(rounds))
+        stats[name] = (batch_times[len(batch_times) // 2], single_times[len(single_times) // 2])
+
+    print("-" * 40)
+    for name, (batch_time, single_time) in stats.items():
+        print(f"   {name:<17} batch: {batch_time * 1000:8.2f} ms ({batch_time * 1e6 / len(pools):,.1f} µs/read) | single: {single_time * 1000:.2f} ms")
+    if stats["eth_getStorageAt"][0] > 0:
+        print(f"⚡ Storage path speedup (batch, median): {stats['eth_call'][0] / stats['eth_getStorageAt'][0]:.2f}x")
+    print(f"🔎 Slot layout matches eth_call for {agree}/{len(pools)} pools")
+    print("-" * 40)
+
+def list_token_pools(token):
+    """Prints every known V2 pair / V3 pool of a token from the local registry (no RPC)"""
+    if not PAIR_REGISTRY.state["records"]:
+        print("❌ Pair registry is empty. Run: python3 pair_registry.py update")
+        return
+    start = time.perf_counter()
+    pools = PAIR_REGISTRY.pools_for(token)
+    elapsed = time.perf_counter() - start
+    others = [t1 if t0 == token.lower() else t0 for _, t0, t1, _, _, _, _ in pools]
+    meta, _ = cached_token_meta(others)
+    print("-" * 40)
+    for (pool, _, _, kind, fee, _, block), other in zip(pools, others):
+        symbol = meta.get(other, (18, "?"))[1]
+        print(f"✅ {pool} {kind.upper()} fee={fee / 10000:g}% vs {symbol} ({other}) created at {block}")
+    print("-" * 40)
+    print(f"📦 {len(pools)} pools found in {elapsed * 1e6:.0f}µs")
+
+def price_bulk(path, block="latest", workers=BULK_WORKERS):
+    """Prices '<TOKEN> [BASE_TOKEN]' lines concurrently, streaming one JSON object per token to stdout"""
+    rpc_client.get_client(URL, pool_size=workers)
+    height = call_cache.block_number(block)
+
+    def job(parts):
+        try:
+            result = get_v2_price(parts[0], parts[1] if len(parts) > 1 else WBNB_ADDRESS, block)
+        except Exception as e:
+            result = {"token": parts[0].lower(), "error": f"exception: {e}"}
+        result["block"] = height
+        return result
+
+    def emit(futures):
+        for future in futures:
+            sys.stdout.write(json.dumps(future.result()) + "\n")
+        sys.stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for parts in iter_list_file(path):
+            # Bounded in-flight window keeps memory flat however long the input is
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                emit(done)
+            pending.add(pool.submit(job, parts))
+        for future in as_completed(pending):
+            emit([future])
+
+def candidate_pools(token, others):
+    """Pools between token and any of others: from the pair registry, else CREATE2-derived V2 pairs"""
+    token = token.lower()
+    if PAIR_REGISTRY.state["records"]:
+        return [
+            (pool, t0, t1, kind, fee)
+            for pool, t0, t1, kind, fee, _, _ in PAIR_REGISTRY.pools_for(token)
+            if (t1 if t0 == token else t0) in others
+        ]
+    pools = []
+    for other in others:
+        if other == token: continue
+        t0, t1 = sort_tokens(token, other)
+        pools.append((compute_pair_address(t0, t1), t0, t1, "v2", pair_registry.V2_FEE))
+    return pools
+
+def add_pools_to_graph(graph, pools, block):
+    """Reads reserves (V2) or slot0 + liquidity (V3) for all pools in one multicall and adds them as edges"""
+    calls = []
+    for pool, _, _, kind, _ in pools:
+        if kind == "v3":
+            calls += [(pool, FUNC_SLOT0), (pool, FUNC_LIQUIDITY)]
+        else:
+            calls.append((pool, FUNC_GET_RESERVES))
+    results = iter(multicall(calls, block))
+    for pool, t0, t1, kind, fee in pools:
+        if kind == "v3":
+            (ok_slot0, slot0), (ok_liq, liq) = next(results), next(results)
+            if not ok_slot0 or not ok_liq or len(slot0) < 66 or len(liq) < 66: continue
+            reserve0, reserve1 = route_graph.v3_virtual_reserves(int(slot0[2:66], 16), int(liq[2:66], 16))
+        else:
+            ok, res = next(results)
+            reserves = decode_reserves(res) if ok else None
+            if not reserves: continue
+            reserve0, reserve1 = reserves
+        graph.add_pool(pool, t0, t1, reserve0, reserve1, fee)
+
+def build_route_graph(block):
+    """Loads every pool among the hub tokens and precomputes their best rates to USDT"""
+    hubs = [h.lower() for h in ROUTE_HUBS]
+    graph = route_graph.RouteGraph({t: d for t, (d, _) in get_token_meta(hubs, block).items()})
+    seen = set()
+    pools = []
+    for hub in hubs:
+        for entry in candidate_pools(hub, set(hubs)):
+            if entry[0] not in seen:
+                seen.add(entry[0])
+                pools.append(entry)
+    add_pools_to_graph(graph, pools, block)
+    graph.rates_to(USDT_ADDRESS.lower(), ROUTE_MAX_HOPS, ROUTE_MIN_LIQUIDITY)
+    return graph
+
+def route_prices(graph, tokens, block):
+    """Prices a batch of tokens in USDT through their best hub pool; returns {token: result dict}"""
+    rates = graph.rates_to(USDT_ADDRESS.lower(), ROUTE_MAX_HOPS, ROUTE_MIN_LIQUIDITY)
+    tokens = [t.lower() for t in tokens]
+    meta = get_token_meta(tokens, block)
+    graph.decimals.update({t: d for t, (d, _) in meta.items()})
+    pools = [entry for token in dict.fromkeys(tokens) for entry in candidate_pools(token, rates)]
+    add_pools_to_graph(graph, pools, block)
+
+    results = {}
+    for token in tokens:
+        result = {"token": token, "symbol": meta[token][1]}
+        best = graph.quote(token, rates, ROUTE_MIN_LIQUIDITY)
+        if best is None:
+            result["error"] = "no_route"
+        else:
+            price, path, route_pools = best
+            result.update(price_usdt=price, path=list(path), pools=list(route_pools))
+        results[token] = result
+    return results
+
+def get_route_price(token, block):
+    print(f"🔍 Routing {token} to USDT at block {block}...")
+    graph = build_route_graph(block)
+    result = route_prices(graph, [token], block)[token.lower()]
+    if result.get("error"):
+        print(f"❌ No route to USDT with at least {ROUTE_MIN_LIQUIDITY:,.0f} USDT liquidity per hop.")
+        return
+    symbols = {t: s for t, (_, s) in get_token_meta(result["path"], block).items()}
+    print("-" * 40)
+    print(f"🧭 Route: {' -> '.join(symbols[t] if symbols[t] != '?' else t for t in result['path'])}")
+    print(f"💰 Price: 1 {result['symbol']} = {result['price_usdt']:.8f} USDT")
+    print("-" * 40)
+
+def route_bulk(path, block):
+    """JSONL USDT prices for a token list; the hub graph is built once and every batch prices on its own copy"""
+    height = call_cache.block_number(block)
+    graph = build_route_graph(block)
+    batch = []
+
+    def flush():
+        # A fresh copy per batch keeps the batch's own pools from piling up in the hub graph
+        for token, result in route_prices(graph.copy(), batch, block).items():
+            result["block"] = height
+            sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+        batch.clear()
+
+    for parts in iter_list_file(path):
+        batch.append(parts[0])
+        if len(batch) >= ROUTE_BATCH_SIZE: flush()
+    if batch: flush()
+
+def load_checkpoint(path, params):
+    if not os.path.exists(path): return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("params") != params:
+        print(f"❌ {path} belongs to a different series. Delete it or choose another --out.")
+        sys.exit(1)
+    return checkpoint
+
+def save_checkpoint(path, params, next_block, size):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"params": params, "next_block": next_block, "bytes": size}, f)
+    os.replace(tmp, path)
+
+def setup_v2_series(target_token, base_token, block):
+    """Returns (call, header, row_fn) for a V2 reserve series; metadata is read once"""
+    pair_address = compute_pair_address(target_token, base_token)
+    target_is_token0 = sort_tokens(target_token, base_token)[0] == target_token
+    if not decode_reserves(eth_call(pair_address, FUNC_GET_RESERVES, block)):
+        pair_address = get_pair(target_token, base_token, block)
+        if not pair_address or pair_address == "0x0000000000000000000000000000000000000000":
+            return None
+        token0_addr = get_token0(pair_address, block)
+        if not token0_addr: return None
+        target_is_token0 = token0_addr.lower() == target_token
+    meta = get_token_meta([target_token, base_token], block)
+    target_decimals = meta[target_token][0]
+    base_decimals = meta[base_token][0]
+    print(f"✅ Pair: {pair_address} ({meta[target_token][1]} / {meta[base_token][1]})")
+
+    def row(height, res):
+        reserves = decode_reserves(res)
+        if not reserves: return [height, "", "", ""]
+        target_reserve, base_reserve = reserves if target_is_token0 else reserves[::-1]
+        if target_reserve == 0: return [height, target_reserve, base_reserve, ""]
+        price = v2_price(target_reserve, base_reserve, target_decimals, base_decimals)
+        return [height, target_reserve, base_reserve, repr(price)]
+
+    return (pair_address, "v2"), ["block", "target_reserve", "base_reserve", "price"], row
+
+def setup_v3_series(pool_address, block):
+    """Returns (call, header, row_fn) for a V3 slot0 series; metadata is read once"""
+    res_t0, res_t1 = eth_call_batch([(pool_address, FUNC_TOKEN0), (pool_address, FUNC_TOKEN1)], block)
+    if not res_t0 or not res_t1: return None
+    t0_addr = decode_address(res_t0).lower()
+    t1_addr = decode_address(res_t1).lower()
+    meta = get_token_meta([t0_addr, t1_addr], block)
+    dec0 = meta[t0_addr][0]
+    dec1 = meta[t1_addr][0]
+    print(f"✅ Pool: {pool_address} ({meta[t0_addr][1]} / {meta[t1_addr][1]})")
+
+    def row(height, res):
+        raw = res.replace("0x", "") if res else ""
+        if len(raw) < 128: return [height, "", "", ""]
+        sqrt_price_x96 = int(raw[0:64], 16)
+        tick = int(raw[64:128], 16)
+        if tick >= 2**255: tick -= 2**256
+        price = v3_price(sqrt_price_x96, dec0, dec1)
+        return [height, sqrt_price_x96, tick, repr(price)]
+
+    return (pool_address, "v3"), ["block", "sqrt_price_x96", "tick", "price_token1_per_token0"], row
+
+def get_price_history(series, from_block, to_block, step, out_path, workers=BULK_WORKERS):
+    """Writes one CSV row per sampled block, resuming from <out>.ckpt after a crash"""
+    kind, address, base_token = series
+    params = {"kind": kind, "address": address, "base": base_token, "from": from_block, "to": to_block, "step": step}
+    ckpt_path = out_path + ".ckpt"
+    checkpoint = load_checkpoint(ckpt_path, params)
+    if checkpoint and (not os.path.exists(out_path) or os.path.getsize(out_path) < checkpoint["bytes"]):
+        print(f"⚠️  {out_path} is missing or shorter than its checkpoint, starting over")
+        checkpoint = None
+
+    # Metadata is read once per series, at the last block of the range
+    meta_block = hex(to_block)
+    if kind == "v3":
+        setup = setup_v3_series(address, meta_block)
+    else:
+        setup = setup_v2_series(address, base_token, meta_block)
+    if not setup:
+        print("❌ Pool not found at the end of the range.")
+        sys.exit(1)
+    (address, kind), header, row = setup
+
+    next_block = from_block
+    if checkpoint:
+        next_block = checkpoint["next_block"]
+        # Drop rows written after the last checkpoint so they are not duplicated
+        with open(out_path, "r+b") as f:
+            f.truncate(checkpoint["bytes"])
+        print(f"♻️  Resuming at block {next_block:,}")
+    else:
+        with open(out_path, "w", newline="") as f:
+            csv.writer(f).writerow(header)
+
+    heights = range(next_block, to_block + 1, step)
+    if not heights:
+        print(f"✅ Series already complete: {out_path}")
+        return
+
+    rpc_client.get_client(URL, pool_size=workers)
+    window = workers * HISTORY_BATCH_SIZE
+    start = time.perf_counter()
+    done = 0
+
+    def fetch(pool, blocks):
+        batches = [blocks[i : i + HISTORY_BATCH_SIZE] for i in range(0, len(blocks), HISTORY_BATCH_SIZE)]
+        # map() keeps batch order, so results line up with blocks
+        parts = pool.map(lambda b: read_pool_states([(address, kind, hex(h)) for h in b]), batches)
+        return [res for part in parts for res in part]
+
+    with open(out_path, "a", newline="") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(f)
+        for w in range(0, len(heights), window):
+            chunk = heights[w : w + window]
+            results = fetch(pool, chunk)
+            # None means no answer (connection error, RPC error such as missing state): ask again
+            failed = [i for i, res in enumerate(results) if res is None]
+            for attempt in range(1, HISTORY_RETRIES + 1):
+                if not failed: break
+                time.sleep(attempt)
+                for i, res in zip(failed, fetch(pool, [chunk[i] for i in failed])):
+                    results[i] = res
+                failed = [i for i in failed if results[i] is None]
+
+            # Rows stay sorted and gap-free: write up to the first height that still has no answer
+            good = failed[0] if failed else len(chunk)
+            writer.writerows(row(h, res) for h, res in zip(chunk[:good], results[:good]))
+            f.flush()
+            if good:
+                save_checkpoint(ckpt_path, params, chunk[good - 1] + step, f.tell())
+            if failed:
+                print(f"\n❌ No result for block {chunk[good]:,} after {HISTORY_RETRIES} retries. "
+                      f"Run the same command again to resume from there.")
+                sys.exit(1)
+            done += len(chunk)
+            rate = done / (time.perf_counter() - start)
+            print(f"\r📈 {done:,}/{len(heights):,} blocks ({rate:,.0f} blocks/s)", end="", flush=True)
+    print(f"\n✅ Wrote {out_path}")
+
+def pop_option(args, name, default=None):
+    """Removes '<name> VALUE' from args and returns VALUE"""
+    if name not in args: return default
+    idx = args.index(name)
+    if idx + 1 >= len(args):
+        print(f"Error: {name} requires a value")
+        sys.exit(1)
+    args.pop(idx)
+    return args.pop(idx)
+
 def run():
+    global REFRESH_META, USE_STORAGE_READS
     args = sys.argv[1:]
     block = "latest"
 
+    # --storage: read reserves/slot0 from storage slots (checked once per pool against eth_call)
+    if "--storage" in args:
+        args.remove("--storage")
+        USE_STORAGE_READS = True
+
+    # --refresh: ignore cached token metadata (fresh values are written back)
+    if "--refresh" in args:
+        args.remove("--refresh")
+        REFRESH_META = True
+
+    workers = pop_option(args, "--workers", str(BULK_WORKERS))
+    if not workers.isdigit() or int(workers) < 1:
+        print("Error: --workers requires a positive number")
+        sys.exit(1)
+    workers = int(workers)
+
+    # History range: --from-block A --to-block B [--step N] [--out FILE]
+    from_block = pop_option(args, "--from-block")
+    to_block = pop_option(args, "--to-block")
+    step = pop_option(args, "--step", "1")
+    rounds = pop_option(args, "--rounds", "5")
+    out_path = pop_option(args, "--out")
+
     # Parse --block argument
     if "--block" in args:
         try:
@@ -193,10 +1032,48 @@ def run():
         except ValueError:
             pass
 
+    if len(args) >= 1 and from_block is not None:
+        try:
+            from_block = int(format_block(from_block), 16)
+            to_block = int(format_block(to_block or resolve_block("latest")), 16)
+            step = int(step)
+        except ValueError:
+            print("Error: --from-block/--to-block/--step must be block numbers")
+            sys.exit(1)
+        if step < 1 or to_block < from_block:
+            print("Error: need --from-block <= --to-block and --step >= 1")
+            sys.exit(1)
+        if args[0] == "--v3":
+            if len(args) < 2:
+                print("Usage: python get_token_price.py --v3 <POOL_ADDRESS> --from-block A --to-block B [--step N] [--out FILE]")
+                sys.exit(1)
+            series = ("v3", args[1].lower(), None)
+        else:
+            series = ("v2", args[0].lower(), args[1].lower() if len(args) > 1 else WBNB_ADDRESS.lower())
+        out_path = out_path or f"prices_{series[1]}_{from_block}_{to_block}_{step}.csv"
+        get_price_history(series, from_block, to_block, step, out_path, workers)
+        return
+
+    if len(args) >= 1:
+        block = resolve_block(block)
+
     if len(args) < 1:
         print("Usage:")
         print("  V2: python get_token_price.py <TOKEN_ADDRESS> [BASE_TOKEN_ADDRESS] [--block BLOCK_NUM]")
         print("  V3: python get_token_price.py --v3 <POOL_ADDRESS> [--block BLOCK_NUM]")
+        print("  Multicall: python get_token_price.py --multicall <WATCH_LIST_FILE|-> [--block BLOCK_NUM]")
+        print("             (one '<POOL_ADDRESS> [v2|v3]' per line)")
+        print("  Bulk (JSONL): python get_token_price.py --bulk <TOKEN_LIST_FILE|-> [--workers N] [--block BLOCK_NUM]")
+        print("             (one '<TOKEN_ADDRESS> [BASE_TOKEN_ADDRESS]' per line)")
+        print("  History (CSV): add --from-block A [--to-block B] [--step N] [--out FILE] to a V2 or V3 lookup")
+        print("             (resumes from <FILE>.ckpt after an interruption)")
+        print("  Compare read paths: python get_token_price.py --compare-reads <WATCH_LIST_FILE|-> [--rounds N]")
+        print("  --storage: read reserves/slot0 with eth_getStorageAt instead of eth_call")
+        print("  Best route to USDT: python get_token_price.py --route <TOKEN_ADDRESS> [--block BLOCK_NUM]")
+        print("             (--route-bulk <TOKEN_LIST_FILE|-> for JSONL over many tokens)")
+        print("  All pools of a token (local registry): python get_token_price.py --pools <TOKEN_ADDRESS>")
+        print("  Prefetch metadata: python get_token_price.py --prefetch <TOKEN_LIST_FILE|->")
+        print("  --refresh: bypass the token metadata cache (cache/token_meta.sqlite)")
         print(f"Default Base Token (V2): WBNB ({WBNB_ADDRESS})")
         sys.exit(1)
 
@@ -209,58 +1086,92 @@ def run():
         get_v3_pool_price(args[1], block)
         return
 
+    if arg1 == "--multicall":
+        if len(args) < 2:
+            print("Usage: python get_token_price.py --multicall <WATCH_LIST_FILE|-> [--block BLOCK_NUM]")
+            sys.exit(1)
+        get_multicall_snapshot(args[1], block)
+        return
+
+    if arg1 == "--bulk":
+        if len(args) < 2:
+            print("Usage: python get_token_price.py --bulk <TOKEN_LIST_FILE|-> [--workers N] [--block BLOCK_NUM]")
+            sys.exit(1)
+        price_bulk(args[1], block, workers)
+        return
+
+    if arg1 == "--compare-reads":
+        if len(args) < 2 or not rounds.isdigit() or int(rounds) < 1:
+            print("Usage: python get_token_price.py --compare-reads <WATCH_LIST_FILE|-> [--rounds N] [--block BLOCK_NUM]")
+            sys.exit(1)
+        compare_read_paths(args[1], block, int(rounds))
+        return
+
+    if arg1 in ("--route", "--route-bulk"):
+        if len(args) < 2:
+            print(f"Usage: python get_token_price.py {arg1} <{'TOKEN_ADDRESS' if arg1 == '--route' else 'TOKEN_LIST_FILE|-'}> [--block BLOCK_NUM]")
+            sys.exit(1)
+        if arg1 == "--route":
+            get_route_price(args[1].lower(), block)
+        else:
+            route_bulk(args[1], block)
+        return
+
+    if arg1 == "--pools":
+        if len(args) < 2:
+            print("Usage: python get_token_price.py --pools <TOKEN_ADDRESS>")
+            sys.exit(1)
+        list_token_pools(args[1])
+        return
+
+    if arg1 == "--prefetch":
+        if len(args) < 2:
+            print("Usage: python get_token_price.py --prefetch <TOKEN_LIST_FILE|->")
+            sys.exit(1)
+        prefetch_metadata(args[1], block)
+        return
+
     target_token = args[0].lower()
     base_token = args[1].lower() if len(args) > 1 else WBNB_ADDRESS.lower()
     
     print(f"🔍 Looking up V2 pair for {target_token} / {base_token} at block {block}...")
     
-    # 1. Get Pair Address
-    pair_address = get_pair(target_token, base_token, block)
-    
-    if not pair_address or pair_address == "0x0000000000000000000000000000000000000000":
+    result = get_v2_price(target_token, base_token, block)
+    error = result.get("error")
+    if error == "pair_not_found":
         print("❌ Liquidity Pair not found on PancakeSwap V2.")
+        print("   Try --route to price it through other pools.")
         sys.exit(0)
-        
-    print(f"✅ Found Pair: {pair_address}")
-    
-    # 2. Get Reserves
-    reserves = get_reserves(pair_address, block)
-    if not reserves:
+    if error == "reserves_unavailable":
         print("❌ Could not fetch reserves.")
         sys.exit(1)
-        
-    reserve0, reserve1 = reserves
-    
-    # 3. Determine which reserve is which
-    token0_addr = get_token0(pair_address, block)
-    
-    if token0_addr.lower() == target_token:
-        target_reserve = reserve0
-        base_reserve = reserve1
-    else:
-        target_reserve = reserve1
-        base_reserve = reserve0
+    if error == "token0_unavailable":
+        print("❌ Could not fetch token0.")
+        sys.exit(1)
 
-    # 4. Get Decimals
-    target_decimals = get_decimals(target_token, block)
-    base_decimals = get_decimals(base_token, block)
-    
-    # 5. Calculate Price
-    if target_reserve == 0:
+    print(f"✅ Found Pair: {result['pair']}")
+
+    if error == "zero_liquidity":
         print("❌ Liquidity is zero.")
         sys.exit(0)
 
-    price = (base_reserve / (10**base_decimals)) / (target_reserve / (10**target_decimals))
-    
-    base_symbol = "BNB" if base_token == WBNB_ADDRESS.lower() else "BaseToken"
+    target_amount = result["target_reserve"] / 10**result["target_decimals"]
+    base_amount = result["base_reserve"] / 10**result["base_decimals"]
+    base_symbol = "BNB" if base_token == WBNB_ADDRESS.lower() else (result["base_symbol"] if result["base_symbol"] != "?" else "BaseToken")
     if base_token == USDT_ADDRESS.lower(): base_symbol = "USDT"
 
     print("-" * 40)
-    print(f"💰 Price: {price:.8f} {base_symbol}")
-    print(f"📊 Reserves: {target_reserve / 10**target_decimals:,.2f} Target / {base_reserve / 10**base_decimals:,.2f} {base_symbol}")
+    print(f"💰 Price: {result['price']:.8f} {base_symbol}")
+    print(f"📊 Reserves: {target_amount:,.2f} Target / {base_amount:,.2f} {base_symbol}")
     print("-" * 40)
     
 def main():
+    global URL
+    # Bulk / history / comparison modes: run once, without the timing banner
+    if any(flag in sys.argv for flag in ("--bulk", "--route-bulk", "--from-block", "--compare-reads")):
+        run()
+        return
+
     start_time = time.perf_counter()
     run()
     print("执行免费PRC业务代码...")
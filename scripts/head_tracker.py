@@ -0,0 +1,309 @@
+"""
+newHeads tracker: block arrival latency and reorgs, measured on the node.
+
+Subscribes to newHeads over the WebSocket endpoint and stamps every header
+when it arrives, against the block's own timestamp (with the millisecond part
+BSC keeps in mixHash, BEP-520). Latencies and the intervals between arrivals
+go into HDR-style histograms (fixed log-linear buckets, 2 significant digits,
+constant memory). The last RING_SIZE heads sit in a ring buffer keyed by
+number, which is enough to spot a replaced head or a new head whose parent is
+not the one we saw, i.e. a reorg, and its depth. Transaction counts come from
+eth_getBlockTransactionCountByNumber instead of full block bodies, sent over the
+same WebSocket without waiting: the head line is printed when the answer comes
+in, so the receive loop never blocks and later headers are stamped on time.
+
+Usage:
+    python3 head_tracker.py [--ws URL] [--report 60] [--quiet] [--jsonl] [--no-txs]
+"""
+import json
+import socket
+import sys
+import time
+from array import array
+
+import rpc_client
+import ws_client
+
+RING_SIZE = 1024
+REORG_LOG = 32
+MAX_PENDING = 64  # heads waiting for their transaction count
+REPORT_EVERY = 60
+IDLE_TIMEOUT = 30
+RECONNECT_MAX_DELAY = 30
+HIST_MAX_MS = 3_600_000  # latencies above 1h are clamped into the last bucket
+
+
+class Histogram:
+    """HDR-style histogram of non-negative integers (ms), ~1% relative precision"""
+
+    SUB_BITS = 8  # 256 sub-buckets per power of two -> 2 significant digits
+
+    def __init__(self, max_value=HIST_MAX_MS):
+        self.half = 1 << (self.SUB_BITS - 1)
+        self.max_value = max_value
+        self.counts = array("Q", bytes(8 * (self._index(max_value) + 1)))
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)): self.counts[i] = 0
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        bucket = max(0, value.bit_length() - self.SUB_BITS)
+        return ((bucket + 1) << (self.SUB_BITS - 1)) + (value >> bucket) - self.half
+
+    def _value(self, index):
+        """Highest value that lands in bucket `index`"""
+        bucket = (index >> (self.SUB_BITS - 1)) - 1
+        sub = (index & (self.half - 1)) + self.half
+        if bucket < 0:
+            bucket, sub = 0, sub - self.half
+        return ((sub + 1) << bucket) - 1
+
+    def record(self, value):
+        value = min(max(0, int(value)), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, pct):
+        if not self.total: return None
+        rank = max(1, -(-self.total * pct // 100))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if not count: continue
+            seen += count
+            if seen >= rank:
+                return min(self._value(i), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.total: return {"count": 0}
+        return {"count": self.total, "min": self.min, "p50": self.percentile(50), "p90": self.percentile(90),
+                "p99": self.percentile(99), "p999": self.percentile(99.9), "max": self.max,
+                "mean": round(self.sum / self.total, 1)}
+
+
+class HeadRing:
+    """Hashes of the last RING_SIZE heads by number, for reorg detection"""
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.numbers = array("q", [-1]) * size
+        self.hashes = [None] * size
+        self.last = None
+
+    def get(self, number):
+        slot = number % self.size
+        return self.hashes[slot] if self.numbers[slot] == number else None
+
+    def add(self, number, block_hash, parent_hash):
+        """Stores a head; returns the reorg depth it reveals (0 if none)"""
+        depth = 0
+        known = self.get(number)
+        if known is not None and known != block_hash:
+            # Same height, different block: everything from here to the old tip was replaced
+            depth = self.last - number + 1
+        elif self.get(number - 1) not in (None, parent_hash):
+            depth = max(1, self.last - number + 2)
+        slot = number % self.size
+        self.numbers[slot] = number
+        self.hashes[slot] = block_hash
+        self.last = number if depth or self.last is None else max(self.last, number)
+        return depth
+
+
+def header_time_ms(header):
+    """Block timestamp in ms; BEP-520 headers carry the millisecond part in mixHash"""
+    seconds = int(header["timestamp"], 16)
+    millis = int(header.get("mixHash") or "0x0", 16)
+    return seconds * 1000 + (millis if millis < 1000 else 0)
+
+
+class HeadTracker:
+    def __init__(self, ws_url=ws_client.DEFAULT_WS_URL, report_every=REPORT_EVERY,
+                 quiet=False, jsonl=False, tx_counts=True):
+        self.ws_url = ws_url
+        self.report_every = report_every
+        self.quiet = quiet
+        self.jsonl = jsonl
+        self.tx_counts = tx_counts
+        self.latency = Histogram()
+        self.interval = Histogram()
+        self.period_latency = Histogram()
+        self.ring = HeadRing()
+        self.reorgs = []
+        self.reorg_count = 0
+        self.heads = 0
+        self.last_arrival = None
+        self.next_report = time.time() + report_every
+        self.ws = None
+        self.pending = {}  # request id -> head record waiting for its transaction count
+        self.next_id = 2
+
+    def request_tx_count(self, head):
+        """Asks the node for the head's transaction count; the answer is handled in listen()"""
+        req_id = self.next_id
+        self.next_id += 1
+        self.pending[req_id] = head
+        self.ws.send_json({"jsonrpc": "2.0", "id": req_id, "method": "eth_getBlockTransactionCountByNumber",
+                           "params": [hex(head["number"])]})
+        while len(self.pending) > MAX_PENDING:
+            # Node is not answering: print the oldest without a count
+            self.emit(self.pending.pop(min(self.pending)))
+
+    def on_tx_count(self, msg):
+        head = self.pending.pop(msg["id"], None)
+        if head is None: return
+        result = msg.get("result")
+        head["txs"] = int(result, 16) if result else None
+        self.emit(head)
+
+    def flush_pending(self):
+        for req_id in sorted(self.pending):
+            self.emit(self.pending[req_id])
+        self.pending.clear()
+
+    def emit(self, head):
+        if self.jsonl:
+            print(json.dumps(head), flush=True)
+        elif not self.quiet:
+            txs, depth, interval = head["txs"], head["reorg_depth"], head["interval_ms"]
+            reorg = f" ⚠️ reorg depth {depth}" if depth else ""
+            gap = f" | 间隔 {interval}ms" if interval is not None else ""
+            print(f"⛓️  #{head['number']:,} {head['hash'][:12]}… | 交易 {txs if txs is not None else '-'} "
+                  f"| 延迟 {head['latency_ms']}ms{gap}{reorg}")
+
+    def on_head(self, header, arrived_ms):
+        number = int(header["number"], 16)
+        latency = arrived_ms - header_time_ms(header)
+        self.heads += 1
+        self.latency.record(latency)
+        self.period_latency.record(latency)
+        interval = None
+        if self.last_arrival is not None:
+            interval = arrived_ms - self.last_arrival
+            self.interval.record(interval)
+        self.last_arrival = arrived_ms
+
+        depth = self.ring.add(number, header["hash"], header["parentHash"])
+        if depth:
+            self.reorg_count += 1
+            self.reorgs.append({"time": arrived_ms / 1000, "number": number, "depth": depth, "hash": header["hash"]})
+            del self.reorgs[:-REORG_LOG]
+
+        head = {"number": number, "hash": header["hash"], "latency_ms": latency,
+                "interval_ms": interval, "txs": None, "reorg_depth": depth}
+        if self.tx_counts:
+            self.request_tx_count(head)
+        else:
+            self.emit(head)
+
+    def report(self):
+        summary = {"heads": self.heads, "reorgs": self.reorg_count,
+                   "latency_ms": self.latency.summary(), "last_period_latency_ms": self.period_latency.summary(),
+                   "interval_ms": self.interval.summary(), "recent_reorgs": self.reorgs[-5:]}
+        if self.jsonl:
+            print(json.dumps({"report": summary}), flush=True)
+        else:
+            def fmt(s):
+                if not s["count"]: return "-"
+                return f"p50 {s['p50']}ms / p90 {s['p90']}ms / p99 {s['p99']}ms / max {s['max']}ms (n={s['count']})"
+            print("-" * 60)
+            print(f"📊 区块到达延迟: {fmt(summary['latency_ms'])}")
+            print(f"   最近 {self.report_every}s: {fmt(summary['last_period_latency_ms'])}")
+            print(f"⏱️  到达间隔:     {fmt(summary['interval_ms'])}")
+            print(f"🔀 Reorg: {self.reorg_count} 次"
+                  + (f" (最近: #{self.reorgs[-1]['number']:,} 深度 {self.reorgs[-1]['depth']})" if self.reorgs else ""))
+            print("-" * 60)
+        self.period_latency.reset()
+
+    def subscribe(self, ws):
+        ws.send_json({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]})
+        while True:
+            msg = ws.recv_json(timeout=10)
+            if msg.get("id") == 1:
+                if "error" in msg:
+                    raise rpc_client.RpcError(msg["error"])
+                return msg["result"]
+
+    def listen(self, ws, sub_id):
+        waiting_pong = False
+        while True:
+            try:
+                msg = ws.recv_json(timeout=min(IDLE_TIMEOUT, max(0.1, self.next_report - time.time())))
+            except socket.timeout:
+                if time.time() >= self.next_report:
+                    self.report()
+                    self.next_report = time.time() + self.report_every
+                    continue
+                if waiting_pong and ws.last_pong is None:
+                    raise ws_client.WebSocketClosed("No pong from node")
+                ws.last_pong = None
+                ws.ping()
+                waiting_pong = True
+                continue
+            # Stamp before any parsing work beyond the frame itself
+            arrived_ms = int(time.time() * 1000)
+            waiting_pong = False
+            params = msg.get("params") or {}
+            if msg.get("method") == "eth_subscription" and params.get("subscription") == sub_id:
+                self.on_head(params["result"], arrived_ms)
+            elif msg.get("id") in self.pending:
+                self.on_tx_count(msg)
+            if time.time() >= self.next_report:
+                self.report()
+                self.next_report = time.time() + self.report_every
+
+    def run(self):
+        delay = 1
+        while True:
+            ws = None
+            try:
+                ws = self.ws = ws_client.WebSocket(self.ws_url)
+                sub_id = self.subscribe(ws)
+                print(f"📡 Subscribed to newHeads on {self.ws_url}", file=sys.stderr)
+                delay = 1
+                self.listen(ws, sub_id)
+            except (OSError, ValueError, ws_client.WebSocketClosed, rpc_client.RpcError) as e:
+                print(f"❌ Subscription interrupted: {e}; reconnecting in {delay}s", file=sys.stderr)
+            finally:
+                if ws is not None: ws.close()
+                # Answers for these will never come on a new connection
+                self.flush_pending()
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+
+    def option(name, default=None):
+        if name not in args: return default
+        return args[args.index(name) + 1]
+
+    tracker = HeadTracker(
+        option("--ws", ws_client.DEFAULT_WS_URL),
+        float(option("--report", REPORT_EVERY)),
+        quiet="--quiet" in args,
+        jsonl="--jsonl" in args,
+        tx_counts="--no-txs" not in args,
+    )
+    try:
+        tracker.run()
+    except KeyboardInterrupt:
+        tracker.flush_pending()
+        tracker.report()
+        print("👋 Stopped.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
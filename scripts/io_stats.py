@@ -0,0 +1,295 @@
+"""
+Disk and process I/O telemetry from /proc, for correlating with sync speed.
+
+    DiskStats(name)       /proc/diskstats deltas for one block device:
+                          %util, IOPS, read/write MB/s, await (like iostat -x)
+    ProcessStats(pidfile) /proc/<pid>/io and /proc/<pid>/status of geth:
+                          storage read/write MB/s and RSS
+    SaturationWatch       tracks periods where the disk stays saturated while
+                          sync throughput drops
+
+Every /proc file is opened once and re-read with a single pread() per sample,
+so sampling costs a few syscalls and no subprocesses. The device behind the
+data dir is found from st_dev (or the mount table for btrfs/overlay style
+mounts) and can be forced with --disk.
+
+Usage:
+    python3 io_stats.py [--datadir /data/bsc/data] [--disk nvme0n1] [--pid-file ../bsc.pid] [--interval 1]
+"""
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.environ.get("BSC_DATA_DIR", "/data/bsc/data")
+PID_FILE = os.path.join(ROOT_DIR, "bsc.pid")
+SECTOR = 512
+MIN_INTERVAL = 1.0       # deltas over shorter intervals are too noisy to show (iostat -x 1)
+SATURATED_UTIL = 90.0    # %util at or above this counts as saturated
+SATURATED_FOR = 30       # seconds of saturation before a slowdown is blamed on the disk
+DROP_RATIO = 0.5         # 1m rate below this fraction of the 15m rate counts as a drop
+READ_SIZE = 65536
+
+
+class ProcFile:
+    """A /proc file kept open and re-read from offset 0 with one pread() per sample"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        data = os.pread(self.fd, READ_SIZE, 0)
+        while len(data) % READ_SIZE == 0 and data:
+            # Very long /proc/diskstats (hundreds of loop devices): keep reading
+            more = os.pread(self.fd, READ_SIZE, len(data))
+            if not more: break
+            data += more
+        return data
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _diskstats():
+    with open("/proc/diskstats", "rb") as f:
+        return [line.split() for line in f.read().splitlines()]
+
+
+def _existing(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def device_for_path(path=DATA_DIR):
+    """Name of the /proc/diskstats device holding `path` (or its nearest existing parent)"""
+    try:
+        path = os.path.realpath(_existing(path))
+        st = os.stat(path)
+        rows = _diskstats()
+    except OSError:
+        return None
+    names = {(int(r[0]), int(r[1])): r[2].decode() for r in rows}
+    name = names.get((os.major(st.st_dev), os.minor(st.st_dev)))
+    if name:
+        return name
+
+    # btrfs, overlay, ZFS...: st_dev is anonymous, fall back to the source of the longest matching mount
+    best, source = "", None
+    try:
+        with open("/proc/self/mountinfo") as f:
+            for line in f:
+                fields = line.split()
+                mount = fields[4].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(best):
+                    best, source = mount, fields[fields.index("-") + 2]
+    except OSError:
+        return None
+    if source and source.startswith("/dev/"):
+        name = os.path.basename(os.path.realpath(source))
+        if name in names.values():
+            return name
+    return None
+
+
+class DiskStats:
+    def __init__(self, name):
+        self.name = name
+        self.file = ProcFile("/proc/diskstats")
+        self.key = f" {name} ".encode()
+        self.prev = None
+        self.last = None
+
+    def _counters(self):
+        data = self.file.read()
+        idx = data.find(self.key)
+        if idx < 0:
+            return None
+        f = data[idx + len(self.key): data.find(b"\n", idx)].split()
+        # reads, read sectors, read ms, writes, write sectors, write ms, io ms
+        return int(f[0]), int(f[2]), int(f[3]), int(f[4]), int(f[6]), int(f[7]), int(f[9])
+
+    def sample(self, now=None):
+        """Rates since the previous sample, or the last rates if less than MIN_INTERVAL passed"""
+        now = time.monotonic() if now is None else now
+        if self.prev is not None and now - self.prev[0] < MIN_INTERVAL:
+            return self.last
+        counters = self._counters()
+        if counters is None:
+            return None
+        prev, self.prev = self.prev, (now, counters)
+        if prev is None:
+            return None
+        dt = now - prev[0]
+        reads, rsec, rms, writes, wsec, wms, io_ms = (c - p for c, p in zip(counters, prev[1]))
+        ios = reads + writes
+        self.last = {
+            "util": min(100.0, io_ms / (dt * 10)),
+            "iops": ios / dt,
+            "read_mb": rsec * SECTOR / dt / 1024**2,
+            "write_mb": wsec * SECTOR / dt / 1024**2,
+            "await": (rms + wms) / ios if ios else 0.0,
+        }
+        return self.last
+
+    def close(self):
+        self.file.close()
+
+
+class ProcessStats:
+    """Storage I/O and RSS of the process in `pid_file`; follows restarts"""
+
+    def __init__(self, pid_file=PID_FILE):
+        self.pid_file = pid_file
+        self.pid = None
+        self.io = self.status = None
+        self.prev = None
+        self.last = None
+
+    def _open(self):
+        self.close()
+        try:
+            with open(self.pid_file) as f:
+                self.pid = int(f.read().strip())
+            self.status = ProcFile(f"/proc/{self.pid}/status")
+        except (OSError, ValueError):
+            self.pid = None
+            return False
+        try:
+            self.io = ProcFile(f"/proc/{self.pid}/io")
+        except OSError:
+            # /proc/<pid>/io needs the same user (or root); RSS is still readable
+            self.io = None
+        return True
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.prev is not None and now - self.prev[0] < MIN_INTERVAL:
+            return self.last
+        if self.status is None and not self._open():
+            return None
+        try:
+            status = self.status.read()
+            io = self.io.read() if self.io is not None else b""
+        except OSError:
+            status = b""
+        if not status:
+            # Process exited (reads of a dead pid's files fail or come back empty): re-read the pid file next time
+            self.close()
+            self.prev = self.last = None
+            return None
+
+        rss = next((int(line.split()[1]) * 1024 for line in status.splitlines() if line.startswith(b"VmRSS:")), 0)
+        counters = {}
+        for line in io.splitlines():
+            key, _, value = line.partition(b":")
+            counters[key] = int(value)
+        result = {"pid": self.pid, "rss": rss}
+        if counters:
+            current = (counters.get(b"read_bytes", 0), counters.get(b"write_bytes", 0))
+            prev, self.prev = self.prev, (now, current)
+            if prev is not None:
+                dt = now - prev[0]
+                result["read_mb"] = (current[0] - prev[1][0]) / dt / 1024**2
+                result["write_mb"] = (current[1] - prev[1][1]) / dt / 1024**2
+        else:
+            self.prev = (now, None)
+        self.last = result
+        return result
+
+    def close(self):
+        for f in (self.io, self.status):
+            if f is not None: f.close()
+        self.io = self.status = None
+
+
+def throughput_dropped(rates):
+    """rates: [(1m rate, 15m rate)] of the sync counters; True if any moving counter slowed down sharply"""
+    return any(short is not None and long_ and short < long_ * DROP_RATIO for short, long_ in rates)
+
+
+class SaturationWatch:
+    """Periods where the disk stayed saturated while sync throughput dropped"""
+
+    def __init__(self):
+        self.saturated_since = None
+        self.episode_start = None
+        self.episodes = 0
+        self.last_episode = None  # (start, duration)
+
+    def update(self, now, util, dropped):
+        """Returns how long the current disk-bound slowdown has lasted (seconds), or None"""
+        if util is not None and util >= SATURATED_UTIL:
+            if self.saturated_since is None: self.saturated_since = now
+        else:
+            self.saturated_since = None
+        active = dropped and self.saturated_since is not None and now - self.saturated_since >= SATURATED_FOR
+        if active:
+            if self.episode_start is None:
+                self.episode_start = self.saturated_since
+                self.episodes += 1
+            self.last_episode = (self.episode_start, now - self.episode_start)
+            return now - self.episode_start
+        self.episode_start = None
+        return None
+
+
+def format_disk(name, disk):
+    if disk is None:
+        return f"💽 磁盘 {name}: 采样中..."
+    return (f"💽 磁盘 {name}: util {disk['util']:.1f}% | IOPS {disk['iops']:,.0f} | "
+            f"读 {disk['read_mb']:.1f} MB/s | 写 {disk['write_mb']:.1f} MB/s | await {disk['await']:.2f}ms")
+
+
+def format_process(proc):
+    if proc is None:
+        return "🧠 geth: 未运行 (bsc.pid)"
+    line = f"🧠 geth (PID {proc['pid']}): RSS {proc['rss'] / 1024**3:.2f} GB"
+    if "read_mb" in proc:
+        line += f" | 读 {proc['read_mb']:.1f} MB/s | 写 {proc['write_mb']:.1f} MB/s"
+    return line
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+
+    def option(name, default=None):
+        if name not in args: return default
+        idx = args.index(name)
+        if idx + 1 >= len(args) or args[idx + 1].startswith("--"):
+            print(f"❌ {name} requires a value\nUsage: {__doc__.strip().splitlines()[-1].strip()}", file=sys.stderr)
+            sys.exit(1)
+        return args[idx + 1]
+
+    name = option("--disk") or device_for_path(option("--datadir", DATA_DIR))
+    if not name:
+        print("❌ Could not find the block device of the data dir; pass --disk NAME")
+        sys.exit(1)
+    disk = DiskStats(name)
+    proc = ProcessStats(option("--pid-file", PID_FILE))
+    interval = max(MIN_INTERVAL, float(option("--interval", MIN_INTERVAL)))
+    try:
+        while True:
+            stats = disk.sample()
+            if stats is not None:
+                print(format_disk(name, stats))
+                print("   " + format_process(proc.sample()))
+            else:
+                proc.sample()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        disk.close()
+        proc.close()
+
+
+if __name__ == "__main__":
+    main()
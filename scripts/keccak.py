@@ -0,0 +1,67 @@
+"""
+Pure-Python Keccak-256 (the pre-NIST padding Ethereum uses, not hashlib's sha3_256).
+
+Fast enough for address derivation, selectors and event topics; not meant for
+hashing large payloads.
+"""
+
+RATE = 136  # bytes, for a 256-bit output
+MASK = (1 << 64) - 1
+
+ROUND_CONSTANTS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+
+# Rotation offsets indexed by lane position x + 5 * y
+ROTATIONS = (
+    0, 1, 62, 28, 27,
+    36, 44, 6, 55, 20,
+    3, 10, 43, 25, 39,
+    41, 45, 15, 21, 8,
+    18, 2, 61, 56, 14,
+)
+
+
+def _rotl(value, shift):
+    return ((value << shift) | (value >> (64 - shift))) & MASK if shift else value
+
+
+def _keccak_f(state):
+    for rc in ROUND_CONSTANTS:
+        # theta
+        c = [state[x] ^ state[x + 5] ^ state[x + 10] ^ state[x + 15] ^ state[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rotl(c[(x + 1) % 5], 1) for x in range(5)]
+        state = [state[i] ^ d[i % 5] for i in range(25)]
+        # rho + pi
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = _rotl(state[x + 5 * y], ROTATIONS[x + 5 * y])
+        # chi
+        state = [b[i] ^ (~b[(i % 5 + 1) % 5 + 5 * (i // 5)] & b[(i % 5 + 2) % 5 + 5 * (i // 5)]) for i in range(25)]
+        # iota
+        state[0] ^= rc
+    return state
+
+
+def keccak256(data):
+    """Returns the 32-byte Keccak-256 digest of bytes"""
+    data = bytes(data)
+    padded = bytearray(data)
+    padded.append(0x01)
+    padded.extend(b"\x00" * (-len(padded) % RATE))
+    padded[-1] |= 0x80
+
+    state = [0] * 25
+    for offset in range(0, len(padded), RATE):
+        block = padded[offset : offset + RATE]
+        for i in range(RATE // 8):
+            state[i] ^= int.from_bytes(block[i * 8 : i * 8 + 8], "little")
+        state = _keccak_f(state)
+
+    return b"".join(lane.to_bytes(8, "little") for lane in state[:4])
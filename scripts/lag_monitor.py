@@ -0,0 +1,327 @@
+"""
+Sync lag monitor: local head vs the public BSC network, every 0.5 s.
+
+Python counterpart of bsc-sync-monitor-full.sh with bounded refresh time:
+- the reference height is asked from the HEDGE_FANOUT best public endpoints
+  at once; the highest answer wins, and the refresh waits at most HEDGE_GRACE
+  after the first answer (never more than --deadline) instead of walking the
+  list with a 5 s timeout per dead endpoint
+- every endpoint keeps an EWMA of latency and error rate; the score decides
+  who is asked, and failing or slow endpoints are benched with exponential
+  backoff (late answers still update their stats)
+- the local node is read with one JSON-RPC batch per refresh: eth_blockNumber,
+  the latest header (transaction hashes only) and net_peerCount
+
+Usage:
+    python3 lag_monitor.py [--interval 0.5] [--deadline 1.0] [--public URL,URL,...]
+                           [--stats] [--jsonl] [--once] [--stub 20,80,3000,dead]
+
+--stub replaces the public endpoints with local stand-in nodes (rpc_bench.py)
+answering after the given number of milliseconds; "dead" is a closed port.
+The Alchemy endpoint carries an API key, so it is read from ALCHEMY_URL and
+left out of the public list when that variable is not set.
+"""
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rpc_client
+
+URL = rpc_client.DEFAULT_ENDPOINT
+# 带 API key 的 Alchemy 端点 (https://bnb-mainnet.g.alchemy.com/v2/<key>), 未设置则跳过
+ALCHEMY_URL = os.environ.get("ALCHEMY_URL", "").strip()
+# 公共RPC端点 (与 bsc-sync-monitor-full.sh 相同)
+PUBLIC_RPCS = [url for url in [
+    ALCHEMY_URL,
+    "https://bsc-dataseed1.binance.org",
+    "https://bsc-dataseed2.binance.org",
+    "https://bsc-dataseed3.binance.org",
+    "https://bsc-dataseed4.binance.org",
+    "https://bsc-dataseed.binance.org",
+] if url]
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEADLINE = 1.0   # hard cap on waiting for public answers per refresh
+HEDGE_FANOUT = 3         # public endpoints asked per refresh
+HEDGE_GRACE = 0.15       # keep collecting this long after the first answer
+REQUEST_TIMEOUT = 5      # a stuck request only occupies its own worker
+LOCAL_TIMEOUT = 2        # local batch, further capped by what is left of --deadline
+MIN_LOCAL_TIMEOUT = 0.05
+EWMA_ALPHA = 0.2
+SLOW_LATENCY = 1.0       # endpoints slower than this (EWMA) are benched like failures
+BENCH_BASE = 2.0
+BENCH_MAX = 120.0
+BLOCK_TIME = 0.75        # BSC block interval after Maxwell, used only when no timestamp is known
+
+RED, GREEN, YELLOW, ORANGE, BLUE, NC = "\033[0;31m", "\033[0;32m", "\033[1;33m", "\033[0;33m", "\033[0;34m", "\033[0m"
+
+
+class Endpoint:
+    """Latency / error statistics and backoff state of one public endpoint"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.benched_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = False
+        self.last_height = None
+
+    def score(self):
+        """Lower is better: expected latency inflated by the error rate; untried endpoints go first"""
+        if self.latency is not None:
+            latency = self.latency
+        else:
+            latency = SLOW_LATENCY if self.requests else 0.0
+        return latency * (1 + 4 * self.error_rate)
+
+    def available(self, now):
+        return not self.in_flight and now >= self.benched_until
+
+    def record(self, latency, ok, now):
+        self.requests += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.latency = latency if self.latency is None else self.latency + EWMA_ALPHA * (latency - self.latency)
+        else:
+            self.errors += 1
+        if ok and self.latency <= SLOW_LATENCY:
+            self.failures = 0
+            return
+        # Exponential backoff: 2s, 4s, 8s ... up to BENCH_MAX
+        self.failures += 1
+        self.benched_until = now + min(BENCH_MAX, BENCH_BASE ** self.failures)
+
+    def name(self):
+        return self.url.split("/")[2]
+
+
+class PublicHead:
+    """Hedged eth_blockNumber over the best-scoring public endpoints"""
+
+    def __init__(self, urls, fanout=HEDGE_FANOUT, grace=HEDGE_GRACE):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.fanout = fanout
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(urls)))
+
+    def _ask(self, endpoint, answers, finished, done):
+        start = time.perf_counter()
+        height = None
+        try:
+            result = rpc_client.get_client(endpoint.url, timeout=REQUEST_TIMEOUT, pool_size=2).call("eth_blockNumber")
+            height = int(result, 16)
+        except Exception:
+            pass
+        latency = time.perf_counter() - start
+        with self.lock:
+            endpoint.in_flight = False
+            endpoint.record(latency, height is not None, time.time())
+            if height is not None:
+                endpoint.last_height = height
+                answers.append((height, endpoint))
+            finished.append(endpoint)
+        done.set()
+
+    def pick(self):
+        now = time.time()
+        with self.lock:
+            ready = [e for e in self.endpoints if e.available(now)]
+            ready.sort(key=Endpoint.score)
+            chosen = ready[:self.fanout]
+            if not chosen:
+                # Everything benched: probe the one whose bench ends first
+                idle = [e for e in self.endpoints if not e.in_flight]
+                chosen = sorted(idle, key=lambda e: e.benched_until)[:1]
+            for e in chosen: e.in_flight = True
+        return chosen
+
+    def start(self):
+        """Fires the hedged requests; returns a handle for collect()"""
+        answers, finished, done = [], [], threading.Event()
+        chosen = self.pick()
+        for endpoint in chosen:
+            self.executor.submit(self._ask, endpoint, answers, finished, done)
+        return answers, finished, done, len(chosen), time.perf_counter()
+
+    def collect(self, handle, deadline):
+        """(highest height, endpoint) once all have replied, HEDGE_GRACE after the first answer, or at the deadline"""
+        answers, finished, done, asked, started = handle
+        hard_stop = started + deadline
+        first = None
+        while True:
+            with self.lock:
+                count = len(finished)
+                best = max(answers, key=lambda a: a[0]) if answers else None
+            now = time.perf_counter()
+            if best is not None and first is None: first = now
+            if count >= asked:
+                return best
+            stop = hard_stop if first is None else min(hard_stop, first + self.grace)
+            if now >= stop: return best
+            done.clear()
+            # Re-check after clearing so an answer that landed in between is not missed
+            with self.lock:
+                if len(finished) != count: continue
+            done.wait(stop - now)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def local_state(timeout=LOCAL_TIMEOUT):
+    """One batch: eth_blockNumber, latest header (tx hashes only), net_peerCount"""
+    number, block, peers = rpc_client.get_client(URL, timeout=LOCAL_TIMEOUT).batch([
+        ("eth_blockNumber", []),
+        ("eth_getBlockByNumber", ["latest", False]),
+        ("net_peerCount", []),
+    ], timeout=timeout)
+    if number is None: return None
+    state = {"height": int(number, 16), "peers": int(peers, 16) if peers else None}
+    if block:
+        state["timestamp"] = int(block["timestamp"], 16)
+        state["txs"] = len(block.get("transactions") or [])
+    return state
+
+
+def lag_status(lag):
+    if lag == 0: return f"{GREEN}✅ 完全同步{NC}"
+    if lag <= 3: return f"{GREEN}🟢 良好 ({lag} blocks){NC}"
+    if lag <= 10: return f"{YELLOW}🟡 轻微延迟 ({lag} blocks){NC}"
+    if lag <= 50: return f"{ORANGE}🟠 中等延迟 ({lag} blocks){NC}"
+    return f"{RED}🔴 严重延迟 ({lag} blocks){NC}"
+
+
+def peer_status(peers):
+    if peers >= 100: return GREEN, "优秀"
+    if peers >= 50: return YELLOW, "良好"
+    if peers >= 10: return ORANGE, "一般"
+    return RED, "较差"
+
+
+def progress_bar(local, public, length=30):
+    pct = local * 100 // public
+    filled = pct * length // 100
+    color = GREEN if pct >= 99 else YELLOW if pct >= 90 else RED
+    return f"同步进度: [{color}{'█' * filled}{NC}{'░' * (length - filled)}] {pct}%"
+
+
+def render(local, best, public, elapsed, show_stats):
+    out = [
+        f"{BLUE}================ BSC 节点同步监控 ================{NC}",
+        f"监控时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"{BLUE}--------------------------------------------------{NC}",
+    ]
+    if local is None:
+        out.append(f"本地节点: {RED}无法连接{NC}")
+        return "\n".join(out)
+    if best is None:
+        out.append(f"本地节点高度: {GREEN}{local['height']}{NC}")
+        out.append(f"公共节点: {RED}无法获取{NC}")
+    else:
+        height, endpoint = best
+        lag = height - local["height"]
+        if "timestamp" in local:
+            time_lag = f"{int(time.time()) - local['timestamp']}秒"
+            block_time = datetime.datetime.fromtimestamp(local["timestamp"]).strftime("%H:%M:%S")
+        else:
+            time_lag, block_time = f"{lag * BLOCK_TIME:.0f}秒(估算)", "N/A"
+        out += [
+            f"本地节点高度: {GREEN}{local['height']}{NC}",
+            f"公共节点高度: {BLUE}{height}{NC} (来源: {endpoint.name()})",
+            f"最新区块时间: {YELLOW}{block_time}{NC}",
+            f"区块交易数量: {local.get('txs', 'N/A')}",
+            "",
+            f"区块延迟: {YELLOW}{lag} 个区块{NC}",
+            f"时间延迟: {YELLOW}{time_lag}{NC}",
+            "",
+            f"同步状态: {lag_status(max(lag, 0))}",
+        ]
+        if height > 0:
+            out += ["", progress_bar(local["height"], height)]
+    out.append(f"{BLUE}--------------------------------------------------{NC}")
+    if local.get("peers") is not None:
+        color, label = peer_status(local["peers"])
+        out.append(f"Peer连接数: {color}{local['peers']}{NC} ({label})")
+    else:
+        out.append(f"Peer连接数: {RED}无法获取{NC}")
+    if show_stats:
+        out.append(f"{BLUE}--------------------------------------------------{NC}")
+        now = time.time()
+        for e in sorted(public.endpoints, key=Endpoint.score):
+            latency = f"{e.latency * 1000:.0f}ms" if e.latency is not None else "-"
+            bench = f" 暂停 {e.benched_until - now:.0f}s" if e.benched_until > now else ""
+            out.append(f"  {e.name():<32} {latency:>7}  错误率 {e.error_rate * 100:3.0f}%  "
+                       f"{e.errors}/{e.requests}{bench}")
+    out.append(f"{BLUE}--------------------------------------------------{NC}")
+    out.append(f"刷新耗时: {elapsed * 1000:.0f}ms | 按 Ctrl+C 退出")
+    out.append(f"{BLUE}=================================================={NC}")
+    return "\n".join(out)
+
+
+def refresh(public, deadline):
+    """Local batch and hedged public lookup in parallel; returns (local, best, seconds)"""
+    start = time.perf_counter()
+    handle = public.start()
+    try:
+        # The local read shares the refresh deadline: a slow node must not stretch the refresh past it
+        local = local_state(max(MIN_LOCAL_TIMEOUT, min(LOCAL_TIMEOUT, deadline - (time.perf_counter() - start))))
+    except Exception:
+        local = None
+    best = public.collect(handle, deadline)
+    return local, best, time.perf_counter() - start
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+
+    def option(name, default=None):
+        if name not in args: return default
+        return args[args.index(name) + 1]
+
+    interval = float(option("--interval", DEFAULT_INTERVAL))
+    deadline = float(option("--deadline", DEFAULT_DEADLINE))
+    urls = option("--public")
+    urls = urls.split(",") if urls else PUBLIC_RPCS
+    stubs = option("--stub")
+    if stubs:
+        import rpc_bench
+        urls = ["http://127.0.0.1:1" if s == "dead" else rpc_bench.start_stub(float(s)) for s in stubs.split(",")]
+    public = PublicHead(urls)
+    jsonl = "--jsonl" in args
+    once = "--once" in args
+    show_stats = "--stats" in args
+
+    try:
+        while True:
+            local, best, elapsed = refresh(public, deadline)
+            if jsonl:
+                record = {"time": round(time.time(), 3), "local": local, "refresh_ms": round(elapsed * 1000, 1)}
+                if best is not None:
+                    record.update(public_height=best[0], source=best[1].url)
+                    if local: record["lag"] = best[0] - local["height"]
+                print(json.dumps(record), flush=True)
+            else:
+                print("\033[H\033[J" if not once else "", end="")
+                print(render(local, best, public, elapsed, show_stats))
+            if once: break
+            time.sleep(max(0.0, interval - elapsed))
+    except KeyboardInterrupt:
+        print("\n👋 监控已停止。")
+    finally:
+        public.close()
+
+
+if __name__ == "__main__":
+    main()
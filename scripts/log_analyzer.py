@@ -0,0 +1,436 @@
+"""
+Incremental analyzer for geth's logs/bsc.log ("why is sync slow?").
+
+Reads only what was appended since the last run: the byte offset and inode of
+the log are kept in cache/log_analyzer.json, together with the recent records
+behind the rolling statistics. When geth rotates the file ([Node.LogConfig]
+MaxBytesSize) the rest of the old file is found by its inode next to the log
+and finished first; a truncated file is read from the start. Complete lines
+are read in large blocks and only lines containing one of the markers are
+parsed, so a backlog of gigabytes is caught up in seconds.
+
+Reported over the last --window of log time:
+    blocks/s, txs/s, mgas/s from "Imported new chain segment"
+    import time per segment (p50/p90/p99/max) and the gaps between segments
+    the latest snap-sync progress line (chain / state download, healing)
+
+Usage:
+    python3 log_analyzer.py [--log PATH] [--window 10m] [--follow [SECONDS]] [--jsonl] [--reset]
+    python3 log_analyzer.py --selftest
+"""
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+
+from token_meta import CACHE_DIR
+
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "bsc.log")
+STATE_PATH = os.path.join(CACHE_DIR, "log_analyzer.json")
+READ_BLOCK = 16 * 1024 * 1024
+DEFAULT_WINDOW = 600
+FOLLOW_INTERVAL = 2.0
+SAVE_EVERY = 30.0  # --follow: rewrite the state file at most this often
+STATE_RECORDS = 20_000  # segment records kept across runs for the rolling window
+
+SEGMENT = b"Imported new chain segment"
+SYNCING = b"Syncing: "
+# Terminal format: "INFO [05-01|10:00:00.123] msg  k=v ..."; logfmt / JSON: t=2024-05-01T10:00:00.123+0000
+TERMINAL_TIME = re.compile(rb"\[(\d\d)-(\d\d)\|(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?\]")
+ISO_TIME = re.compile(rb"\bt=\"?(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?")
+KV = re.compile(rb"(\w+)=(\"(?:[^\"\\]|\\.)*\"|\S+)")
+DURATION_PART = re.compile(r"([\d.]+)(ns|us|µs|ms|s|m|h)")
+DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1.0, "m": 60.0, "h": 3600.0}
+SNAP_PHASES = (
+    (b"state download", "状态下载"),
+    (b"state healing", "状态修复"),
+    (b"chain download", "区块下载"),
+)
+
+
+def parse_go_duration(text):
+    """'120.456ms' / '1m2.5s' / '500µs' -> seconds"""
+    total = 0.0
+    for number, unit in DURATION_PART.findall(text):
+        total += float(number) * DURATION_UNITS[unit]
+    return total
+
+
+def parse_number(text):
+    """'38,500,000' / '15.123' -> number, None if not numeric"""
+    text = text.replace(",", "")
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+class LineTime:
+    """Log timestamps -> unix seconds; the terminal format has no year, assume the latest past one"""
+
+    def __init__(self):
+        self.year = datetime.date.today().year
+        self.cache_key = None
+        self.cache_base = 0.0
+
+    def parse(self, line):
+        m = TERMINAL_TIME.search(line, 0, 64)
+        if m:
+            month, day, hour, minute, second, frac = m.groups()
+            year = self.year
+        else:
+            m = ISO_TIME.search(line)
+            if not m: return None
+            year, month, day, hour, minute, second, frac = m.groups()
+            year = int(year)
+        # Same minute as the previous line: reuse the epoch of the minute
+        key = (year, month, day, hour, minute)
+        if key != self.cache_key:
+            try:
+                dt = datetime.datetime(year, int(month), int(day), int(hour), int(minute))
+            except ValueError:
+                return None
+            if dt > datetime.datetime.now() + datetime.timedelta(days=1) and m.re is TERMINAL_TIME:
+                dt = dt.replace(year=year - 1)
+            self.cache_key = key
+            self.cache_base = dt.timestamp()
+        t = self.cache_base + int(second)
+        if frac: t += int(frac) / 10**len(frac)
+        return t
+
+
+def percentiles(values):
+    if not values: return None
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p / 100))]
+    return {"p50": pick(50), "p90": pick(90), "p99": pick(99), "max": values[-1]}
+
+
+class LogAnalyzer:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        # (log time, blocks, txs, mgas, import seconds, gap to previous segment)
+        self.segments = deque(maxlen=STATE_RECORDS)
+        self.last_number = None
+        self.last_time = None
+        self.snap = None
+        self.lines = 0
+        self.bytes = 0
+        self.times = LineTime()
+
+    def feed(self, data):
+        """Parses a block of complete lines"""
+        self.bytes += len(data)
+        self.lines += data.count(b"\n")
+        find = data.find
+        pos = find(SEGMENT)
+        while pos != -1:
+            start = data.rfind(b"\n", 0, pos) + 1
+            end = find(b"\n", pos)
+            if end == -1: end = len(data)
+            self._segment(data[start:end], pos - start + len(SEGMENT))
+            pos = find(SEGMENT, end)
+        pos = data.rfind(SYNCING)
+        if pos != -1:
+            # Progress lines repeat every few seconds: only the newest in the block matters
+            start = data.rfind(b"\n", 0, pos) + 1
+            end = find(b"\n", pos)
+            self._syncing(data[start:end if end != -1 else len(data)], pos - start)
+
+    def _fields(self, line, offset):
+        return {k.decode(): v.strip(b'"').decode("utf-8", "replace") for k, v in KV.findall(line, offset)}
+
+    def _segment(self, line, offset):
+        t = self.times.parse(line)
+        if t is None: return
+        f = self._fields(line, offset)
+        number = parse_number(f.get("number", ""))
+        blocks = parse_number(f.get("blocks", "1")) or 1
+        txs = parse_number(f.get("txs", "0")) or 0
+        mgas = parse_number(f.get("mgas", "0")) or 0
+        elapsed = parse_go_duration(f.get("elapsed", ""))
+        gap = t - self.last_time if self.last_time is not None and t >= self.last_time else None
+        self.segments.append((t, blocks, txs, mgas, elapsed, gap))
+        self.last_time = t
+        if number is not None: self.last_number = number
+
+    def _syncing(self, line, offset):
+        t = self.times.parse(line)
+        phase = next((name for marker, name in SNAP_PHASES if marker in line), "同步中")
+        self.snap = dict(self._fields(line, offset), phase=phase, time=t)
+
+    def report(self):
+        """Rolling statistics over the last `window` seconds of log time"""
+        out = {"lines": self.lines, "bytes": self.bytes, "last_block": self.last_number,
+               "last_segment_time": self.last_time, "snap": self.snap}
+        if not self.segments: return out
+        cutoff = self.segments[-1][0] - self.window
+        recent = [s for s in self.segments if s[0] >= cutoff]
+        span = recent[-1][0] - recent[0][0]
+        # Rates over the gaps between the first and last segment, so the first one is not counted
+        counted = recent[1:] if len(recent) > 1 else recent
+        if span > 0:
+            out["blocks_per_s"] = sum(s[1] for s in counted) / span
+            out["txs_per_s"] = sum(s[2] for s in counted) / span
+            out["mgas_per_s"] = sum(s[3] for s in counted) / span
+        out.update(
+            segments=len(recent),
+            window_s=span,
+            import_s=percentiles([s[4] for s in recent]),
+            gap_s=percentiles([s[5] for s in recent if s[5] is not None]),
+        )
+        return out
+
+    def state(self):
+        return {"segments": list(self.segments), "last_number": self.last_number,
+                "last_time": self.last_time, "snap": self.snap}
+
+    def restore(self, saved):
+        self.segments.extend(tuple(s) for s in saved.get("segments", []))
+        self.last_number = saved.get("last_number")
+        self.last_time = saved.get("last_time")
+        self.snap = saved.get("snap")
+
+
+def rotated_file(path, inode):
+    """The file next to `path` (e.g. bsc.log.1, bsc.log-2024...) that still has the given inode"""
+    directory = os.path.dirname(os.path.abspath(path))
+    base = os.path.splitext(os.path.basename(path))[0]
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    for name in names:
+        if not name.startswith(base): continue
+        candidate = os.path.join(directory, name)
+        try:
+            if os.stat(candidate).st_ino == inode: return candidate
+        except OSError:
+            continue
+    return None
+
+
+class LogFollower:
+    """Reads complete new lines from a log file across rotations, from a persisted offset"""
+
+    def __init__(self, path, inode=None, offset=0):
+        self.path = path
+        self.inode = inode
+        self.offset = offset
+
+    def _read(self, path, offset, sink):
+        """Feeds complete lines from offset to sink in READ_BLOCK pieces; returns the new offset"""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            tail = b""
+            while True:
+                block = f.read(READ_BLOCK)
+                if not block: break
+                block = tail + block
+                cut = block.rfind(b"\n") + 1
+                if cut:
+                    sink(block[:cut])
+                    offset += cut
+                tail = block[cut:]
+        # A partial last line stays unread until it is complete
+        return offset
+
+    def read_new(self, sink):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self.inode is not None and st.st_ino != self.inode:
+            old = rotated_file(self.path, self.inode)
+            if old is not None:
+                self._read(old, self.offset, sink)
+            self.offset = 0
+        elif st.st_size < self.offset:
+            # Truncated in place (copytruncate)
+            self.offset = 0
+        self.inode = st.st_ino
+        self.offset = self._read(self.path, self.offset, sink)
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, follower, analyzer):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"log": os.path.abspath(follower.path), "inode": follower.inode,
+                   "offset": follower.offset, "analyzer": analyzer.state()}, f)
+    os.replace(tmp, path)
+
+
+def fmt_pct(stats, unit=1000, suffix="ms"):
+    if not stats: return "-"
+    digits = 0 if suffix == "ms" else 1
+    return " / ".join(f"{k} {stats[k] * unit:.{digits}f}{suffix}" for k in ("p50", "p90", "p99", "max"))
+
+
+def print_report(rep, elapsed):
+    print(f"📄 {rep['bytes'] / 1024**2:,.1f} MB / {rep['lines']:,} new lines parsed in {elapsed:.2f}s")
+    if rep.get("segments"):
+        age = time.time() - rep["last_segment_time"]
+        print(f"⛓️  最新区块: {rep['last_block']:,} ({age:,.0f}s 前)" if rep["last_block"] else "⛓️  最新区块: -")
+        print(f"📈 最近 {rep['window_s']:,.0f}s: {rep['segments']:,} 段 | "
+              f"{rep.get('blocks_per_s', 0):.2f} blocks/s | {rep.get('txs_per_s', 0):,.0f} txs/s | "
+              f"{rep.get('mgas_per_s', 0):.1f} mgas/s")
+        print(f"⏱️  导入耗时: {fmt_pct(rep['import_s'])}")
+        print(f"⏳ 段间间隔: {fmt_pct(rep['gap_s'], 1, 's') if rep['gap_s'] else '-'}")
+    else:
+        print("⛓️  窗口内没有 \"Imported new chain segment\"")
+    snap = rep.get("snap")
+    if snap:
+        fields = " ".join(f"{k}={snap[k]}" for k in ("synced", "state", "accounts", "slots", "codes", "nodes", "pending", "eta") if k in snap)
+        print(f"🔄 Snap Sync ({snap['phase']}): {fields}")
+
+
+def open_analyzer(log_path, window, reset, state_path=STATE_PATH):
+    """(follower, analyzer) resumed from the saved state of the same log"""
+    saved = {} if reset else load_state(state_path)
+    if saved.get("log") != os.path.abspath(log_path): saved = {}
+    follower = LogFollower(log_path, saved.get("inode"), saved.get("offset", 0))
+    analyzer = LogAnalyzer(window)
+    analyzer.restore(saved.get("analyzer", {}))
+    return follower, analyzer
+
+
+def update(follower, analyzer, state_path=STATE_PATH, save_every=0.0):
+    """Reads everything new, saves the state if the position moved; returns (report, seconds spent)"""
+    start = time.perf_counter()
+    follower.read_new(analyzer.feed)
+    elapsed = time.perf_counter() - start
+    position = (follower.inode, follower.offset)
+    saved = getattr(follower, "saved", None)
+    if position != (saved and saved[0]) and (saved is None or time.monotonic() - saved[1] >= save_every):
+        save_state(state_path, follower, analyzer)
+        follower.saved = (position, time.monotonic())
+    rep = analyzer.report()
+    analyzer.lines = analyzer.bytes = 0
+    return rep, elapsed
+
+
+def run(log_path, window, follow, jsonl, reset):
+    follower, analyzer = open_analyzer(log_path, window, reset)
+    try:
+        while True:
+            rep, elapsed = update(follower, analyzer, save_every=SAVE_EVERY if follow is not None else 0.0)
+            if jsonl:
+                print(json.dumps(dict(rep, time=round(time.time(), 3))), flush=True)
+            else:
+                print_report(rep, elapsed)
+            if follow is None: return
+            time.sleep(follow)
+    except KeyboardInterrupt:
+        save_state(STATE_PATH, follower, analyzer)
+        print("\n👋 Stopped.", file=sys.stderr)
+
+
+def selftest(megabytes=200):
+    """Synthetic log: rotation, resume without re-reading, throughput"""
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    log = os.path.join(tmp, "bsc.log")
+    state = os.path.join(tmp, "state.json")
+    base = datetime.datetime.now() - datetime.timedelta(hours=24)
+    noise = b"DEBUG [%s] Served eth_call                                conn=127.0.0.1:51234 reqid=12 duration=1.2ms\n"
+
+    def write(path, start, count, block0):
+        with open(path, "ab") as f:
+            for i in range(count):
+                ts = (base + datetime.timedelta(seconds=(start + i) * 3)).strftime("%m-%d|%H:%M:%S.000").encode()
+                lines = [noise % ts] * 10
+                lines.append(b"INFO [%s] Imported new chain segment               number=%s hash=0xabc..def "
+                             b"blocks=1 txs=120 mgas=15.000 elapsed=150.000ms mgasps=100.000 age=1s\n"
+                             % (ts, f"{block0 + i:,}".encode()))
+                f.write(b"".join(lines))
+        return start + count
+
+    failures = 0
+    count = 20_000
+    n = write(log, 0, count, 1_000_000)
+    rep = update(*open_analyzer(log, 3600, True, state), state)[0]
+    if rep["segments"] != 1201 or abs(rep["blocks_per_s"] - 1 / 3) > 1e-9 or abs(rep["mgas_per_s"] - 5) > 1e-6:
+        failures += 1
+    if abs(rep["import_s"]["p50"] - 0.15) > 1e-9 or rep["gap_s"]["max"] != 3: failures += 1
+
+    # Rotate: the tail of the old file must still be read, then the new one from 0
+    n = write(log, n, 50, 1_000_000 + n)
+    os.rename(log, log + ".1")
+    n = write(log, n, 50, 1_000_000 + n)
+    rep = update(*open_analyzer(log, 3600, False, state), state)[0]
+    if rep["last_block"] != 1_000_000 + n - 1 or rep["lines"] != 100 * 11: failures += 1
+    rep = update(*open_analyzer(log, 3600, False, state), state)[0]
+    if rep["lines"] != 0: failures += 1
+
+    # Throughput on a large backlog
+    big = os.path.join(tmp, "big.log")
+    lines_per_mb = 1024 * 1024 // (len(noise) + 15)
+    write(big, 0, megabytes * lines_per_mb // 11, 2_000_000)
+    size = os.path.getsize(big)
+    start = time.perf_counter()
+    analyzer = LogAnalyzer(3600)
+    LogFollower(big).read_new(analyzer.feed)
+    elapsed = time.perf_counter() - start
+    print(f"   {size / 1024**2:.0f} MB backlog parsed in {elapsed:.2f}s ({size / 1024**2 / elapsed:.0f} MB/s)")
+
+    for name in os.listdir(tmp): os.remove(os.path.join(tmp, name))
+    os.rmdir(tmp)
+    if failures:
+        print(f"❌ {failures} checks failed")
+        return False
+    print("✅ Log analyzer OK")
+    return True
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+    if "--selftest" in args:
+        sys.exit(0 if selftest() else 1)
+
+    def option(name, default=None):
+        if name not in args: return default
+        idx = args.index(name)
+        return args[idx + 1] if idx + 1 < len(args) and not args[idx + 1].startswith("--") else ""
+
+    from sync_history import parse_duration
+
+    window = option("--window")
+    if window:
+        seconds = parse_duration(window)
+        if seconds is None:
+            # Bare number: seconds
+            try:
+                seconds = float(window)
+            except ValueError:
+                seconds = None
+        if seconds is None or seconds <= 0:
+            print(f"❌ Invalid --window {window!r} (e.g. 600, 90s, 30m, 6h)", file=sys.stderr)
+            sys.exit(1)
+        window = seconds
+    follow = option("--follow")
+    if follow is not None: follow = float(follow or FOLLOW_INTERVAL)
+    run(option("--log", DEFAULT_LOG), window or DEFAULT_WINDOW,
+        follow, "--jsonl" in args, "--reset" in args)
+
+
+if __name__ == "__main__":
+    main()
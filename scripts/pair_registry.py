@@ -0,0 +1,330 @@
+"""
+Local registry of every PancakeSwap V2 pair and V3 pool, built from factory logs.
+
+PairCreated / PoolCreated logs are scanned with eth_getLogs in adaptively sized
+block ranges (halved when the node rejects a range as too large, doubled while
+ranges come back fast; connection errors retry the same range with backoff),
+several ranges in flight at once. Pools are appended as fixed-width
+records to cache/pairs.bin; cache/pairs.idx holds (token, record number) entries
+sorted by token, so a lookup is a binary search over an mmap - no load step.
+Each run continues from the last indexed block.
+
+Usage:
+    python3 pair_registry.py update [--to-block N] [--workers N]
+    python3 pair_registry.py lookup <TOKEN_ADDRESS>
+"""
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import rpc_client
+from token_meta import CACHE_DIR
+
+V2_FACTORY = "0xca143ce32fe78f1f7019d7d551a6402fc5350c73"
+V3_FACTORY = "0x0bfbcf9fa4f9c56b0f40a671ad40e0805a091865"
+# PairCreated(address indexed token0, address indexed token1, address pair, uint256)
+TOPIC_PAIR_CREATED = "0x0d3648bd0f6ba80134a33ba9275ac585d9d315f0ad8355cddefde31afa28d0e9"
+# PoolCreated(address indexed token0, address indexed token1, uint24 indexed fee, int24 tickSpacing, address pool)
+TOPIC_POOL_CREATED = "0x783cca1c0412dd0d695e784568c96da2e9c22ff989357a2e8b1d9b2b4e6b7118"
+
+# (factory, event topic, kind, first block to scan) - start blocks are a little before deployment
+FACTORIES = (
+    (V2_FACTORY, TOPIC_PAIR_CREATED, 2, 6_800_000),
+    (V3_FACTORY, TOPIC_POOL_CREATED, 3, 26_900_000),
+)
+V2_FEE = 2500  # 0.25%, in the same hundredths-of-a-bip unit as V3 fees
+
+# token0, token1, pool, created block, fee, tick spacing (0 for V2), kind (2/3)
+RECORD = struct.Struct("<20s20s20sIIhBx")
+# token, record number
+INDEX_ENTRY = struct.Struct("<20sI")
+# magic, number of records covered by the index
+INDEX_HEADER = struct.Struct("<4sI")
+INDEX_MAGIC = b"PIDX"
+# Sort pending records into the index once this many have piled up
+MERGE_EVERY = 200_000
+
+INITIAL_CHUNK = 5_000
+MIN_CHUNK = 1
+MAX_CHUNK = 200_000
+FAST_SECONDS = 1.0
+SLOW_SECONDS = 8.0
+LOGS_TIMEOUT = 30
+SCAN_WORKERS = 8
+MAX_ATTEMPTS = 3            # same range rejected as too large even at a single block
+MAX_RETRIES = 8             # connection errors / timeouts on one range (node restart)
+RETRY_MAX_DELAY = 30
+# Substrings of the RPC errors nodes return for a range with too many logs
+RANGE_ERRORS = ("more than", "too many", "limit exceeded", "exceed", "too large", "block range", "response size")
+
+
+def _addr(hex_str):
+    return bytes.fromhex(hex_str.lower().replace("0x", "")[-40:])
+
+
+def decode_created(log, kind):
+    """Turns a PairCreated/PoolCreated log into a record tuple"""
+    topics = log["topics"]
+    data = log["data"].replace("0x", "")
+    token0 = _addr(topics[1])
+    token1 = _addr(topics[2])
+    block = int(log["blockNumber"], 16)
+    if kind == 2:
+        return token0, token1, _addr(data[0:64]), block, V2_FEE, 0, 2
+    tick_spacing = int(data[0:64], 16)
+    if tick_spacing >= 2**255: tick_spacing -= 2**256
+    return token0, token1, _addr(data[64:128]), block, int(topics[3], 16), tick_spacing, 3
+
+
+def range_too_large(error):
+    """True for the RPC errors that mean "ask for a smaller range", not for transport failures"""
+    return isinstance(error, rpc_client.RpcError) and any(m in (error.message or "").lower() for m in RANGE_ERRORS)
+
+
+def scan_logs(client, flt, start, end, on_range, workers=SCAN_WORKERS):
+    """eth_getLogs over [start, end] in adaptive parallel chunks
+
+    on_range(lo, hi, logs) is called strictly in block order, so the caller can
+    checkpoint after every call.
+    """
+    chunk = INITIAL_CHUNK
+    next_start = start
+    retry = []        # split ranges waiting for a worker, smallest start last
+    attempts = {}
+    done = {}         # lo -> (hi, logs) finished ahead of the frontier
+    frontier = start
+
+    def fetch(lo, hi):
+        began = time.perf_counter()
+        params = dict(flt, fromBlock=hex(lo), toBlock=hex(hi))
+        logs = client.call("eth_getLogs", [params], timeout=LOGS_TIMEOUT)
+        return logs, time.perf_counter() - began
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while True:
+            while len(running) < workers and (retry or next_start <= end):
+                if retry:
+                    lo, hi = retry.pop()
+                else:
+                    lo, hi = next_start, min(next_start + chunk - 1, end)
+                    next_start = hi + 1
+                running[pool.submit(fetch, lo, hi)] = (lo, hi)
+            if not running: break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                lo, hi = running.pop(fut)
+                try:
+                    logs, elapsed = fut.result()
+                except (rpc_client.RpcError, OSError) as e:
+                    too_large = range_too_large(e)
+                    if too_large and hi > lo:
+                        # Too many results: split the range and use smaller chunks from now on
+                        mid = (lo + hi) // 2
+                        retry += [(mid + 1, hi), (lo, mid)]
+                        chunk = max(MIN_CHUNK, min(chunk, (hi - lo + 1) // 2))
+                        continue
+                    # Node down / timeout / other error: same range again after a backoff, chunk unchanged
+                    attempts[lo] = attempts.get(lo, 0) + 1
+                    if attempts[lo] >= (MAX_ATTEMPTS if too_large else MAX_RETRIES):
+                        raise
+                    delay = min(RETRY_MAX_DELAY, 2 ** (attempts[lo] - 1))
+                    print(f"⚠️  eth_getLogs failed for blocks {lo}-{hi} ({e}), retrying in {delay}s", file=sys.stderr)
+                    time.sleep(delay)
+                    retry.append((lo, hi))
+                    retry.sort(reverse=True)
+                    continue
+                attempts.pop(lo, None)
+                if elapsed < FAST_SECONDS and hi - lo + 1 >= chunk:
+                    chunk = min(MAX_CHUNK, chunk * 2)
+                elif elapsed > SLOW_SECONDS:
+                    chunk = max(MIN_CHUNK, chunk // 2)
+                done[lo] = (hi, logs)
+                retry.sort(reverse=True)
+
+            while frontier in done:
+                hi, logs = done.pop(frontier)
+                on_range(frontier, hi, logs)
+                frontier = hi + 1
+
+
+class PairRegistry:
+    """token -> pools, from an append-only record file and a sorted token index"""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.records_path = os.path.join(directory, "pairs.bin")
+        self.index_path = os.path.join(directory, "pairs.idx")
+        self.state_path = os.path.join(directory, "pairs.json")
+        self.state = {"records": 0, "next_block": {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        self.index_map = None
+        self.index_count = 0
+
+    # ---- building ----
+
+    def _save_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def update(self, client, to_block=None, workers=SCAN_WORKERS):
+        """Scans both factories from their last indexed block; returns the number of new pools"""
+        os.makedirs(os.path.dirname(self.records_path), exist_ok=True)
+        head = to_block if to_block is not None else int(client.call("eth_blockNumber"), 16)
+        added = 0
+        with open(self.records_path, "ab") as out:
+            # Drop records written after the last saved state (interrupted run)
+            out.truncate(self.state["records"] * RECORD.size)
+            out.seek(0, os.SEEK_END)
+            for factory, topic, kind, first_block in FACTORIES:
+                start = self.state["next_block"].get(factory, first_block)
+                if start > head: continue
+                print(f"🔍 Scanning V{kind} factory logs {start}..{head}...", file=sys.stderr)
+
+                def on_range(lo, hi, logs, kind=kind, factory=factory):
+                    nonlocal added
+                    records = sorted((decode_created(log, kind) for log in logs), key=lambda r: r[3])
+                    out.write(b"".join(RECORD.pack(*r) for r in records))
+                    out.flush()
+                    self.state["records"] += len(records)
+                    self.state["next_block"][factory] = hi + 1
+                    self._save_state()
+                    added += len(records)
+                    if self.state["records"] - self._indexed_count() >= MERGE_EVERY:
+                        self.merge_index()
+
+                scan_logs(client, {"address": factory, "topics": [topic]}, start, head, on_range, workers)
+        self.merge_index()
+        return added
+
+    def _indexed_count(self):
+        if not os.path.exists(self.index_path): return 0
+        with open(self.index_path, "rb") as f:
+            magic, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        return count if magic == INDEX_MAGIC else 0
+
+    def merge_index(self):
+        """Sorts records not yet in the index and merges them into it"""
+        indexed = self._indexed_count()
+        total = self.state["records"]
+        if total == indexed: return
+        with open(self.records_path, "rb") as f:
+            f.seek(indexed * RECORD.size)
+            raw = f.read((total - indexed) * RECORD.size)
+        new = []
+        for i, rec in enumerate(RECORD.iter_unpack(raw), indexed):
+            new.append(INDEX_ENTRY.pack(rec[0], i))
+            new.append(INDEX_ENTRY.pack(rec[1], i))
+        new.sort()
+
+        self.close()
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(INDEX_HEADER.pack(INDEX_MAGIC, total))
+            old_map = None
+            old = iter(())
+            if indexed:
+                old_file = open(self.index_path, "rb")
+                old_map = mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ)
+                old_file.close()
+                old = (old_map[pos : pos + INDEX_ENTRY.size]
+                       for pos in range(INDEX_HEADER.size, len(old_map), INDEX_ENTRY.size))
+            out.writelines(heapq.merge(old, new))
+            if old_map is not None: old_map.close()
+        os.replace(tmp, self.index_path)
+
+    # ---- lookups ----
+
+    def _open_index(self):
+        if self.index_map is None and os.path.exists(self.index_path) and os.path.getsize(self.index_path) > INDEX_HEADER.size:
+            with open(self.index_path, "rb") as f:
+                self.index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            with open(self.records_path, "rb") as f:
+                self.records_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index_count = INDEX_HEADER.unpack_from(self.index_map)[1]
+        return self.index_map
+
+    def pools_for(self, token):
+        """Returns [(pool, token0, token1, kind, fee, tick_spacing, created_block), ...] for a token"""
+        key = _addr(token)
+        found = []
+        index = self._open_index()
+        if index is not None:
+            size = INDEX_ENTRY.size
+            lo, hi = 0, (len(index) - INDEX_HEADER.size) // size
+            # Leftmost entry >= key
+            while lo < hi:
+                mid = (lo + hi) // 2
+                pos = INDEX_HEADER.size + mid * size
+                if index[pos : pos + 20] < key: lo = mid + 1
+                else: hi = mid
+            pos = INDEX_HEADER.size + lo * size
+            while pos < len(index) and index[pos : pos + 20] == key:
+                number = INDEX_ENTRY.unpack_from(index, pos)[1]
+                found.append(RECORD.unpack_from(self.records_map, number * RECORD.size))
+                pos += size
+        # Records appended after the last merge (interrupted update) are scanned directly
+        if self.state["records"] > self.index_count:
+            with open(self.records_path, "rb") as f:
+                f.seek(self.index_count * RECORD.size)
+                tail = f.read((self.state["records"] - self.index_count) * RECORD.size)
+            found += [rec for rec in RECORD.iter_unpack(tail) if key in (rec[0], rec[1])]
+        return [
+            ("0x" + pool.hex(), "0x" + t0.hex(), "0x" + t1.hex(), f"v{kind}", fee, spacing, block)
+            for t0, t1, pool, block, fee, spacing, kind in found
+        ]
+
+    def close(self):
+        if self.index_map is not None:
+            self.index_map.close()
+            self.records_map.close()
+            self.index_map = None
+            self.index_count = 0
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("update", "lookup"):
+        print(__doc__.strip())
+        sys.exit(1)
+
+    registry = PairRegistry()
+    if args[0] == "lookup":
+        if len(args) < 2:
+            print("Usage: python3 pair_registry.py lookup <TOKEN_ADDRESS>")
+            sys.exit(1)
+        start = time.perf_counter()
+        pools = registry.pools_for(args[1])
+        elapsed = time.perf_counter() - start
+        for pool, t0, t1, kind, fee, spacing, block in pools:
+            print(f"{pool} {kind} fee={fee} {t0} {t1} block={block}")
+        print(f"📦 {len(pools)} pools in {elapsed * 1e6:.0f}µs", file=sys.stderr)
+        return
+
+    to_block = None
+    workers = SCAN_WORKERS
+    if "--to-block" in args:
+        to_block = int(args[args.index("--to-block") + 1], 0)
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+    client = rpc_client.get_client(pool_size=max(workers, rpc_client.DEFAULT_POOL_SIZE))
+    start = time.perf_counter()
+    try:
+        added = registry.update(client, to_block, workers)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted; progress is saved, rerun to continue.")
+        return
+    print(f"✅ Indexed {added} new pools ({registry.state['records']} total) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Push-based PancakeSwap V2/V3 price feed over the node's WebSocket endpoint.
+
+Subscribes once to the Sync (V2) and Swap (V3) logs of every watched pool and
+keeps an in-memory price table updated from the event data alone: Sync carries
+both reserves and Swap carries sqrtPriceX96, so no eth_call is made per event.
+Updates are applied in (block, logIndex) order per pool; after a reconnect the
+missed range is backfilled with eth_getLogs before live events resume.
+
+Usage:
+    python3 price_feed.py <WATCH_LIST_FILE|-> [--ws ws://localhost:8546] [--jsonl]
+
+The watch list uses the same '<POOL_ADDRESS> [v2|v3]' lines as --multicall.
+"""
+import json
+import socket
+import sys
+import time
+
+import get_token_price as gtp
+import pair_registry
+import price_kernel
+import rpc_client
+import ws_client
+
+# Sync(uint112,uint112)
+TOPIC_SYNC = "0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1"
+# Swap(address,address,int256,int256,uint160,uint128,int24) - Uniswap V3 layout
+TOPIC_SWAP_V3 = "0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67"
+# Swap(address,address,int256,int256,uint160,uint128,int24,uint128,uint128) - PancakeSwap V3 adds protocol fees
+TOPIC_SWAP_PANCAKE_V3 = "0x19b47279256b2a23a1665c810c8d55a1758940ee09377d4f8d26497a3577dc83"
+TOPICS = [TOPIC_SYNC, TOPIC_SWAP_V3, TOPIC_SWAP_PANCAKE_V3]
+
+IDLE_TIMEOUT = 30        # seconds without a frame before we ping
+RECONNECT_MAX_DELAY = 30
+
+# A snapshot read at block N already reflects every log of block N
+AFTER_BLOCK = 1 << 62
+
+
+class PriceFeed:
+    def __init__(self, pools, ws_url=ws_client.DEFAULT_WS_URL, jsonl=False):
+        self.kinds = dict(pools)
+        self.ws_url = ws_url
+        self.jsonl = jsonl
+        self.client = rpc_client.get_client(gtp.URL)
+        self.pools = {}
+        # Highest block whose logs have all been applied
+        self.synced_block = None
+
+    def load(self):
+        """Reads tokens, metadata and the starting state of every pool at one head block"""
+        head = self.client.call("eth_blockNumber")
+        addresses = list(self.kinds)
+        results = gtp.eth_call_batch(
+            [(addr, func) for addr in addresses for func in (gtp.FUNC_TOKEN0, gtp.FUNC_TOKEN1)], head
+        )
+        tokens = {}
+        for i, addr in enumerate(addresses):
+            res_t0, res_t1 = results[2 * i], results[2 * i + 1]
+            if not res_t0 or not res_t1:
+                print(f"⚠️  Skipping {addr}: token0/token1 unavailable", file=sys.stderr)
+                continue
+            tokens[addr] = (gtp.decode_address(res_t0).lower(), gtp.decode_address(res_t1).lower())
+        meta = gtp.get_token_meta([t for pair in tokens.values() for t in pair], head)
+
+        for addr, (t0, t1) in tokens.items():
+            self.pools[addr] = {
+                "kind": self.kinds[addr], "token0": t0, "token1": t1,
+                "dec0": meta[t0][0], "dec1": meta[t1][0],
+                "sym0": meta[t0][1], "sym1": meta[t1][1],
+                "price": None, "pos": (0, 0),
+            }
+        self.refresh(list(self.pools), int(head, 16))
+        print(f"✅ Loaded {len(self.pools)} pools at block {int(head, 16)}", file=sys.stderr)
+
+    def refresh(self, addresses, height):
+        """Re-reads pool state at a concrete block (startup, reorged logs)"""
+        block = hex(height)
+        states = gtp.read_pool_states([(addr, self.pools[addr]["kind"], block) for addr in addresses])
+        v2, v3 = [], []
+        for addr, res in zip(addresses, states):
+            raw = res.replace("0x", "") if res else ""
+            if len(raw) < 128: continue
+            self.pools[addr]["pos"] = (height, AFTER_BLOCK)
+            if self.pools[addr]["kind"] == "v3":
+                v3.append((addr, int(raw[0:64], 16)))
+            else:
+                v2.append((addr, int(raw[0:64], 16), int(raw[64:128], 16)))
+
+        # Price the whole snapshot in one kernel pass instead of pool by pool
+        prices, _ = price_kernel.v2_prices(
+            [r0 for _, r0, _ in v2], [r1 for _, _, r1 in v2],
+            [self.pools[a]["dec0"] for a, _, _ in v2], [self.pools[a]["dec1"] for a, _, _ in v2],
+        )
+        for (addr, _, _), price in zip(v2, prices):
+            self.update(addr, price, height, None)
+        prices, _ = price_kernel.v3_prices(
+            [s for _, s in v3], [self.pools[a]["dec0"] for a, _ in v3], [self.pools[a]["dec1"] for a, _ in v3]
+        )
+        for (addr, _), price in zip(v3, prices):
+            self.update(addr, price, height, None)
+        self.synced_block = max(self.synced_block or 0, height)
+
+    def apply_log(self, log):
+        addr = log["address"].lower()
+        pool = self.pools.get(addr)
+        if pool is None: return
+        height = int(log["blockNumber"], 16)
+        if log.get("removed"):
+            # The block was reorged out; the replacement logs may not touch this pool
+            print(f"⚠️  Reorg at block {height}, re-reading {addr}", file=sys.stderr)
+            pool["pos"] = (0, 0)
+            self.refresh([addr], int(self.client.call("eth_blockNumber"), 16))
+            return
+        pos = (height, int(log["logIndex"], 16))
+        if pos <= pool["pos"]: return   # already applied (backfill overlap)
+        pool["pos"] = pos
+
+        data = log["data"].replace("0x", "")
+        topic = log["topics"][0].lower()
+        if topic == TOPIC_SYNC and len(data) >= 128:
+            price = price_from_reserves(int(data[0:64], 16), int(data[64:128], 16), pool)
+        elif topic in (TOPIC_SWAP_V3, TOPIC_SWAP_PANCAKE_V3) and len(data) >= 320:
+            # amount0, amount1, sqrtPriceX96, liquidity, tick, ...
+            price = price_from_sqrt(int(data[128:192], 16), pool)
+        else:
+            return
+        self.update(addr, price, height, pos[1])
+
+    def update(self, addr, price, height, log_index):
+        pool = self.pools[addr]
+        if price is None or price == pool["price"]: return
+        pool["price"] = price
+        if self.jsonl:
+            print(json.dumps({
+                "pool": addr, "block": height, "log_index": log_index,
+                "token0": pool["token0"], "token1": pool["token1"],
+                "price": float(price), "inverse": 1 / float(price) if price else None,
+            }), flush=True)
+        else:
+            where = f"{height}" if log_index is None else f"{height}#{log_index}"
+            print(f"💰 [{where}] 1 {pool['sym0']} = {price:.8f} {pool['sym1']} ({addr})", flush=True)
+
+    def log_filter(self, extra=None):
+        flt = {"address": list(self.pools), "topics": [TOPICS]}
+        flt.update(extra or {})
+        return flt
+
+    def backfill(self):
+        """Replays logs from synced_block up to the current head with eth_getLogs"""
+        head = int(self.client.call("eth_blockNumber"), 16)
+        start = self.synced_block
+        if start is None or start >= head: return
+        print(f"🔄 Backfilling blocks {start}..{head}", file=sys.stderr)
+
+        def on_range(lo, hi, logs):
+            logs.sort(key=lambda l: (int(l["blockNumber"], 16), int(l["logIndex"], 16)))
+            for log in logs:
+                self.apply_log(log)
+            self.synced_block = hi
+
+        # Same adaptive scan as the pair registry: ranges with too many logs are split, connection
+        # errors are retried with backoff. Re-read from synced_block itself: a drop can happen
+        # mid-block, overlap is skipped by pos
+        pair_registry.scan_logs(self.client, self.log_filter(), start, head, on_range)
+
+    def subscribe(self, ws):
+        ws.send_json({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["logs", self.log_filter()]})
+        while True:
+            msg = ws.recv_json(timeout=10)
+            if msg.get("id") == 1:
+                if "error" in msg:
+                    raise rpc_client.RpcError(msg["error"])
+                return msg["result"]
+
+    def listen(self, ws, sub_id):
+        waiting_pong = False
+        while True:
+            try:
+                msg = ws.recv_json(timeout=IDLE_TIMEOUT)
+            except socket.timeout:
+                if waiting_pong and ws.last_pong is None:
+                    raise ws_client.WebSocketClosed("No pong from node")
+                ws.last_pong = None
+                ws.ping()
+                waiting_pong = True
+                continue
+            waiting_pong = False
+            params = msg.get("params") or {}
+            if msg.get("method") != "eth_subscription" or params.get("subscription") != sub_id: continue
+            log = params["result"]
+            self.apply_log(log)
+            if not log.get("removed"):
+                self.synced_block = max(self.synced_block or 0, int(log["blockNumber"], 16))
+
+    def run(self):
+        self.load()
+        if not self.pools:
+            print("❌ No pools to watch.")
+            return
+        delay = 1
+        while True:
+            ws = None
+            try:
+                ws = ws_client.WebSocket(self.ws_url)
+                # Subscribe first, then backfill: logs that land in between arrive twice and are skipped
+                sub_id = self.subscribe(ws)
+                print(f"📡 Subscribed to {len(self.pools)} pools on {self.ws_url}", file=sys.stderr)
+                self.backfill()
+                delay = 1
+                self.listen(ws, sub_id)
+            except (OSError, ValueError, ws_client.WebSocketClosed, rpc_client.RpcError) as e:
+                print(f"❌ Feed interrupted: {e}; reconnecting in {delay}s", file=sys.stderr)
+            finally:
+                if ws is not None: ws.close()
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+# Events are priced through the same kernel as refresh(), so one pool state always yields the same
+# value and type (float, or Decimal outside the float range) and update() never sees a spurious change
+
+def price_from_reserves(reserve0, reserve1, pool):
+    """token1 per token0 from V2 reserves; None if either is zero"""
+    return price_kernel.v2_prices([reserve0], [reserve1], [pool["dec0"]], [pool["dec1"]])[0][0]
+
+
+def price_from_sqrt(sqrt_price_x96, pool):
+    """token1 per token0 from a V3 sqrtPriceX96; None if it is zero"""
+    return price_kernel.v3_prices([sqrt_price_x96], [pool["dec0"]], [pool["dec1"]])[0][0]
+
+
+def main():
+    args = sys.argv[1:]
+    ws_url = gtp.pop_option(args, "--ws", ws_client.DEFAULT_WS_URL)
+    jsonl = "--jsonl" in args
+    if jsonl: args.remove("--jsonl")
+    if not args:
+        print(__doc__.strip())
+        return
+    pools = gtp.read_watch_list(args[0])
+    if not pools:
+        print("❌ Watch list is empty.")
+        return
+    try:
+        PriceFeed(pools, ws_url, jsonl).run()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Batch price kernel for many V2 / V3 pools at once.
+
+Takes parallel sequences of raw reserves (or sqrtPriceX96) and token decimals
+and returns prices and inverse prices for all rows in one pass. With NumPy
+installed the rows are computed as float64 vectors (inputs are converted with
+a single rounding each, so results stay within a few ulp); without it they go
+through the same float formulas as the scalar helpers in get_token_price.py,
+which is the fastest pure-Python path. With exact=True every price is one
+correctly rounded integer division of the exact rational value. Rows whose
+price does not fit a float64 (overflow or underflow) fall back to a Decimal
+with PRECISION significant digits.
+
+Self-check against the scalar helpers in get_token_price.py:
+    python3 price_kernel.py --selftest
+"""
+import sys
+from decimal import Decimal, localcontext
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Q192 = 2**192
+PRECISION = 40
+# float64 keeps ~15.9 significant digits; stay clear of the subnormal range
+FLOAT_MIN = 2.0**-1000
+FLOAT_MAX = 2.0**1000
+# 10**d for the decimals tokens actually use; larger ones take the exact path
+POW10 = tuple(10**i for i in range(78))
+POW10_NEG = tuple(10**-i for i in range(78))
+
+
+def ratio(numerator, denominator):
+    """numerator / denominator for non-negative ints: correctly rounded float, Decimal if out of float range"""
+    if numerator == 0 or denominator == 0: return None
+    try:
+        value = numerator / denominator
+    except OverflowError:
+        value = None
+    if value is not None and FLOAT_MIN <= value <= FLOAT_MAX:
+        return value
+    with localcontext() as ctx:
+        ctx.prec = PRECISION
+        return Decimal(numerator) / Decimal(denominator)
+
+
+def v2_price_exact(target_reserve, base_reserve, target_decimals, base_decimals):
+    """Base units per target unit, from raw reserves"""
+    return ratio(base_reserve * 10**target_decimals, target_reserve * 10**base_decimals)
+
+
+def v3_price_exact(sqrt_price_x96, decimals0, decimals1):
+    """token1 units per token0 unit, from sqrtPriceX96"""
+    return ratio(sqrt_price_x96 * sqrt_price_x96 * 10**decimals0, Q192 * 10**decimals1)
+
+
+def _invert(numerators, denominators):
+    return [ratio(d, n) for n, d in zip(numerators, denominators)]
+
+
+def _scalar(prices, exact_row):
+    """Pure-Python float path: prices computed by the caller (None if the formula failed); returns (prices, inverses)
+
+    Rows outside the float window are replaced by exact_row(i, invert).
+    """
+    try:
+        if FLOAT_MIN <= min(prices) and max(prices) <= FLOAT_MAX:
+            return prices, [1 / price for price in prices]
+    except TypeError:
+        pass  # a row where the float formula failed (None)
+    inverses = []
+    for i, price in enumerate(prices):
+        if price is not None and FLOAT_MIN <= price <= FLOAT_MAX:
+            inverses.append(1 / price)
+        else:
+            prices[i] = exact_row(i)
+            inverses.append(exact_row(i, True))
+    return prices, inverses
+
+
+def _v2_float(target_reserve, base_reserve, target_decimals, base_decimals):
+    try:
+        return (base_reserve / POW10[base_decimals]) / (target_reserve / POW10[target_decimals])
+    except (OverflowError, ZeroDivisionError, IndexError):
+        return None
+
+
+def _v3_float(sqrt_price_x96, decimals0, decimals1):
+    try:
+        scale = POW10[decimals0 - decimals1] if decimals0 >= decimals1 else POW10_NEG[decimals1 - decimals0]
+        return (sqrt_price_x96 / 2**96) ** 2 * scale
+    except (OverflowError, IndexError):
+        return None
+
+
+def _floats(values):
+    return np.fromiter((float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def _finish(prices, fallback):
+    """NumPy vector -> list; rows that are zero, non-finite or outside the float window use fallback(i)"""
+    ok = np.isfinite(prices) & (prices >= FLOAT_MIN) & (prices <= FLOAT_MAX)
+    out = prices.tolist()
+    for i in np.flatnonzero(~ok).tolist():
+        out[i] = fallback(i)
+    return out
+
+
+def v2_prices(target_reserves, base_reserves, target_decimals, base_decimals, exact=False):
+    """Returns (prices, inverse_prices) as lists aligned with the inputs; None where a reserve is zero"""
+    n = len(target_reserves)
+    if exact or n == 0:
+        numerators = [b * 10**dt for b, dt in zip(base_reserves, target_decimals)]
+        denominators = [t * 10**db for t, db in zip(target_reserves, base_decimals)]
+        return [ratio(a, b) for a, b in zip(numerators, denominators)], _invert(numerators, denominators)
+
+    def exact_row(i, invert=False):
+        price = v2_price_exact(target_reserves[i], base_reserves[i], target_decimals[i], base_decimals[i])
+        if price is None or not invert: return price
+        return v2_price_exact(base_reserves[i], target_reserves[i], base_decimals[i], target_decimals[i])
+
+    if np is None:
+        # Same formula as the scalar helpers; map() keeps the per-row cost at one call
+        return _scalar(list(map(_v2_float, target_reserves, base_reserves, target_decimals, base_decimals)), exact_row)
+
+    target = _floats(target_reserves)
+    base = _floats(base_reserves)
+    scale = np.power(10.0, np.asarray(target_decimals, dtype=np.int64) - np.asarray(base_decimals, dtype=np.int64))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore", under="ignore"):
+        prices = base / target * scale
+        inverses = target / base / scale
+    return _finish(prices, exact_row), _finish(inverses, lambda i: exact_row(i, True))
+
+
+def v3_prices(sqrt_prices_x96, decimals0, decimals1, exact=False):
+    """Returns (token1 per token0, token0 per token1) lists aligned with the inputs; None where the price is zero"""
+    n = len(sqrt_prices_x96)
+    if exact or n == 0:
+        numerators = [s * s * 10**d0 for s, d0 in zip(sqrt_prices_x96, decimals0)]
+        denominators = [Q192 * 10**d1 for d1 in decimals1]
+        return [ratio(a, b) for a, b in zip(numerators, denominators)], _invert(numerators, denominators)
+
+    def exact_row(i, invert=False):
+        s, d0, d1 = sqrt_prices_x96[i], decimals0[i], decimals1[i]
+        if not invert: return v3_price_exact(s, d0, d1)
+        if s == 0: return None
+        return ratio(Q192 * 10**d1, s * s * 10**d0)
+
+    if np is None:
+        return _scalar(list(map(_v3_float, sqrt_prices_x96, decimals0, decimals1)), exact_row)
+
+    # Dividing by 2**96 is exact in binary floating point
+    sqrt = _floats(sqrt_prices_x96) / 2.0**96
+    scale = np.power(10.0, np.asarray(decimals0, dtype=np.int64) - np.asarray(decimals1, dtype=np.int64))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore", under="ignore"):
+        prices = sqrt * sqrt * scale
+        inverses = 1.0 / sqrt / sqrt / scale
+    return _finish(prices, exact_row), _finish(inverses, lambda i: exact_row(i, True))
+
+
+def selftest(rows=20000):
+    """Compares the kernel with the scalar float formulas used in get_token_price.py"""
+    import random
+    import time
+    from fractions import Fraction
+
+    import get_token_price as gtp
+
+    rng = random.Random(53)
+    decimals = [0, 6, 8, 9, 18, 18, 18, 24]
+    t_res = [rng.randrange(1, 2**112) for _ in range(rows)]
+    b_res = [rng.randrange(1, 2**112) for _ in range(rows)]
+    t_dec = [rng.choice(decimals) for _ in range(rows)]
+    b_dec = [rng.choice(decimals) for _ in range(rows)]
+    sqrts = [rng.randrange(2**40, 2**160) for _ in range(rows)]
+
+    def close(a, b, tol):
+        return abs(float(a) - b) <= tol * abs(b)
+
+    def timed(fn, rounds=3):
+        """Best of a few runs, in seconds, and the last result"""
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    failures = 0
+    for exact in (False, True):
+        elapsed, (prices, inverses, v3, v3_inv) = timed(lambda: (
+            v2_prices(t_res, b_res, t_dec, b_dec, exact=exact) + v3_prices(sqrts, t_dec, b_dec, exact=exact)))
+        for i in range(rows):
+            scalar = gtp.v2_price(t_res[i], b_res[i], t_dec[i], b_dec[i])
+            scalar_v3 = gtp.v3_price(sqrts[i], t_dec[i], b_dec[i])
+            if not (close(prices[i], scalar, 1e-12) and close(inverses[i], 1 / scalar, 1e-12)
+                    and close(v3[i], scalar_v3, 1e-12) and close(v3_inv[i], 1 / scalar_v3, 1e-12)):
+                failures += 1
+            if exact:
+                # The exact path must be the correctly rounded value of the true rational
+                truth = Fraction(b_res[i] * 10**t_dec[i], t_res[i] * 10**b_dec[i])
+                if prices[i] != float(truth): failures += 1
+        mode = "exact ints" if exact else ("numpy float64" if np is not None else "scalar floats")
+        print(f"   {mode}: {2 * rows} pools priced in {elapsed * 1000:.1f}ms")
+
+    # Prices below the float window come back as Decimals instead of 0.0 / subnormals
+    tiny, tiny_inv = v3_prices([2**20], [0], [260])
+    if not (isinstance(tiny[0], Decimal) and isinstance(tiny_inv[0], Decimal)): failures += 1
+    if v2_prices([0], [5], [18], [18])[0][0] is not None: failures += 1
+
+    def scalar_rows():
+        # Prices and inverses, like the kernel returns
+        for i in range(rows):
+            1 / gtp.v2_price(t_res[i], b_res[i], t_dec[i], b_dec[i])
+            1 / gtp.v3_price(sqrts[i], t_dec[i], b_dec[i])
+
+    elapsed, _ = timed(scalar_rows)
+    print(f"   scalar helpers: {2 * rows} pools priced in {elapsed * 1000:.1f}ms")
+
+    if failures:
+        print(f"❌ {failures} mismatches")
+        return False
+    print(f"✅ Kernel matches the scalar helpers ({'numpy' if np is not None else 'no numpy, scalar float path'})")
+    return True
+
+
+if __name__ == "__main__":
+    if "--selftest" not in sys.argv:
+        print(__doc__.strip())
+        sys.exit(1)
+    sys.exit(0 if selftest() else 1)
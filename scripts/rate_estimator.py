@@ -0,0 +1,152 @@
+"""
+Rate estimator for monotonically growing counters (synced accounts, slots, ...).
+
+Samples go into a preallocated ring of (time, value) doubles; nothing is
+allocated per sample, so a monitor can feed it every 0.5 s for weeks. When
+samples arrive faster than the ring can cover the longest window, the newest
+slot is overwritten until `resolution` seconds have passed, which keeps the ring spanning
+the whole window at a fixed memory cost.
+
+    rate.ewma              time-weighted EWMA of the per-interval rates
+    rate.window_rate(900)  average rate over the last 15 minutes
+    rate.eta(remaining)    (expected, fastest, slowest) seconds to go
+
+The expected ETA uses the EWMA; the band spans the slowest and fastest of the
+EWMA and the windowed rates, so a sync that is slowing down shows a wide band
+until the rates agree again.
+
+Self-check:
+    python3 rate_estimator.py --selftest
+"""
+import math
+import sys
+from array import array
+
+WINDOWS = (60, 900, 3600)  # 1m / 15m / 1h
+WINDOW_LABELS = ("1m", "15m", "1h")
+CAPACITY = 4096
+HALF_LIFE = 60.0  # seconds for the EWMA weight to halve
+
+
+class RateEstimator:
+    def __init__(self, capacity=CAPACITY, half_life=HALF_LIFE, longest_window=max(WINDOWS)):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.tau = half_life / math.log(2)
+        # Minimum spacing between stored samples so the ring always covers longest_window
+        self.resolution = longest_window / (capacity - 2)
+        self.reset()
+
+    def reset(self):
+        self.start = 0
+        self.count = 0
+        self.ewma = None
+        self.last_time = 0.0
+        self.last_value = 0.0
+
+    def _at(self, i):
+        """Physical slot of the i-th oldest sample"""
+        return (self.start + i) % self.capacity
+
+    def add(self, t, value):
+        """Records counter `value` at time `t` (seconds, monotonic)"""
+        if self.count and (value < self.last_value or t <= self.last_time):
+            # Counter went backwards (node restart / new sync cycle): old rates are meaningless
+            if value < self.last_value: self.reset()
+            else: return
+        if self.count:
+            dt = t - self.last_time
+            rate = (value - self.last_value) / dt
+            if self.ewma is None:
+                self.ewma = rate
+            else:
+                self.ewma += (1 - math.exp(-dt / self.tau)) * (rate - self.ewma)
+        self.last_time = t
+        self.last_value = value
+
+        if self.count >= 2 and self.times[self._at(self.count - 1)] - self.times[self._at(self.count - 2)] < self.resolution:
+            # Newest sample is still too close to the one before it: move it forward instead of keeping both
+            slot = self._at(self.count - 1)
+        elif self.count < self.capacity:
+            slot = self._at(self.count)
+            self.count += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[slot] = t
+        self.values[slot] = value
+
+    def span(self):
+        """Seconds covered by the stored samples"""
+        if self.count < 2: return 0.0
+        return self.times[self._at(self.count - 1)] - self.times[self.start]
+
+    def window_rate(self, seconds):
+        """Average rate over the last `seconds`; None until the ring covers half of that window"""
+        if self.count < 2: return None
+        newest = self._at(self.count - 1)
+        t_new = self.times[newest]
+        if t_new - self.times[self.start] < seconds / 2: return None
+        # Binary search for the oldest sample inside the window
+        cutoff = t_new - seconds
+        lo, hi = 0, self.count - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._at(mid)] < cutoff: lo = mid + 1
+            else: hi = mid
+        oldest = self._at(lo)
+        dt = t_new - self.times[oldest]
+        if dt <= 0: return None
+        return (self.values[newest] - self.values[oldest]) / dt
+
+    def rates(self):
+        """(ewma, rate per window in WINDOWS order)"""
+        return self.ewma, [self.window_rate(w) for w in WINDOWS]
+
+    def eta(self, remaining):
+        """(expected, fastest, slowest) seconds until `remaining` more units; None where unknown"""
+        ewma, windowed = self.rates()
+        known = [r for r in [ewma] + windowed if r is not None and r > 0]
+        if remaining <= 0 or not known: return None, None, None
+        expected = remaining / ewma if ewma and ewma > 0 else None
+        return expected, remaining / max(known), remaining / min(known)
+
+
+def selftest():
+    """Feeds synthetic counters and checks the window rates, the EWMA and ring wrap-around"""
+    failures = 0
+    est = RateEstimator(capacity=256, half_life=30)
+    # 100/s for 2h, sampled every 0.5 s: far more samples than slots
+    for i in range(14_400):
+        est.add(i * 0.5, i * 50.0)
+    for w in WINDOWS:
+        rate = est.window_rate(w)
+        if rate is None or abs(rate - 100) > 1e-9: failures += 1
+    if abs(est.ewma - 100) > 1e-9 or est.span() < max(WINDOWS): failures += 1
+
+    # Rate drops from 100/s to 10/s: EWMA follows within a few half-lives, 1h lags behind
+    t, v = est.last_time, est.last_value
+    for i in range(1, 601):
+        est.add(t + i * 0.5, v + i * 5.0)
+    ewma, (m1, m15, h1) = est.rates()
+    if not (abs(ewma - 10) < 1 and abs(m1 - 10) < 1e-9 and h1 > m15 > m1): failures += 1
+    expected, fast, slow = est.eta(36_000)
+    if not (fast < expected <= slow): failures += 1
+
+    # Counter reset starts over
+    est.add(t + 400, 0)
+    if est.ewma is not None or est.window_rate(60) is not None: failures += 1
+
+    if failures:
+        print(f"❌ {failures} checks failed")
+        return False
+    print("✅ Rate estimator OK")
+    return True
+
+
+if __name__ == "__main__":
+    if "--selftest" not in sys.argv:
+        print(__doc__.strip())
+        sys.exit(1)
+    sys.exit(0 if selftest() else 1)
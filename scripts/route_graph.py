@@ -0,0 +1,93 @@
+"""
+In-memory liquidity graph for multi-hop pricing against a quote token (USDT).
+
+Every pool is an edge between its two tokens carrying spot reserves; V3 pools
+contribute the virtual reserves of their active range (L / sqrtP, L * sqrtP).
+rates_to() runs a hop-bounded best-rate search backwards from the quote token
+once and keeps the result, so pricing a token afterwards is a single pass over
+its own pools: best of (token -> neighbour rate) * (neighbour -> quote rate).
+No RPC in here; get_token_price.py loads the reserves in bulk.
+"""
+from collections import defaultdict
+
+Q96 = 2**96
+MAX_HOPS = 3
+
+
+def v3_virtual_reserves(sqrt_price_x96, liquidity):
+    """(reserve0, reserve1) a V2 pool would need for the same spot price and depth"""
+    if not sqrt_price_x96 or not liquidity: return 0, 0
+    return liquidity * Q96 // sqrt_price_x96, liquidity * sqrt_price_x96 // Q96
+
+
+class RouteGraph:
+    def __init__(self, decimals):
+        self.decimals = decimals
+        # token -> [(neighbour, neighbour units per token after fee, neighbour-side depth, pool)]
+        self.out_edges = defaultdict(list)
+        # token -> [(neighbour, token units per neighbour after fee, token-side depth, pool)]
+        self.in_edges = defaultdict(list)
+        self.pools = set()
+        self.rates = {}
+
+    def copy(self):
+        """Independent graph with the same pools and computed rates; pools added to it leave this one unchanged"""
+        other = RouteGraph(dict(self.decimals))
+        for token, edges in self.out_edges.items(): other.out_edges[token] = list(edges)
+        for token, edges in self.in_edges.items(): other.in_edges[token] = list(edges)
+        other.pools = set(self.pools)
+        other.rates = dict(self.rates)
+        return other
+
+    def add_pool(self, pool, token0, token1, reserve0, reserve1, fee):
+        """Adds a pool with raw reserves; fee in millionths (2500 = 0.25%)"""
+        if pool in self.pools or not reserve0 or not reserve1: return
+        self.pools.add(pool)
+        amount0 = reserve0 / 10**self.decimals.get(token0, 18)
+        amount1 = reserve1 / 10**self.decimals.get(token1, 18)
+        keep = 1 - fee / 1_000_000
+        self.out_edges[token0].append((token1, amount1 / amount0 * keep, amount1, pool))
+        self.out_edges[token1].append((token0, amount0 / amount1 * keep, amount0, pool))
+        self.in_edges[token1].append((token0, amount1 / amount0 * keep, amount1, pool))
+        self.in_edges[token0].append((token1, amount0 / amount1 * keep, amount0, pool))
+
+    def rates_to(self, quote, max_hops=MAX_HOPS, min_liquidity=0.0):
+        """Returns {token: (quote units per token, (token, ..., quote), (pool, ...))}, computed once per quote
+
+        A hop only counts if the side it sells into holds at least min_liquidity
+        quote units, which keeps dust pools with stale prices out of the routes.
+        """
+        key = (quote, max_hops, min_liquidity)
+        if key in self.rates: return self.rates[key]
+        best = {quote: (1.0, (quote,), ())}
+        frontier = [quote]
+        for _ in range(max_hops):
+            updated = []
+            # Extend the previous round's routes only, so round k never yields more than k hops
+            previous = dict(best)
+            for node in frontier:
+                node_rate, path, pools = previous[node]
+                for other, rate, depth, pool in self.in_edges[node]:
+                    if other in path or depth * node_rate < min_liquidity: continue
+                    candidate = rate * node_rate
+                    if candidate > best.get(other, (0.0,))[0]:
+                        best[other] = (candidate, (other,) + path, (pool,) + pools)
+                        updated.append(other)
+            frontier = list(dict.fromkeys(updated))
+            if not frontier: break
+        self.rates[key] = best
+        return best
+
+    def quote(self, token, rates, min_liquidity=0.0):
+        """Best (price, path, pools) for token through one of its own pools, or None"""
+        if token in rates: return rates[token]
+        best = None
+        for other, rate, depth, pool in self.out_edges[token]:
+            known = rates.get(other)
+            if known is None or token in known[1]: continue
+            other_rate, path, pools = known
+            if depth * other_rate < min_liquidity: continue
+            price = rate * other_rate
+            if best is None or price > best[0]:
+                best = (price, (token,) + path, (pool,) + pools)
+        return best
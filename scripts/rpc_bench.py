@@ -0,0 +1,320 @@
+"""
+RPC latency / throughput benchmark: local node vs remote endpoints.
+
+Replays a weighted mix of the requests the price scripts send (eth_call,
+eth_getStorageAt, eth_blockNumber and JSON-RPC batches of eth_call) against
+every endpoint at each concurrency level, through the same keep-alive
+rpc_client the scripts use. Each level reports p50 / p90 / p99 / max latency
+and requests per second per method; results are appended as one JSON line per
+(endpoint, concurrency) to --out (default cache/rpc_bench.jsonl) so runs can
+be compared over time, and the previous matching run is shown next to the
+new numbers.
+
+--stub MS starts an in-process stand-in node answering with MS of added
+latency (repeatable, e.g. --stub 0.2 --stub 40 for "local" vs "remote"), so
+the harness runs without a node or network. Stub results are recorded as
+"stub:MSms" rather than their random port, so they compare across runs.
+
+Usage:
+    python3 rpc_bench.py [ENDPOINT ...] [--stub MS ...]
+                         [--mix eth_call=4,eth_getStorageAt=2,eth_blockNumber=1,batch=1]
+                         [--concurrency 1,4,16,64] [--duration SECONDS | --requests N]
+                         [--batch-size N] [--out FILE]
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rpc_client
+from token_meta import CACHE_DIR
+
+# PancakeSwap V2 WBNB/USDT pair: getReserves() and its packed reserves slot (8)
+BENCH_PAIR = "0x16b9a82891338f9ba80e2d6970fdda79d1eb0dae"
+FUNC_GET_RESERVES = "0x0902f1ac"
+RESERVES_SLOT = "0x8"
+
+DEFAULT_MIX = "eth_call=4,eth_getStorageAt=2,eth_blockNumber=1,batch=1"
+DEFAULT_CONCURRENCY = "1,4,16,64"
+DEFAULT_DURATION = 5.0
+DEFAULT_BATCH_SIZE = 10
+WARMUP_REQUESTS = 3  # per worker, not recorded: connection setup is not what we measure
+RESULTS_FILE = os.path.join(CACHE_DIR, "rpc_bench.jsonl")
+
+
+def build_request(kind, batch_size):
+    """kind -> (rpc method or None for a batch, params or [(method, params), ...])"""
+    call = ("eth_call", [{"to": BENCH_PAIR, "data": FUNC_GET_RESERVES}, "latest"])
+    if kind == "eth_call": return call
+    if kind == "eth_getStorageAt": return "eth_getStorageAt", [BENCH_PAIR, RESERVES_SLOT, "latest"]
+    if kind == "eth_blockNumber": return "eth_blockNumber", []
+    if kind == "batch": return None, [call] * batch_size
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def parse_mix(spec):
+    """'eth_call=4,batch=1' -> {'eth_call': 4, 'batch': 1}"""
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.strip().partition("=")
+        build_request(kind, 1)
+        mix[kind] = int(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Request mix has no positive weights")
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values: return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies):
+    """Seconds -> {count, p50, p90, p99, max, mean} in milliseconds"""
+    values = sorted(latencies)
+    if not values: return {"count": 0}
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(values),
+        "p50": ms(percentile(values, 50)),
+        "p90": ms(percentile(values, 90)),
+        "p99": ms(percentile(values, 99)),
+        "max": ms(values[-1]),
+        "mean": ms(sum(values) / len(values)),
+    }
+
+
+def run_level(client, mix, concurrency, duration=None, total=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Runs `concurrency` workers until duration elapses (or total requests are sent); returns a result dict"""
+    kinds = [kind for kind, weight in mix.items() for _ in range(weight)]
+    requests = {kind: build_request(kind, batch_size) for kind in mix}
+    latencies = {kind: [] for kind in mix}
+    errors = {kind: 0 for kind in mix}
+    lock = threading.Lock()
+    remaining = [total]
+    stop_at = [0.0]
+
+    def begin():
+        # Runs once all workers are warmed up, before any of them is released
+        stop_at[0] = time.perf_counter() + (duration or 0)
+
+    ready = threading.Barrier(concurrency + 1, action=begin)
+
+    def send(kind):
+        method, params = requests[kind]
+        if method is None:
+            results = client.batch(params)
+            if any(r is None for r in results):
+                raise rpc_client.RpcError("batch entry failed")
+        else:
+            client.call(method, params)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        own = {kind: [] for kind in mix}
+        own_errors = {kind: 0 for kind in mix}
+        for _ in range(WARMUP_REQUESTS):
+            try:
+                send(kinds[0])
+            except Exception:
+                pass
+        ready.wait()
+        while True:
+            if total is not None:
+                with lock:
+                    if remaining[0] <= 0: break
+                    remaining[0] -= 1
+            elif time.perf_counter() >= stop_at[0]:
+                break
+            kind = rng.choice(kinds)
+            start = time.perf_counter()
+            try:
+                send(kind)
+                own[kind].append(time.perf_counter() - start)
+            except Exception:
+                own_errors[kind] += 1
+        with lock:
+            for kind in mix:
+                latencies[kind].extend(own[kind])
+                errors[kind] += own_errors[kind]
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads: t.start()
+    ready.wait()
+    start = time.perf_counter()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    everything = [v for values in latencies.values() for v in values]
+    # A batch is one HTTP round trip but carries batch_size calls
+    calls = sum(len(v) * (batch_size if kind == "batch" else 1) for kind, v in latencies.items())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / elapsed, 1) if elapsed else None,
+        "calls_per_s": round(calls / elapsed, 1) if elapsed else None,
+        "latency_ms": summarize(everything),
+        "methods": {kind: dict(summarize(latencies[kind]), errors=errors[kind]) for kind in mix},
+    }
+
+
+def previous_results(path):
+    """(endpoint, concurrency, mix) -> last recorded result from the results file"""
+    previous = {}
+    if not path or not os.path.exists(path): return previous
+    with open(path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                previous[(rec["endpoint"], rec["concurrency"], json.dumps(rec["mix"], sort_keys=True))] = rec
+            except (ValueError, KeyError):
+                continue
+    return previous
+
+
+def change(new, old):
+    if not old or new is None: return ""
+    return f" ({(new - old) / old * 100:+.0f}%)"
+
+
+def print_result(endpoint, res, before):
+    lat = res["latency_ms"]
+    if not lat["count"]:
+        print(f"   c={res['concurrency']:<4} ❌ all {res['errors']} requests failed")
+        return
+    old_lat = (before or {}).get("latency_ms", {})
+    print(f"   c={res['concurrency']:<4} {res['rps']:>9.1f} req/s{change(res['rps'], (before or {}).get('rps'))}"
+          f"  p50 {lat['p50']:.2f}ms{change(lat['p50'], old_lat.get('p50'))}"
+          f"  p90 {lat['p90']:.2f}  p99 {lat['p99']:.2f}  max {lat['max']:.2f}"
+          f"  errors {res['errors']}")
+    for kind, m in res["methods"].items():
+        if m["count"]:
+            print(f"        {kind:<17} n={m['count']:<7} p50 {m['p50']:.2f}  p90 {m['p90']:.2f}  p99 {m['p99']:.2f}  max {m['max']:.2f}")
+
+
+def benchmark(endpoints, mix, levels, duration=None, total=None, batch_size=DEFAULT_BATCH_SIZE, out=RESULTS_FILE,
+              labels=None):
+    """labels: {endpoint: name to record it under} for endpoints whose URL changes between runs (stubs)"""
+    previous = previous_results(out)
+    mix_key = json.dumps(mix, sort_keys=True)
+    records = []
+    labels = labels or {}
+    for endpoint in endpoints:
+        label = labels.get(endpoint, endpoint)
+        print(f"🔌 {label}" + (f" ({endpoint})" if label != endpoint else ""))
+        # Dedicated client sized for the largest level, so no worker waits on a connection
+        client = rpc_client.RpcClient(endpoint, pool_size=max(levels))
+        try:
+            for level in levels:
+                res = run_level(client, mix, level, duration, total, batch_size)
+                print_result(label, res, previous.get((label, level, mix_key)))
+                records.append(dict(time=time.strftime("%Y-%m-%dT%H:%M:%S%z"), endpoint=label,
+                                    mix=mix, batch_size=batch_size, **res))
+        finally:
+            client.close()
+    if out:
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "a") as f:
+            for rec in records:
+                f.write(json.dumps(rec) + "\n")
+        print(f"💾 {len(records)} results appended to {os.path.normpath(out)}")
+    return records
+
+
+# ---------------------------------------------------------------------------
+# Offline stand-in node
+# ---------------------------------------------------------------------------
+
+STUB_RESERVES = "0x" + f"{10**24:064x}" + f"{6 * 10**26:064x}" + f"{1_700_000_000:064x}"
+STUB_STORAGE = "0x" + f"{1_700_000_000:08x}" + f"{6 * 10**26:028x}" + f"{10**24:028x}"
+
+
+def stub_result(method):
+    if method == "eth_blockNumber": return hex(40_000_000)
+    if method == "eth_call": return STUB_RESERVES
+    if method == "eth_getStorageAt": return STUB_STORAGE
+    return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like geth
+    # Buffer the response so headers and body leave in one segment (no Nagle / delayed-ACK stalls)
+    wbufsize = -1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.server.latency)
+        items = body if isinstance(body, list) else [body]
+        out = [{"jsonrpc": "2.0", "id": it.get("id"), "result": stub_result(it.get("method"))} for it in items]
+        data = json.dumps(out if isinstance(body, list) else out[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(latency_ms):
+    """Starts a stand-in JSON-RPC node on a free local port; returns its URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+    endpoints = []
+    labels = {}
+    while "--stub" in args:
+        idx = args.index("--stub")
+        latency = float(args[idx + 1])
+        url = start_stub(latency)
+        endpoints.append(url)
+        labels[url] = f"stub:{latency:g}ms"
+        del args[idx:idx + 2]
+
+    def option(name, default):
+        if name not in args: return default
+        idx = args.index(name)
+        value = args[idx + 1]
+        del args[idx:idx + 2]
+        return value
+
+    try:
+        mix = parse_mix(option("--mix", DEFAULT_MIX))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    levels = [int(c) for c in option("--concurrency", DEFAULT_CONCURRENCY).split(",")]
+    total = option("--requests", None)
+    duration = float(option("--duration", DEFAULT_DURATION))
+    batch_size = int(option("--batch-size", DEFAULT_BATCH_SIZE))
+    out = option("--out", RESULTS_FILE)
+    endpoints = args + endpoints
+    if not endpoints:
+        endpoints = [rpc_client.DEFAULT_ENDPOINT]
+
+    try:
+        benchmark(endpoints, mix, levels, None if total else duration, int(total) if total else None, batch_size, out,
+                  labels)
+    except KeyboardInterrupt:
+        print("\n👋 Interrupted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Shared JSON-RPC client for the BSC node scripts.
+
+Keeps a pool of persistent HTTP/1.1 keep-alive connections per endpoint, or
+talks to geth directly over its Unix socket (IPCPath = "geth.ipc" in
+config/config.toml). Connections that were closed by the other side (e.g. a
+geth restart) are reopened and the request is retried once.
+
+Endpoints:
+    http://localhost:8545          HTTP / HTTPS
+    ipc:///data/bsc/data/geth.ipc  Unix socket (a bare path ending in .ipc works too)
+
+The default endpoint can be overridden with the BSC_RPC environment variable.
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import threading
+import urllib.parse
+
+DEFAULT_ENDPOINT = os.environ.get("BSC_RPC", "http://localhost:8545")
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 8
+
+# Errors meaning the peer dropped a pooled connection; safe to reconnect and resend
+RECONNECT_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+    EOFError,
+)
+
+
+class RpcError(Exception):
+    """Raised when the node answers with a JSON-RPC error object"""
+
+    def __init__(self, error):
+        self.code = error.get("code") if isinstance(error, dict) else None
+        self.message = error.get("message") if isinstance(error, dict) else str(error)
+        super().__init__(f"RPC error {self.code}: {self.message}")
+
+
+class HttpTransport:
+    """HTTP/1.1 POST over a pool of keep-alive connections"""
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE):
+        parsed = urllib.parse.urlsplit(url)
+        self.https = parsed.scheme == "https"
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.https else 80)
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += "?" + parsed.query
+        self.headers = {
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+            "Host": parsed.netloc,
+        }
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self, timeout):
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _checkout(self, timeout):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            return self._connect(timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def _checkin(self, conn):
+        try:
+            self.pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _roundtrip(self, conn, body):
+        conn.request("POST", self.path, body=body, headers=self.headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status != 200:
+            raise http.client.HTTPException(f"HTTP {resp.status} {resp.reason}")
+        if resp.will_close:
+            conn.close()
+        return data
+
+    def send(self, body, timeout):
+        conn = self._checkout(timeout)
+        reused = conn.sock is not None
+        try:
+            data = self._roundtrip(conn, body)
+        except RECONNECT_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # Stale keep-alive connection: retry once on a fresh one
+            conn = self._connect(timeout)
+            try:
+                data = self._roundtrip(conn, body)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        self._checkin(conn)
+        return data
+
+    def grow(self, pool_size):
+        """Keeps up to pool_size idle connections from now on (never shrinks)"""
+        with self.pool.mutex:
+            self.pool.maxsize = max(self.pool.maxsize, pool_size)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class IpcTransport:
+    """Newline-free JSON stream over geth's Unix domain socket"""
+
+    def __init__(self, path, pool_size=DEFAULT_POOL_SIZE):
+        self.path = path
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.decoder = json.JSONDecoder()
+
+    def _connect(self, timeout):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _roundtrip(self, sock, body):
+        sock.sendall(body)
+        buf = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise EOFError("IPC socket closed by peer")
+            buf += chunk
+            if not buf.rstrip().endswith((b"}", b"]")):
+                continue
+            # geth writes one JSON value per response; stop once it parses completely
+            text = buf.decode("utf-8", errors="strict").strip()
+            try:
+                _, end = self.decoder.raw_decode(text)
+            except ValueError:
+                continue
+            if end == len(text):
+                return text.encode("utf-8")
+
+    def send(self, body, timeout):
+        try:
+            sock = self.pool.get_nowait()
+            sock.settimeout(timeout)
+            reused = True
+        except queue.Empty:
+            sock = self._connect(timeout)
+            reused = False
+        try:
+            data = self._roundtrip(sock, body)
+        except socket.timeout:
+            sock.close()
+            raise
+        except RECONNECT_ERRORS + (OSError,):
+            sock.close()
+            if not reused:
+                raise
+            sock = self._connect(timeout)
+            try:
+                data = self._roundtrip(sock, body)
+            except Exception:
+                sock.close()
+                raise
+        except Exception:
+            sock.close()
+            raise
+        try:
+            self.pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+        return data
+
+    def grow(self, pool_size):
+        """Keeps up to pool_size idle connections from now on (never shrinks)"""
+        with self.pool.mutex:
+            self.pool.maxsize = max(self.pool.maxsize, pool_size)
+
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def make_transport(endpoint, pool_size=DEFAULT_POOL_SIZE):
+    if endpoint.startswith("ipc://"):
+        return IpcTransport(endpoint[len("ipc://"):], pool_size)
+    if endpoint.startswith(("http://", "https://")):
+        return HttpTransport(endpoint, pool_size)
+    if endpoint.endswith(".ipc") or os.path.exists(endpoint):
+        return IpcTransport(endpoint, pool_size)
+    raise ValueError(f"Unsupported RPC endpoint: {endpoint}")
+
+
+class RpcClient:
+    """Thread-safe JSON-RPC client with single and batch calls"""
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.transport = make_transport(endpoint, pool_size)
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def _next_ids(self, n):
+        with self._lock:
+            start = self._ids
+            self._ids += n
+        return start
+
+    def call(self, method, params=None, timeout=None):
+        """Returns the call result, raises RpcError on a JSON-RPC error"""
+        req_id = self._next_ids(1)
+        body = json.dumps({"jsonrpc": "2.0", "method": method, "params": params or [], "id": req_id})
+        res = json.loads(self.transport.send(body.encode("utf-8"), timeout or self.timeout))
+        if "error" in res:
+            raise RpcError(res["error"])
+        return res.get("result")
+
+    def batch(self, calls, timeout=None):
+        """Sends [(method, params), ...] as one request; failed entries come back as None"""
+        if not calls:
+            return []
+        start = self._next_ids(len(calls))
+        body = json.dumps([
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": start + i}
+            for i, (method, params) in enumerate(calls)
+        ])
+        res = json.loads(self.transport.send(body.encode("utf-8"), timeout or self.timeout))
+        results = [None] * len(calls)
+        # A rejected batch comes back as a single error object instead of an array
+        if not isinstance(res, list):
+            return results
+        # Responses may arrive in any order, match them back by id
+        for item in res:
+            idx = item.get("id")
+            if "error" in item or not isinstance(idx, int) or not 0 <= idx - start < len(calls):
+                continue
+            results[idx - start] = item.get("result")
+        return results
+
+    def close(self):
+        self.transport.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(endpoint=DEFAULT_ENDPOINT, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+    """Returns the process-wide client for an endpoint, creating it on first use
+
+    Asking for a bigger pool_size than the existing client has grows its pool,
+    so N worker threads keep N connections alive instead of churning through new ones.
+    """
+    with _clients_lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            client = _clients[endpoint] = RpcClient(endpoint, timeout, pool_size)
+        else:
+            client.transport.grow(pool_size)
+        return client
@@ -14,6 +14,18 @@ docker rm -f aws-cloudwatch-monitor 2>/dev/null
 # 获取当前脚本所在目录的绝对路径，用于挂载
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 
+# 默认运行 Python 版 (aws_monitor.py: 常驻进程, 批量 GetMetricData, 实例信息缓存)
+# 传入 --shell 则使用旧版 aws-monitor-task.sh (每次调用启动 aws CLI)
+if [ "$1" = "--shell" ]; then
+    IMAGE="amazon/aws-cli:latest"
+    ENTRYPOINT="/bin/bash"
+    CMD="/scripts/aws-monitor-task.sh"
+else
+    IMAGE="python:3.12-alpine"
+    ENTRYPOINT="python3"
+    CMD="/scripts/aws_monitor.py"
+fi
+
 docker run -d \
     --name aws-cloudwatch-monitor \
     --restart always \
@@ -22,9 +34,11 @@ docker run -d \
     -e AWS_DEFAULT_REGION="ap-southeast-1" \
     -e TELEGRAM_BOT_TOKEN="$TELEGRAM_BOT_TOKEN" \
     -e TELEGRAM_CHAT_ID="$TELEGRAM_CHAT_ID" \
-    -v "$SCRIPT_DIR/aws-monitor-task.sh:/aws-monitor-task.sh" \
-    --entrypoint /bin/bash \
-    amazon/aws-cli:latest \
-    /aws-monitor-task.sh
+    -e PYTHONUNBUFFERED=1 \
+    -v "$SCRIPT_DIR:/scripts:ro" \
+    -v /tmp/alarm_timestamps:/tmp/alarm_timestamps \
+    --entrypoint "$ENTRYPOINT" \
+    "$IMAGE" \
+    "$CMD"
 
 echo "容器启动成功！使用 docker logs aws-cloudwatch-monitor 查看日志。"
@@ -49,6 +49,7 @@ fi
 # --cache 8192: 分配 8GB 内存给缓存 (针对 15GB 内存优化)
 # --db.engine pebble: 使用 PebbleDB (性能更好)
 # --txlookuplimit 0: 禁用旧块交易索引 (减少 I/O)
+# --metrics.addr/port: 本机 6060 端口暴露 Prometheus 指标 (sync_exporter.py 汇总)
 ulimit -n 65535
 
 nohup "$BINARY" \
@@ -75,6 +76,8 @@ nohup "$BINARY" \
   --ws.port 8546 \
   --ws.api "eth,net,web3,txpool" \
   --metrics \
+  --metrics.addr 127.0.0.1 \
+  --metrics.port 6060 \
   >> "$LOG_FILE" 2>&1 &
 
 PID=$!
@@ -0,0 +1,298 @@
+"""
+Headless exporter for the sync monitor: OpenMetrics /metrics and/or JSONL.
+
+A sampler thread polls the node every --interval seconds (one JSON-RPC batch:
+eth_syncing, net_peerCount, latest block header) and geth's own Prometheus
+endpoint (start-bsc.sh runs geth with --metrics.addr/--metrics.port), then
+renders the exposition once. Scrapes only return the last rendered bytes, so
+any number of Prometheus servers scraping at any rate add no load on the node.
+Sync rates and ETAs come from the same estimators as check_bsc_sync.py.
+
+Usage:
+    python3 sync_exporter.py [--listen 127.0.0.1:9105] [--jsonl FILE|-] [--interval 5]
+                             [--geth-metrics URL|none] [--history]
+
+--jsonl without --listen only writes samples; --history also appends them to
+cache/sync_history.bin (do not combine with a running check_bsc_sync.py).
+"""
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rpc_client
+from check_bsc_sync import EST_TOTAL_ACCOUNTS, EST_TOTAL_BYTECODES, EST_TOTAL_SLOTS
+from rate_estimator import WINDOW_LABELS, RateEstimator
+from sync_history import FIELDS, SyncHistory, sample_from_syncing
+
+URL = rpc_client.DEFAULT_ENDPOINT
+DEFAULT_LISTEN = "127.0.0.1:9105"
+DEFAULT_INTERVAL = 5.0
+GETH_METRICS_URL = "http://127.0.0.1:6060/debug/metrics/prometheus"
+GETH_METRICS_TIMEOUT = 3
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Sample field -> (metric name, help); counters get the _total suffix on output
+COUNTERS = {
+    "accounts": ("bsc_sync_accounts", "Accounts downloaded by snap sync"),
+    "account_bytes": ("bsc_sync_account_bytes", "Account data downloaded by snap sync"),
+    "storage": ("bsc_sync_storage_slots", "Storage slots downloaded by snap sync"),
+    "storage_bytes": ("bsc_sync_storage_bytes", "Storage data downloaded by snap sync"),
+    "bytecodes": ("bsc_sync_bytecodes", "Contract bytecodes downloaded by snap sync"),
+    "bytecode_bytes": ("bsc_sync_bytecode_bytes", "Bytecode data downloaded by snap sync"),
+    "healed_trienodes": ("bsc_sync_healed_trienodes", "Trie nodes healed"),
+}
+# Counters with a rate / ETA estimate: sample field -> (label, estimated total)
+ESTIMATED = {
+    "accounts": ("accounts", EST_TOTAL_ACCOUNTS),
+    "storage": ("storage", EST_TOTAL_SLOTS),
+    "bytecodes": ("bytecodes", EST_TOTAL_BYTECODES),
+}
+
+
+class Exposition:
+    """Collects metric families and renders them in both text formats"""
+
+    def __init__(self):
+        self.families = []
+
+    def add(self, name, kind, help_text, samples):
+        """samples: [(labels dict, value)]"""
+        self.families.append((name, kind, help_text, samples))
+
+    def render(self, openmetrics):
+        lines = []
+        for name, kind, help_text, samples in self.families:
+            sample_name = name + "_total" if kind == "counter" else name
+            # OpenMetrics names the family without _total, the Prometheus text format names it like the sample
+            family = name if openmetrics else sample_name
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{sample_name}{{{label_str}}} {value}" if label_str else f"{sample_name} {value}")
+        return lines
+
+
+def geth_lines(text, openmetrics):
+    """geth's Prometheus text, adjusted so it can be appended to our exposition"""
+    out = []
+    for line in text.splitlines():
+        if not line.strip(): continue
+        if openmetrics and line.startswith("# TYPE ") and line.endswith(" counter"):
+            # geth counters have no _total suffix, which OpenMetrics requires for the counter type
+            line = line[: -len("counter")] + "unknown"
+        out.append(line)
+    return out
+
+
+class Sampler:
+    def __init__(self, interval=DEFAULT_INTERVAL, geth_url=GETH_METRICS_URL, jsonl=None, history=None):
+        self.interval = interval
+        self.geth_url = geth_url
+        self.jsonl = jsonl
+        self.history = history
+        self.rates = {field: RateEstimator() for field in ESTIMATED}
+        self.lock = threading.Lock()
+        self.openmetrics = b"# EOF\n"
+        self.prometheus = b""
+        self.samples = 0
+        self.errors = 0
+
+    def poll_node(self):
+        """(eth_syncing, peers, latest header) from one batch; raises if the node is unreachable"""
+        syncing, peers, head = rpc_client.get_client(URL, timeout=5).batch([
+            ("eth_syncing", []),
+            ("net_peerCount", []),
+            ("eth_getBlockByNumber", ["latest", False]),
+        ])
+        return syncing, int(peers, 16) if peers else 0, head
+
+    def poll_geth(self):
+        if not self.geth_url: return ""
+        try:
+            with urllib.request.urlopen(self.geth_url, timeout=GETH_METRICS_TIMEOUT) as res:
+                return res.read().decode("utf-8", "replace")
+        except Exception:
+            return ""
+
+    def sample(self):
+        start = time.time()
+        try:
+            syncing, peers, head = self.poll_node()
+            up = 1
+        except Exception:
+            syncing, peers, head, up = None, 0, None, 0
+        geth_text = self.poll_geth()
+        now = time.time()
+
+        record = {"time": round(now, 3), "up": up, "peers": peers, "syncing": bool(syncing)}
+        exp = Exposition()
+        exp.add("bsc_node_up", "gauge", "Whether the node answered the last JSON-RPC batch", [({}, up)])
+        exp.add("bsc_node_peers", "gauge", "Connected peers", [({}, peers)])
+        exp.add("bsc_sync_syncing", "gauge", "1 while eth_syncing reports progress", [({}, int(bool(syncing)))])
+
+        if head:
+            number = int(head["number"], 16)
+            head_age = max(0.0, now - int(head["timestamp"], 16))
+            record.update(head_block=number, head_age=round(head_age, 3))
+            exp.add("bsc_node_head_block", "gauge", "Latest local block number", [({}, number)])
+            exp.add("bsc_node_head_age_seconds", "gauge", "Seconds since the latest local block was produced",
+                    [({}, round(head_age, 3))])
+
+        if isinstance(syncing, dict):
+            s = sample_from_syncing(syncing, peers, now)
+            lag = max(0, s.highest_block - s.current_block)
+            record.update({name: getattr(s, name) for name in FIELDS[1:-1]}, block_lag=lag)
+            exp.add("bsc_sync_current_block", "gauge", "eth_syncing currentBlock", [({}, s.current_block)])
+            exp.add("bsc_sync_highest_block", "gauge", "eth_syncing highestBlock", [({}, s.highest_block)])
+            exp.add("bsc_sync_block_lag", "gauge", "highestBlock - currentBlock", [({}, lag)])
+            for field, (name, help_text) in COUNTERS.items():
+                exp.add(name, "counter", help_text, [({}, getattr(s, field))])
+
+            rate_samples, eta_samples = [], []
+            for field, (label, total) in ESTIMATED.items():
+                est = self.rates[field]
+                est.add(now, getattr(s, field))
+                ewma, windowed = est.rates()
+                for window, rate in zip(("ewma",) + WINDOW_LABELS, [ewma] + windowed):
+                    if rate is not None:
+                        rate_samples.append(({"counter": label, "window": window}, round(rate, 3)))
+                expected, fastest, slowest = est.eta(total - getattr(s, field))
+                if expected is not None:
+                    for bound, value in (("expected", expected), ("low", fastest), ("high", slowest)):
+                        eta_samples.append(({"counter": label, "bound": bound}, round(value)))
+                    record[f"{label}_eta"] = round(expected)
+                record[f"{label}_rate"] = round(ewma, 3) if ewma is not None else None
+            exp.add("bsc_sync_rate", "gauge", "Snap sync progress per second (EWMA and windowed)", rate_samples)
+            exp.add("bsc_sync_eta_seconds", "gauge", "Estimated seconds until the estimated total is reached",
+                    eta_samples)
+            if self.history is not None:
+                try:
+                    self.history.append(s)
+                except OSError as e:
+                    # Disk full / permissions: keep exporting, just without the history file
+                    self.errors += 1
+                    print(f"⚠️  History append failed: {e}", file=sys.stderr)
+        elif syncing is False and head:
+            record["block_lag"] = 0
+            exp.add("bsc_sync_block_lag", "gauge", "highestBlock - currentBlock", [({}, 0)])
+
+        load = os.getloadavg()
+        record["load"] = [round(v, 2) for v in load]
+        exp.add("bsc_host_load", "gauge", "Host load average",
+                [({"period": p}, round(v, 2)) for p, v in zip(("1m", "5m", "15m"), load)])
+        exp.add("bsc_exporter_sample_duration_seconds", "gauge", "Time spent collecting the last sample",
+                [({}, round(now - start, 4))])
+        exp.add("bsc_exporter_sample_timestamp_seconds", "gauge", "Unix time of the last sample",
+                [({}, round(now, 3))])
+        exp.add("bsc_exporter_sample_errors", "counter", "Samples that failed or were only partly collected",
+                [({}, self.errors)])
+
+        openmetrics = "\n".join(exp.render(True) + geth_lines(geth_text, True) + ["# EOF"]) + "\n"
+        prometheus = "\n".join(exp.render(False) + geth_lines(geth_text, False)) + "\n"
+        with self.lock:
+            self.openmetrics = openmetrics.encode()
+            self.prometheus = prometheus.encode()
+            self.samples += 1
+
+        if self.jsonl is not None:
+            self.jsonl.write(json.dumps(record) + "\n")
+            self.jsonl.flush()
+
+    def run(self):
+        """Samples on a fixed schedule; a slow sample delays the next one instead of piling up"""
+        next_at = time.monotonic()
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                # A malformed node answer must not stop sampling; the timestamp metric shows the stale sample
+                self.errors += 1
+                print(f"⚠️  Sample failed: {type(e).__name__}: {e}", file=sys.stderr)
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.monotonic()
+
+    def exposition(self, openmetrics):
+        with self.lock:
+            return self.openmetrics if openmetrics else self.prometheus
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.sampler.exposition(openmetrics)
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(sampler, listen):
+    host, _, port = listen.rpartition(":")
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), MetricsHandler)
+    server.daemon_threads = True
+    server.sampler = sampler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        return
+
+    def option(name, default=None):
+        if name not in args: return default
+        idx = args.index(name)
+        if idx + 1 >= len(args) or args[idx + 1].startswith("--"):
+            print(f"❌ {name} requires a value (see --help)", file=sys.stderr)
+            sys.exit(1)
+        return args[idx + 1]
+
+    listen = option("--listen")
+    jsonl_path = option("--jsonl")
+    if listen is None and jsonl_path is None:
+        listen = DEFAULT_LISTEN
+    geth_url = option("--geth-metrics", GETH_METRICS_URL)
+    if geth_url == "none": geth_url = None
+    jsonl = None
+    if jsonl_path == "-":
+        jsonl = sys.stdout
+    elif jsonl_path:
+        jsonl = open(jsonl_path, "a")
+    history = SyncHistory() if "--history" in args else None
+
+    sampler = Sampler(float(option("--interval", DEFAULT_INTERVAL)), geth_url, jsonl, history)
+    if listen:
+        serve(sampler, listen)
+        print(f"📡 Serving http://{listen}/metrics (sampling every {sampler.interval:g}s)", file=sys.stderr)
+    try:
+        sampler.run()
+    except KeyboardInterrupt:
+        print("\n👋 Exporter stopped.", file=sys.stderr)
+    finally:
+        if history is not None: history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Append-only time series of snap-sync progress, kept across monitor restarts.
+
+Each sample is one fixed-width little-endian record (RECORD, 88 bytes) in
+cache/sync_history.bin: timestamp, current/highest block, synced accounts,
+storage and bytecodes with their byte counts, healed trienodes and peers.
+Writes are plain appends; reads memory-map the file and binary-search the
+timestamps, so a query over weeks of history touches only the records it
+returns. compact() applies the retention policy: full resolution for
+RAW_RETENTION, one sample per DOWNSAMPLE_INTERVAL after that, nothing older
+than MAX_AGE. The counters only grow, so keeping the last sample of every
+bucket preserves every rate computed from the history.
+
+Usage:
+    python3 sync_history.py query [--since 6h] [--until TIME] [--step 1h]
+    python3 sync_history.py info
+    python3 sync_history.py compact
+
+TIME is an age (90s, 30m, 6h, 2d), a unix timestamp or YYYY-MM-DD[THH:MM[:SS]].
+"""
+import datetime
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from token_meta import CACHE_DIR
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "sync_history.bin")
+MAGIC = b"SHST"
+VERSION = 1
+HEADER = struct.Struct("<4sHH8x")  # magic, version, record size
+FIELDS = (
+    "time", "current_block", "highest_block",
+    "accounts", "account_bytes", "storage", "storage_bytes",
+    "bytecodes", "bytecode_bytes", "healed_trienodes", "peers",
+)
+RECORD = struct.Struct("<d9QI4x")
+Sample = namedtuple("Sample", FIELDS)
+
+RECORD_INTERVAL = 5.0               # seconds between stored samples; the screen still updates every 0.5 s
+RAW_RETENTION = 2 * 86400           # keep every stored sample for 2 days
+DOWNSAMPLE_INTERVAL = 60            # then one sample per minute
+MAX_AGE = 180 * 86400               # and nothing older than 180 days
+COMPACT_EVERY = 3600
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def sample_from_syncing(syncing, peers, t=None):
+    """Builds a Sample from an eth_syncing result object"""
+    def field(name):
+        return int(syncing.get(name, "0x0"), 16)
+    return Sample(
+        time.time() if t is None else t,
+        field("currentBlock"), field("highestBlock"),
+        field("syncedAccounts"), field("syncedAccountBytes"),
+        field("syncedStorage"), field("syncedStorageBytes"),
+        field("syncedBytecodes"), field("syncedBytecodeBytes"),
+        field("healedTrienodes"), peers,
+    )
+
+
+class SyncHistory:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.map_size = 0
+        self.last_time = 0.0
+
+    def _open(self):
+        if self.file is not None: return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            self.file.flush()
+        else:
+            # Drop a record torn by a crash mid-write
+            extra = (self.file.tell() - HEADER.size) % RECORD.size
+            if extra:
+                self.file.truncate(self.file.tell() - extra)
+        last = self.latest()
+        self.last_time = last.time if last else 0.0
+
+    def append(self, sample, min_interval=RECORD_INTERVAL):
+        """Appends a sample unless the previous one is less than min_interval old; returns True if written"""
+        self._open()
+        if sample.time - self.last_time < min_interval: return False
+        self.file.write(RECORD.pack(*sample))
+        self.file.flush()
+        self.last_time = sample.time
+        return True
+
+    def _view(self):
+        """Read-only map of the record area, re-mapped when the file has grown"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if self.map is None or size != self.map_size:
+            if self.map is not None: self.map.close()
+            self.map = None
+            self.map_size = size
+            if size < HEADER.size + RECORD.size: return None
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, record_size = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{self.path}: not a sync history file (version {version})")
+        return self.map
+
+    def __len__(self):
+        view = self._view()
+        return 0 if view is None else (len(view) - HEADER.size) // RECORD.size
+
+    def _record(self, view, i):
+        return Sample._make(RECORD.unpack_from(view, HEADER.size + i * RECORD.size))
+
+    def _time(self, view, i):
+        return struct.unpack_from("<d", view, HEADER.size + i * RECORD.size)[0]
+
+    def _bisect(self, view, n, t):
+        """Index of the first record with time >= t"""
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time(view, mid) < t: lo = mid + 1
+            else: hi = mid
+        return lo
+
+    def latest(self):
+        n = len(self)
+        return self._record(self.map, n - 1) if n else None
+
+    def records(self, since=None, until=None):
+        """Yields Samples with since <= time <= until, oldest first"""
+        n = len(self)
+        if not n: return
+        view = self.map
+        start = self._bisect(view, n, since) if since is not None else 0
+        for i in range(start, n):
+            rec = self._record(view, i)
+            if until is not None and rec.time > until: break
+            yield rec
+
+    def compact(self, now=None):
+        """Applies the retention policy by rewriting the file; returns (records before, records after)"""
+        now = time.time() if now is None else now
+        before = len(self)
+        if not before: return 0, 0
+        raw_from = now - RAW_RETENTION
+        kept = []
+        bucket = None
+        for rec in self.records(since=now - MAX_AGE):
+            if rec.time >= raw_from:
+                kept.append(rec)
+                continue
+            key = int(rec.time // DOWNSAMPLE_INTERVAL)
+            if key == bucket:
+                kept[-1] = rec
+            else:
+                kept.append(rec)
+                bucket = key
+        if len(kept) == before: return before, before
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+            for rec in kept:
+                f.write(RECORD.pack(*rec))
+        self.close()
+        os.replace(tmp, self.path)
+        return before, len(kept)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.map_size = 0
+
+
+def parse_duration(value):
+    """'90s' / '30m' / '6h' / '2d' -> seconds, None if value is not a duration"""
+    number, unit = value[:-1], value[-1:]
+    if unit not in DURATION_UNITS or not number.replace(".", "", 1).isdigit(): return None
+    return float(number) * DURATION_UNITS[unit]
+
+
+def parse_time(value, now=None):
+    """Age ('6h'), unix seconds or ISO date -> unix seconds"""
+    age = parse_duration(value)
+    if age is not None:
+        return (time.time() if now is None else now) - age
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def rates(first, last):
+    """Per-second rates between two samples, None if the counters were reset in between"""
+    dt = last.time - first.time
+    if dt <= 0 or last.accounts < first.accounts or last.storage < first.storage: return None
+    return {name: (getattr(last, name) - getattr(first, name)) / dt for name in FIELDS[1:-1]}
+
+
+def format_time(t):
+    return datetime.datetime.fromtimestamp(t).strftime("%m-%d %H:%M:%S")
+
+
+def print_rates(start, end, r):
+    mb = (r["account_bytes"] + r["storage_bytes"] + r["bytecode_bytes"]) / 1024**2
+    print(f"{format_time(start.time)} → {format_time(end.time)}  "
+          f"blocks {r['current_block']:8.2f}/s  accounts {r['accounts']:10,.0f}/s  "
+          f"slots {r['storage']:10,.0f}/s  codes {r['bytecodes']:7,.1f}/s  "
+          f"healed {r['healed_trienodes']:8,.0f}/s  {mb:6.2f} MB/s")
+
+
+def query(history, since, until, step):
+    samples = list(history.records(since, until))
+    if len(samples) < 2:
+        print("❌ Not enough samples in that window.")
+        return
+    if step:
+        # One line per step, each from the first to the last sample inside it
+        first = samples[0]
+        for rec in samples[1:]:
+            if rec.time - first.time >= step or rec is samples[-1]:
+                r = rates(first, rec)
+                if r is None:
+                    print(f"{format_time(first.time)} → {format_time(rec.time)}  ⚠️ counters reset (node restart)")
+                else:
+                    print_rates(first, rec, r)
+                first = rec
+        print("-" * 60)
+    r = rates(samples[0], samples[-1])
+    if r is None:
+        print("⚠️ Counters were reset inside the window; use --step to see the rates around it.")
+        return
+    print("Total:")
+    print_rates(samples[0], samples[-1], r)
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] not in ("query", "info", "compact"):
+        print(__doc__.strip())
+        sys.exit(1)
+
+    def option(name, default=None):
+        if name not in args: return default
+        return args[args.index(name) + 1]
+
+    history = SyncHistory()
+    if args[0] == "info":
+        n = len(history)
+        if not n:
+            print(f"📭 {history.path} is empty.")
+            return
+        first, last = next(history.records()), history.latest()
+        size = os.path.getsize(history.path)
+        print(f"📦 {n:,} samples, {size / 1024**2:.2f} MB, "
+              f"{format_time(first.time)} → {format_time(last.time)}")
+        return
+    if args[0] == "compact":
+        before, after = history.compact()
+        print(f"✅ {before:,} -> {after:,} samples")
+        return
+
+    since = option("--since", "1h")
+    until = option("--until")
+    step = option("--step")
+    query(history, parse_time(since), parse_time(until) if until else None, parse_duration(step) if step else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Persistent ERC-20 metadata cache (decimals, symbol) keyed by token address.
+
+Backed by a small SQLite file under cache/ (override with BSC_CACHE_DIR).
+The file is opened lazily on first use and hot entries are kept in an
+in-process LRU, so a warm lookup touches neither the disk nor the node.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = os.environ.get(
+    "BSC_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache"),
+)
+DEFAULT_PATH = os.path.join(CACHE_DIR, "token_meta.sqlite")
+LRU_SIZE = 4096
+
+
+def _key(address):
+    return bytes.fromhex(address.lower().replace("0x", ""))
+
+
+class TokenMetaStore:
+    """address -> (decimals, symbol), SQLite on disk with an LRU in front"""
+
+    def __init__(self, path=DEFAULT_PATH, lru_size=LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.db = None
+        self.lock = threading.Lock()
+
+    def _open(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "address BLOB PRIMARY KEY, decimals INTEGER NOT NULL, symbol TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+        return self.db
+
+    def _remember(self, address, meta):
+        self.lru[address] = meta
+        self.lru.move_to_end(address)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def get_many(self, addresses):
+        """Returns {address: (decimals, symbol)} for the addresses that are cached"""
+        found = {}
+        with self.lock:
+            missing = []
+            for address in addresses:
+                address = address.lower()
+                meta = self.lru.get(address)
+                if meta is None:
+                    missing.append(address)
+                else:
+                    self.lru.move_to_end(address)
+                    found[address] = meta
+            if missing:
+                db = self._open()
+                # Stay under SQLite's bound-parameter limit
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i : i + 500]
+                    rows = db.execute(
+                        f"SELECT address, decimals, symbol FROM tokens WHERE address IN ({','.join('?' * len(chunk))})",
+                        [_key(a) for a in chunk],
+                    )
+                    for raw, decimals, symbol in rows:
+                        address = "0x" + raw.hex()
+                        found[address] = (decimals, symbol)
+                        self._remember(address, (decimals, symbol))
+        return found
+
+    def get(self, address):
+        return self.get_many([address]).get(address.lower())
+
+    def put_many(self, entries):
+        """Stores {address: (decimals, symbol)}"""
+        if not entries: return
+        with self.lock:
+            db = self._open()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO tokens (address, decimals, symbol) VALUES (?, ?, ?)",
+                    [(_key(a), d, s) for a, (d, s) in entries.items()],
+                )
+            for address, meta in entries.items():
+                self._remember(address.lower(), meta)
+
+    def prefetch(self, addresses, fetch, refresh=False):
+        """Loads metadata for many tokens; fetch(missing) -> {address: (decimals, symbol)} fills the gaps"""
+        addresses = list(dict.fromkeys(a.lower() for a in addresses))
+        found = {} if refresh else self.get_many(addresses)
+        missing = [a for a in addresses if a not in found]
+        if missing:
+            fetched = fetch(missing)
+            self.put_many(fetched)
+            found.update(fetched)
+        return found
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,356 @@
+"""
+Local exact-input quotes for PancakeSwap / Uniswap V3 pools.
+
+The pool's initialized ticks are loaded once per block with batched reads of
+tickBitmap(int16) and ticks(int24) (eth_call results at a fixed block are also
+kept in cache/calls.sqlite). Swaps are then simulated with the pool's own
+integer Q64.96 math (TickMath, SqrtPriceMath, SwapMath), so amounts match the
+contract to the wei. All trade sizes are quoted in one walk over the ticks:
+every full step is shared, only the last partial step differs per size.
+
+Usage:
+    python3 v3_quote.py <POOL_ADDRESS> <SIZE[,SIZE...]> [--one-for-zero] [--block BLOCK_NUM]
+
+SIZE is in whole units of the input token (token0 by default). Quotes are
+exact-input (size in, amount out); exact-output is not implemented.
+"""
+import sys
+import time
+from decimal import Decimal
+
+import get_token_price as gtp
+
+FUNC_TICKS = "0xf30dba93"         # ticks(int24)
+FUNC_TICK_BITMAP = "0x5339c296"   # tickBitmap(int16)
+FUNC_TICK_SPACING = "0xd0c93a7c"  # tickSpacing()
+FUNC_FEE = "0xddca3f43"           # fee()
+
+Q96 = 2**96
+MAX_UINT256 = 2**256 - 1
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+
+# Bitmap words read on each side of the current tick per round trip
+BITMAP_WORDS = 4
+
+# (pool, block) -> V3Pool, so repeated quotes at one height never reload
+POOL_CACHE = {}
+
+# TickMath.getSqrtRatioAtTick multipliers for bits 1..19 of |tick|
+TICK_RATIOS = (
+    0xfff97272373d413259a46990580e213a, 0xfff2e50f5f656932ef12357cf3c7fdcc,
+    0xffe5caca7e10e4e61c3624eaa0941cd0, 0xffcb9843d60f6159c9db58835c926644,
+    0xff973b41fa98c081472e6896dfb254c0, 0xff2ea16466c96a3843ec78b326b52861,
+    0xfe5dee046a99a2a811c461f1969c3053, 0xfcbe86c7900a88aedcffc83b479aa3a4,
+    0xf987a7253ac413176f2b074cf7815e54, 0xf3392b0822b70005940c7a398e4b70f3,
+    0xe7159475a2c29b7443b29c7fa6e889d9, 0xd097f3bdfd2022b8845ad8f792aa5825,
+    0xa9f746462d870fdf8a65dc1f90e061e5, 0x70d869a156d2a1b890bb3df62baf32f7,
+    0x31be135f97d08fd981231505542fcfa6, 0x9aa508b5b7a84e1c677de54f3e99bc9,
+    0x5d6af8dedb81196699c329225ee604, 0x2216e584f5fa1ea926041bedfe98,
+    0x48a170391f7dc42444e8fa2,
+)
+
+
+# ---- FullMath / TickMath / SqrtPriceMath / SwapMath ----
+
+def mul_div(a, b, denominator):
+    return a * b // denominator
+
+
+def mul_div_rounding_up(a, b, denominator):
+    return -(-a * b // denominator)
+
+
+def div_rounding_up(a, b):
+    return -(-a // b)
+
+
+def sqrt_ratio_at_tick(tick):
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK: raise ValueError(f"tick {tick} out of range")
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 1 else 1 << 128
+    for bit, multiplier in enumerate(TICK_RATIOS, 1):
+        if abs_tick & (1 << bit):
+            ratio = (ratio * multiplier) >> 128
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+    return (ratio >> 32) + (1 if ratio & 0xFFFFFFFF else 0)
+
+
+def tick_at_sqrt_ratio(sqrt_price_x96):
+    """Greatest tick whose sqrt ratio is <= sqrt_price_x96 (binary search over sqrt_ratio_at_tick)"""
+    lo, hi = MIN_TICK, MAX_TICK
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if sqrt_ratio_at_tick(mid) <= sqrt_price_x96: lo = mid
+        else: hi = mid - 1
+    return lo
+
+
+def amount0_delta(sqrt_a, sqrt_b, liquidity, round_up):
+    if sqrt_a > sqrt_b: sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    numerator1 = liquidity << 96
+    numerator2 = sqrt_b - sqrt_a
+    if round_up:
+        return div_rounding_up(mul_div_rounding_up(numerator1, numerator2, sqrt_b), sqrt_a)
+    return mul_div(numerator1, numerator2, sqrt_b) // sqrt_a
+
+
+def amount1_delta(sqrt_a, sqrt_b, liquidity, round_up):
+    if sqrt_a > sqrt_b: sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    if round_up:
+        return mul_div_rounding_up(liquidity, sqrt_b - sqrt_a, Q96)
+    return mul_div(liquidity, sqrt_b - sqrt_a, Q96)
+
+
+def next_sqrt_price_from_input(sqrt_price, liquidity, amount_in, zero_for_one):
+    if amount_in == 0: return sqrt_price
+    if zero_for_one:
+        # getNextSqrtPriceFromAmount0RoundingUp(add=true), including its overflow fallback
+        numerator1 = liquidity << 96
+        product = amount_in * sqrt_price
+        if product <= MAX_UINT256 and numerator1 + product <= MAX_UINT256:
+            return mul_div_rounding_up(numerator1, sqrt_price, numerator1 + product)
+        return div_rounding_up(numerator1, numerator1 // sqrt_price + amount_in)
+    # getNextSqrtPriceFromAmount1RoundingDown(add=true)
+    return sqrt_price + (amount_in << 96) // liquidity
+
+
+def compute_swap_step(sqrt_current, sqrt_target, liquidity, amount_remaining, fee_pips):
+    """SwapMath.computeSwapStep for exact input; returns (sqrt_next, amount_in, amount_out, fee_amount)"""
+    zero_for_one = sqrt_current >= sqrt_target
+    remaining_less_fee = mul_div(amount_remaining, 1_000_000 - fee_pips, 1_000_000)
+    if zero_for_one:
+        amount_in = amount0_delta(sqrt_target, sqrt_current, liquidity, True)
+    else:
+        amount_in = amount1_delta(sqrt_current, sqrt_target, liquidity, True)
+    if remaining_less_fee >= amount_in:
+        sqrt_next = sqrt_target
+    else:
+        sqrt_next = next_sqrt_price_from_input(sqrt_current, liquidity, remaining_less_fee, zero_for_one)
+
+    reached = sqrt_next == sqrt_target
+    if zero_for_one:
+        if not reached: amount_in = amount0_delta(sqrt_next, sqrt_current, liquidity, True)
+        amount_out = amount1_delta(sqrt_next, sqrt_current, liquidity, False)
+    else:
+        if not reached: amount_in = amount1_delta(sqrt_current, sqrt_next, liquidity, True)
+        amount_out = amount0_delta(sqrt_current, sqrt_next, liquidity, False)
+
+    if not reached:
+        fee_amount = amount_remaining - amount_in
+    else:
+        fee_amount = mul_div_rounding_up(amount_in, fee_pips, 1_000_000 - fee_pips)
+    return sqrt_next, amount_in, amount_out, fee_amount
+
+
+# ---- pool state ----
+
+def encode_int(value):
+    """Two's complement ABI word for int16/int24 arguments"""
+    return gtp.encode_uint(value % 2**256)
+
+
+def decode_int(word_hex):
+    value = int(word_hex, 16)
+    return value - 2**256 if value >= 2**255 else value
+
+
+class V3Pool:
+    """slot0, active liquidity and the initialized ticks of one pool at one block"""
+
+    def __init__(self, address, block):
+        self.address = address.lower()
+        self.block = block
+        self.bitmap = {}   # word position -> 256-bit word
+        self.ticks = {}    # initialized tick -> liquidityNet
+
+        requests = [gtp.eth_call_request(self.address, func, block) for func in
+                    (gtp.FUNC_SLOT0, gtp.FUNC_LIQUIDITY, FUNC_TICK_SPACING, FUNC_FEE, gtp.FUNC_TOKEN0, gtp.FUNC_TOKEN1)]
+        slot0, liquidity, spacing, fee, token0, token1 = gtp.cached_batch(requests)
+        if not all(res and len(res) >= 66 for res in (slot0, liquidity, spacing, fee, token0, token1)) or len(slot0) < 130:
+            raise ValueError(f"{address} does not look like a V3 pool at block {block}")
+        self.sqrt_price_x96 = int(slot0[2:66], 16)
+        self.tick = decode_int(slot0[66:130])
+        self.liquidity = int(liquidity[2:66], 16)
+        self.tick_spacing = decode_int(spacing[2:66])
+        self.fee = int(fee[2:66], 16)
+        self.token0 = gtp.decode_address(token0).lower()
+        self.token1 = gtp.decode_address(token1).lower()
+
+        word = (self.tick // self.tick_spacing) >> 8
+        self.load_words(range(word - BITMAP_WORDS, word + BITMAP_WORDS + 1))
+
+    def load_words(self, positions):
+        """Reads bitmap words, then liquidityNet of every tick they mark as initialized (two batches)"""
+        positions = [p for p in positions if p not in self.bitmap and -32768 <= p <= 32767]
+        if not positions: return
+        results = gtp.cached_batch([
+            gtp.eth_call_request(self.address, FUNC_TICK_BITMAP + encode_int(p), self.block) for p in positions
+        ])
+        new_ticks = []
+        for pos, res in zip(positions, results):
+            if res is None: raise ValueError(f"tickBitmap({pos}) failed for {self.address}")
+            word = int(res[2:66] or "0", 16)
+            self.bitmap[pos] = word
+            while word:
+                bit = (word & -word).bit_length() - 1
+                new_ticks.append(((pos << 8) + bit) * self.tick_spacing)
+                word &= word - 1
+        if not new_ticks: return
+        results = gtp.cached_batch([
+            gtp.eth_call_request(self.address, FUNC_TICKS + encode_int(t), self.block) for t in new_ticks
+        ])
+        for tick, res in zip(new_ticks, results):
+            if res is None or len(res) < 130: raise ValueError(f"ticks({tick}) failed for {self.address}")
+            # (uint128 liquidityGross, int128 liquidityNet, ...)
+            self.ticks[tick] = decode_int(res[66:130])
+
+    def word(self, pos, zero_for_one):
+        if pos not in self.bitmap:
+            # Ran past the loaded range: fetch the next few words in the swap direction
+            step = -1 if zero_for_one else 1
+            self.load_words(range(pos, pos + step * BITMAP_WORDS, step))
+        return self.bitmap.get(pos, 0)
+
+    def next_initialized_tick(self, tick, lte):
+        """TickBitmap.nextInitializedTickWithinOneWord; returns (next_tick, initialized)"""
+        spacing = self.tick_spacing
+        compressed = tick // spacing
+        if lte:
+            pos, bit = compressed >> 8, compressed & 255
+            masked = self.word(pos, True) & ((1 << bit) - 1 + (1 << bit))
+            if masked:
+                return (compressed - (bit - (masked.bit_length() - 1))) * spacing, True
+            return (compressed - bit) * spacing, False
+        compressed += 1
+        pos, bit = compressed >> 8, compressed & 255
+        masked = self.word(pos, False) & (MAX_UINT256 ^ ((1 << bit) - 1))
+        if masked:
+            return (compressed + ((masked & -masked).bit_length() - 1 - bit)) * spacing, True
+        return (compressed + (255 - bit)) * spacing, False
+
+
+def get_pool(address, block):
+    key = (address.lower(), block)
+    if key not in POOL_CACHE:
+        POOL_CACHE[key] = V3Pool(address, block)
+    return POOL_CACHE[key]
+
+
+def quote_exact_input(pool, amounts, zero_for_one):
+    """Amount out for each raw input amount, from one walk over the ticks
+
+    Returns {amount_in: (amount_out, amount_in_used, sqrt_price_after, ticks_crossed)};
+    amount_in_used < amount_in means the pool ran out of liquidity before the price limit.
+    """
+    sizes = sorted(set(a for a in amounts if a > 0))
+    results = {}
+    limit = MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+    sqrt_price, tick, liquidity = pool.sqrt_price_x96, pool.tick, pool.liquidity
+    consumed = 0    # input spent so far, fees included
+    out = 0
+    crossed = 0
+    idx = 0
+
+    while idx < len(sizes):
+        if sqrt_price == limit:
+            for size in sizes[idx:]:
+                results[size] = (out, consumed, sqrt_price, crossed)
+            break
+        tick_next, initialized = pool.next_initialized_tick(tick, zero_for_one)
+        tick_next = max(MIN_TICK, min(MAX_TICK, tick_next))
+        sqrt_next_tick = sqrt_ratio_at_tick(tick_next)
+        if zero_for_one:
+            target = limit if sqrt_next_tick < limit else sqrt_next_tick
+        else:
+            target = limit if sqrt_next_tick > limit else sqrt_next_tick
+
+        # Sizes that run out inside this step get their own partial step
+        while idx < len(sizes):
+            remaining = sizes[idx] - consumed
+            sqrt_after, amount_in, amount_out, fee_amount = compute_swap_step(
+                sqrt_price, target, liquidity, remaining, pool.fee
+            )
+            if sqrt_after == target: break
+            results[sizes[idx]] = (out + amount_out, sizes[idx], sqrt_after, crossed)
+            idx += 1
+        if idx == len(sizes): break
+
+        # Every remaining size crosses this step identically
+        sqrt_price, amount_in, amount_out, fee_amount = compute_swap_step(
+            sqrt_price, target, liquidity, sizes[idx] - consumed, pool.fee
+        )
+        consumed += amount_in + fee_amount
+        out += amount_out
+        while idx < len(sizes) and sizes[idx] <= consumed:
+            results[sizes[idx]] = (out, sizes[idx], sqrt_price, crossed)
+            idx += 1
+
+        if sqrt_price == sqrt_next_tick:
+            if initialized:
+                net = pool.ticks.get(tick_next, 0)
+                liquidity += -net if zero_for_one else net
+                crossed += 1
+            tick = tick_next - 1 if zero_for_one else tick_next
+        else:
+            tick = tick_at_sqrt_ratio(sqrt_price)
+    return results
+
+
+def main():
+    args = sys.argv[1:]
+    block = gtp.format_block(gtp.pop_option(args, "--block", "latest"))
+    zero_for_one = "--one-for-zero" not in args
+    if not zero_for_one: args.remove("--one-for-zero")
+    if len(args) < 2:
+        print(__doc__.strip())
+        sys.exit(1)
+    block = gtp.resolve_block(block)
+
+    start = time.perf_counter()
+    try:
+        pool = get_pool(args[0], block)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    load_time = time.perf_counter() - start
+    meta = gtp.get_token_meta([pool.token0, pool.token1], block)
+    token_in, token_out = (pool.token0, pool.token1) if zero_for_one else (pool.token1, pool.token0)
+    dec_in, sym_in = meta[token_in]
+    dec_out, sym_out = meta[token_out]
+
+    sizes = [Decimal(s) for s in args[1].split(",") if s]
+    raw_sizes = [int(s * 10**dec_in) for s in sizes]
+    start = time.perf_counter()
+    quotes = quote_exact_input(pool, raw_sizes, zero_for_one)
+    quote_time = time.perf_counter() - start
+
+    # Spot price in output units per input unit, before any fee
+    spot = Decimal(pool.sqrt_price_x96) ** 2 / Decimal(Q96) ** 2
+    if not zero_for_one: spot = 1 / spot
+    spot *= Decimal(10) ** (dec_in - dec_out)
+
+    print(f"🔍 {pool.address} at block {int(block, 16)}: {sym_in} -> {sym_out}, fee {pool.fee / 10000:g}%, "
+          f"{len(pool.ticks)} initialized ticks loaded")
+    print(f"   Spot: 1 {sym_in} = {spot:.8g} {sym_out}")
+    print("-" * 40)
+    for size, raw in zip(sizes, raw_sizes):
+        if raw not in quotes:
+            print(f"   {size} {sym_in}: ❌ size rounds to zero")
+            continue
+        amount_out, used, _, crossed = quotes[raw]
+        out = Decimal(amount_out) / Decimal(10) ** dec_out
+        price = out / size if size else Decimal(0)
+        impact = (1 - price / spot) * 100 if spot else Decimal(0)
+        partial = "" if used >= raw else f" ⚠️ only {Decimal(used) / Decimal(10) ** dec_in} {sym_in} filled"
+        print(f"💰 {size} {sym_in} -> {out:.8g} {sym_out} (avg {price:.8g}, impact {impact:.4f}%, "
+              f"{crossed} ticks crossed){partial}")
+    print("-" * 40)
+    print(f"⏱️  Load {load_time * 1000:.1f}ms, {len(raw_sizes)} quotes in {quote_time * 1000:.2f}ms (one local pass)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Minimal blocking WebSocket client (RFC 6455) for geth's --ws endpoint.
+
+Only what JSON-RPC subscriptions need: text frames, fragmentation, ping/pong
+and close. No extensions, no compression.
+"""
+import base64
+import json
+import os
+import socket
+import ssl
+import struct
+import urllib.parse
+
+DEFAULT_WS_URL = os.environ.get("BSC_WS", "ws://localhost:8546")
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketClosed(Exception):
+    """The connection was closed by the peer or dropped"""
+
+
+class WebSocket:
+    def __init__(self, url=DEFAULT_WS_URL, timeout=10):
+        parsed = urllib.parse.urlsplit(url)
+        secure = parsed.scheme == "wss"
+        host = parsed.hostname
+        port = parsed.port or (443 if secure else 80)
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+
+        sock = socket.create_connection((host, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self.buf = b""
+        self.message = b""
+        self.message_opcode = OP_TEXT
+        self.last_pong = None
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parsed.netloc}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        sock.sendall(request.encode())
+        while b"\r\n\r\n" not in self.buf:
+            self._fill()
+        head, self.buf = self.buf.split(b"\r\n\r\n", 1)
+        status = head.split(b"\r\n", 1)[0]
+        if b" 101 " not in status + b" ":
+            sock.close()
+            raise WebSocketClosed(f"Handshake failed: {status.decode(errors='replace')}")
+
+    def _fill(self):
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise WebSocketClosed("Connection closed by peer")
+        self.buf += chunk
+
+    def _parse_frame(self):
+        """Pops one complete frame off the buffer, or returns None if more bytes are needed"""
+        buf = self.buf
+        if len(buf) < 2:
+            return None
+        b0, b1 = buf[0], buf[1]
+        length = b1 & 0x7F
+        pos = 2
+        if length == 126:
+            if len(buf) < 4: return None
+            length = struct.unpack_from("!H", buf, 2)[0]
+            pos = 4
+        elif length == 127:
+            if len(buf) < 10: return None
+            length = struct.unpack_from("!Q", buf, 2)[0]
+            pos = 10
+        mask = None
+        if b1 & 0x80:
+            if len(buf) < pos + 4: return None
+            mask = buf[pos : pos + 4]
+            pos += 4
+        if len(buf) < pos + length:
+            return None
+        payload = buf[pos : pos + length]
+        self.buf = buf[pos + length :]
+        if mask:
+            payload = _mask(payload, mask)
+        return bool(b0 & 0x80), b0 & 0x0F, payload
+
+    def _send_frame(self, opcode, payload):
+        # Client frames must be masked
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header += struct.pack("!H", length)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack("!Q", length)
+        mask = os.urandom(4)
+        self.sock.sendall(bytes(header) + mask + _mask(payload, mask))
+
+    def send_text(self, text):
+        self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    def send_json(self, obj):
+        self.send_text(json.dumps(obj))
+
+    def recv(self, timeout=None):
+        """Returns the next text/binary message; answers pings along the way
+
+        A socket.timeout leaves the connection usable: partial frames stay buffered.
+        """
+        self.sock.settimeout(timeout)
+        while True:
+            frame = self._parse_frame()
+            if frame is None:
+                self._fill()
+                continue
+            fin, opcode, payload = frame
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                self.last_pong = payload
+                continue
+            if opcode == OP_CLOSE:
+                self.close()
+                raise WebSocketClosed("Server closed the connection")
+            if opcode != OP_CONT:
+                self.message_opcode = opcode
+            self.message += payload
+            if fin:
+                message, self.message = self.message, b""
+                return message.decode("utf-8") if self.message_opcode == OP_TEXT else message
+
+    def ping(self, payload=b""):
+        self._send_frame(OP_PING, payload)
+
+    def recv_json(self, timeout=None):
+        return json.loads(self.recv(timeout))
+
+    def close(self):
+        try:
+            self._send_frame(OP_CLOSE, b"")
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def _mask(payload, mask):
+    # XOR via big ints: much faster than a per-byte loop for large frames
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(n, "big")